@@ -1,9 +1,14 @@
+import pandas as pd
 import streamlit as st
 
-from core.cargar import cargar_datos
+from core.cargar import cargar_datos, leer_csv_por_bloques, leer_encabezados, listar_hojas
 from core.analisis_completo import ejecutar_analisis_completo
 from core.dashboard import mostrar_dashboard
-from core.procesamiento import preparar_datos
+from core.procesamiento import preparar_datos, preparar_datos_por_bloques
+from core.cache import cache_de_sesion, huella_contenido
+from core.cache_disco import cache_columnar
+from core.correlacion import AcumuladorMomentos
+from core.modelos import registro_modelos
 
 # Configuración inicial de la página
 st.set_page_config(page_title="Análisis Inteligente de Datos", layout="wide")
@@ -25,20 +30,115 @@ Sube tu archivo para comenzar
 archivo = st.file_uploader("Carga un archivo CSV o Excel", type=["csv", "xlsx"])
 st.divider()
 
+# Opciones de lectura (la lectura por bloques reduce la memoria en CSV grandes)
+with st.sidebar:
+    st.header("Opciones de carga")
+    lectura_bloques = st.checkbox("Leer CSV por bloques (archivos grandes)", value=False)
+    limpieza_bloques = st.checkbox(
+        "Limpiar por bloques en disco (el CSV crudo nunca se carga entero)",
+        value=False,
+        disabled=not lectura_bloques,
+    )
+    duplicados_aprox = st.checkbox(
+        "Duplicados aproximados (filtro de Bloom)",
+        value=False,
+        disabled=not limpieza_bloques,
+    )
+    medir_memoria = st.checkbox(
+        "Medir pico de memoria de la limpieza",
+        value=False,
+        help="Activa tracemalloc durante la limpieza (más lento). Sólo afecta a limpiezas nuevas.",
+    )
+    motor = st.selectbox(
+        "Motor de lectura",
+        ["pandas", "arrow", "streaming"],
+        help="arrow: lector CSV multihilo. streaming: Excel en modo sólo lectura, por lotes.",
+    )
+    hoja = None
+    columnas = []
+    if archivo:
+        try:
+            if archivo.name.lower().endswith(".xlsx"):
+                hojas = listar_hojas(archivo)
+                if len(hojas) > 1:
+                    hoja = st.selectbox("Hoja", hojas)
+            columnas = st.multiselect(
+                "Columnas a cargar (vacío = todas)", leer_encabezados(archivo, hoja)
+            )
+        except Exception as e:
+            st.warning(f"No se pudieron leer los encabezados: {e}")
+modo_lectura = "bloques" if lectura_bloques else "completo"
+fuera_de_memoria = bool(
+    lectura_bloques and limpieza_bloques and archivo and archivo.name.lower().endswith(".csv")
+)
+opciones_lectura = (modo_lectura, motor, hoja, tuple(columnas), fuera_de_memoria, duplicados_aprox)
+
 # Procesamiento principal
 if archivo:
     try:
-        # Cargar datos
-        df = cargar_datos(archivo)
+        # Cache por contenido: los reruns de Streamlit reutilizan lo ya calculado
+        with archivo.getbuffer() as contenido:
+            huella = huella_contenido(contenido, archivo.name, *opciones_lectura)
+        cache = cache_de_sesion()
+        cache.activar(huella)
+        vista = cache.vista(huella)
+
+        disco = cache_columnar()
+
+        # Cargar datos (desde la copia columnar en disco si ya se subió antes)
+        def _cargar():
+            datos = disco.cargar(huella, "cargado")
+            if datos is None:
+                barra = st.progress(0.0, text="Leyendo archivo...")
+                datos = cargar_datos(
+                    archivo,
+                    modo=modo_lectura,
+                    progreso=barra.progress,
+                    motor=motor,
+                    hoja=hoja,
+                    columnas=columnas,
+                )
+                barra.empty()
+                disco.guardar(huella, "cargado", datos)
+            return datos
+
+        def _preparar():
+            guardado = disco.cargar_limpio(huella)
+            if guardado is not None:
+                return guardado
+            if fuera_de_memoria:
+                # Nunca se materializa el archivo crudo completo
+                resultado = preparar_datos_por_bloques(
+                    leer_csv_por_bloques(archivo, columnas=columnas),
+                    modo_duplicados="probabilistico" if duplicados_aprox else "exacto",
+                    medir_memoria=medir_memoria,
+                )
+                disco.guardar_limpio(huella, *resultado)
+                return resultado
+            resultado = preparar_datos(vista.obtener_o_calcular("cargado", _cargar), medir_memoria=medir_memoria)
+            disco.guardar_limpio(huella, *resultado)
+            return resultado
+
+        def _vista_previa():
+            previa = disco.vista_previa(huella)
+            if previa is None and fuera_de_memoria:
+                archivo.seek(0)
+                previa = pd.read_csv(archivo, nrows=5)
+                archivo.seek(0)
+            if previa is None:
+                previa = vista.obtener_o_calcular("cargado", _cargar).head()
+            return previa
+
+        df_previa = vista.obtener_o_calcular("vista_previa", _vista_previa)
         st.success("Archivo cargado correctamente.")
 
         # Mostrar vista previa dentro de un contenedor expandible
         with st.expander("Vista previa del archivo cargado"):
-            st.dataframe(df.head())
+            st.dataframe(df_previa)
 
         # Limpieza de datos
         with st.spinner("Limpiando y preparando datos..."):
-            df, resumen_limpieza = preparar_datos(df)
+            df, resumen_limpieza = vista.obtener_o_calcular("limpio", _preparar)
 
         st.info("Datos limpiados automáticamente.")
 
@@ -49,6 +149,27 @@ if archivo:
             - Registros duplicados eliminados: **{resumen_limpieza['duplicados_eliminados']}**
             - Celdas con valores nulos que fueron rellenadas: **{resumen_limpieza['nulos_rellenados']}**
             """)
+            if resumen_limpieza.get("perfil"):
+                st.caption("Tiempo (y pico de memoria, si se midió) por paso de limpieza")
+                st.dataframe(pd.DataFrame(resumen_limpieza["perfil"]).T)
+
+        # Momentos acumulados por dataset: si el archivo sólo creció, se suman las filas nuevas.
+        # Se acumula el mismo DataFrame limpio que se analiza (ver AcumuladorMomentos).
+        def _momentos():
+            # Clave estable del dataset (nombre + opciones): la próxima versión del archivo, en otra
+            # sesión, encuentra el acumulador; si el contenido es otro, la huella de filas lo rehace
+            clave = huella_contenido(archivo.name.encode("utf-8"), *opciones_lectura)
+            acumulador = disco.cargar_momentos(clave) or AcumuladorMomentos([])
+            if acumulador.sincronizar(df, fuente=huella) != "sin_cambios":
+                disco.guardar_momentos(clave, acumulador)
+            return acumulador
+
+        momentos = vista.obtener_o_calcular("momentos", _momentos)
+
+        with st.sidebar.expander("Cache en disco"):
+            st.json(disco.estadisticas())
+            st.caption("Modelos guardados")
+            st.json(registro_modelos().estadisticas())
 
         st.divider()
 
@@ -56,10 +177,10 @@ if archivo:
         opcion = st.radio("¿Qué deseas hacer?", ["Dashboard Interactivo", "Análisis Completo"])
 
         if opcion == "Dashboard Interactivo":
-            mostrar_dashboard(df)
+            mostrar_dashboard(df, cache=vista)
 
         elif opcion == "Análisis Completo":
-            ejecutar_analisis_completo(df)
+            ejecutar_analisis_completo(df, cache=vista, momentos=momentos, disco=disco)
 
     except Exception as e:
         st.error(f"Error al procesar los datos: {e}")
@@ -1,9 +1,99 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
+from sklearn.metrics import silhouette_score
 from sklearn.preprocessing import StandardScaler
 from pandas.api.types import is_numeric_dtype
+from threadpoolctl import threadpool_limits
+from typing import Callable, Iterable
 import numpy as np
 
+from core.cache import huella_dataframe, huella_prefijo
+from core.modelos import RegistroModelos, huella_esquema
+
+METODOS_KMEANS = ("auto", "exacto", "minibatch")
+# Con más filas que esto, "auto" usa MiniBatchKMeans
+UMBRAL_MINIBATCH = 200_000
+TAMANO_LOTE_MINIBATCH = 4096
+RANGO_K = range(2, 9)
+MUESTRA_SILUETA = 5000
+
+# Matriz compartida por los procesos de `elegir_k` (se envía una vez por proceso)
+_X_TRABAJO: np.ndarray | None = None
+
+
+def _iniciar_trabajador(X: np.ndarray) -> None:
+    global _X_TRABAJO
+    _X_TRABAJO = X
+
+
+def _muestra_estratificada(etiquetas: np.ndarray, tamano: int, semilla: int = 42) -> np.ndarray:
+    """
+    Posiciones de una muestra de ~`tamano` filas, proporcional por cluster
+    y con un mínimo por cluster para que los grupos chicos estén presentes.
+    """
+    n = len(etiquetas)
+    if n <= tamano:
+        return np.arange(n)
+    rng = np.random.default_rng(semilla)
+    grupos, conteos = np.unique(etiquetas, return_counts=True)
+    minimo = max(tamano // (10 * len(grupos)), 2)
+    partes = []
+    for g, c in zip(grupos, conteos):
+        cuota = min(c, max(int(round(tamano * c / n)), minimo))
+        partes.append(rng.choice(np.flatnonzero(etiquetas == g), size=cuota, replace=False))
+    return np.sort(np.concatenate(partes))
+
+
+def _evaluar_k(k: int, metodo: str, tamano_lote: int, tamano_muestra: int, hilos: int):
+    """Ajusta K-Means con `k` grupos sobre `_X_TRABAJO` y lo puntúa."""
+    X = _X_TRABAJO
+    with threadpool_limits(limits=hilos):
+        modelo = Agrupamiento._modelo_kmeans(k, metodo, len(X), tamano_lote)
+        etiquetas = modelo.fit_predict(X)
+        muestra = _muestra_estratificada(etiquetas, tamano_muestra)
+        silueta = np.nan
+        if len(np.unique(etiquetas[muestra])) > 1:
+            silueta = float(silhouette_score(X[muestra], etiquetas[muestra]))
+    return k, float(modelo.inertia_), silueta, modelo
+
+
+def _codo(ks: np.ndarray, inercias: np.ndarray) -> int:
+    """k del codo: punto más alejado de la recta entre extremos (curva normalizada)."""
+    if len(ks) < 3:
+        return int(ks[0])
+    x = (ks - ks[0]) / (ks[-1] - ks[0])
+    rango = inercias[0] - inercias[-1]
+    y = (inercias - inercias[-1]) / rango if rango > 0 else np.zeros_like(inercias)
+    # Recta de (0, 1) a (1, 0): distancia proporcional a 1 - x - y
+    return int(ks[np.argmax(1 - x - y)])
+
+
+def _estado_ajuste(entrada: dict | None, dfn: pd.DataFrame, huella: str) -> str:
+    """
+    Compara los datos actuales con los del ajuste guardado.
+
+    Retorna "reutilizado" (mismos datos), "incremental" (mismas filas
+    al principio y filas nuevas al final) o "nuevo".
+    """
+    if entrada is None or entrada.get("columnas") != list(dfn.columns):
+        return "nuevo"
+    filas = entrada["filas"]
+    if len(dfn) == filas and huella == entrada["huella"]:
+        return "reutilizado"
+    if len(dfn) > filas and huella_prefijo(dfn, filas) == entrada["huella_prefijo"]:
+        return "incremental"
+    return "nuevo"
+
+
+def _centros_iniciales(entrada: dict, scaler: StandardScaler, tipo) -> np.ndarray:
+    """Centroides guardados llevados a la escala del escalador actual (arranque en caliente)."""
+    centros = entrada["escalador"].inverse_transform(entrada["modelo"].cluster_centers_)
+    return scaler.transform(centros).astype(tipo)
+
+
 class Agrupamiento:
     """
     Clase encargada de aplicar técnicas de agrupamiento (clustering)
@@ -11,13 +101,28 @@ class Agrupamiento:
     """
 
     @staticmethod
-    def por_kmeans(df: pd.DataFrame, num_clusters: int = 3) -> pd.Series:
+    def por_kmeans(
+        df: pd.DataFrame,
+        num_clusters: int = 3,
+        metodo: str = "auto",
+        tamano_lote: int = TAMANO_LOTE_MINIBATCH,
+        float32: bool = False,
+        registro: RegistroModelos | None = None,
+    ) -> pd.Series:
         """
         Aplica el algoritmo K-Means a las columnas numéricas del DataFrame.
 
         Parámetros:
         - df: DataFrame con los datos originales.
         - num_clusters: cantidad de grupos (clusters) a formar.
+        - metodo: "exacto" (KMeans completo, n_init=10), "minibatch"
+          (MiniBatchKMeans con lotes de `tamano_lote` filas) o "auto"
+          (minibatch a partir de UMBRAL_MINIBATCH filas).
+        - float32: escalar y agrupar en float32 (mitad de memoria).
+        - registro: si se indica, el escalador y los centroides se guardan
+          por esquema + hiperparámetros. Con los mismos datos sólo se
+          asignan clusters; si sólo se agregaron filas, se parte de los
+          centroides anteriores (una sola inicialización).
 
         Retorna:
         - Una Serie de Pandas donde cada fila del DataFrame original
@@ -27,6 +132,36 @@ class Agrupamiento:
         if not isinstance(num_clusters, int) or num_clusters < 2:
             raise ValueError("num_clusters debe ser un entero >= 2.")
 
+        dfn, X, scaler = Agrupamiento._matriz_escalada(df, num_clusters, float32)
+
+        if registro is not None:
+            hiper = dict(k=num_clusters, metodo=metodo, tamano_lote=tamano_lote, float32=float32)
+            clave = RegistroModelos.clave("kmeans", huella_esquema(dfn), **hiper)
+            huella = huella_dataframe(dfn)
+            entrada = registro.cargar("kmeans", clave)
+            estado = _estado_ajuste(entrada, dfn, huella)
+            if estado == "reutilizado":
+                return pd.Series(entrada["modelo"].predict(X), index=dfn.index, name="Cluster")
+            init = _centros_iniciales(entrada, scaler, X.dtype) if estado == "incremental" else None
+            modelo = Agrupamiento._modelo_kmeans(num_clusters, metodo, len(X), tamano_lote, init)
+            etiquetas = modelo.fit_predict(X)
+            Agrupamiento._guardar_ajuste(registro, "kmeans", clave, dfn, scaler, modelo, huella)
+            return pd.Series(etiquetas, index=dfn.index, name="Cluster")
+
+        # 6) K-Means (exacto o por mini-lotes según el tamaño)
+        modelo = Agrupamiento._modelo_kmeans(num_clusters, metodo, len(X), tamano_lote)
+        etiquetas = modelo.fit_predict(X)
+
+        return pd.Series(etiquetas, index=dfn.index, name="Cluster")
+
+    @staticmethod
+    def _matriz_escalada(df: pd.DataFrame, min_filas: int, float32: bool = False):
+        """
+        Pasos 1-5 de `por_kmeans`: numéricas sin NaN ni constantes, escaladas.
+
+        Retorna:
+        - (DataFrame filtrado, matriz escalada, StandardScaler ajustado)
+        """
         # 1) Selección robusta de columnas numéricas
         num_cols = [c] + [] if False else [c for c in df.columns if is_numeric_dtype(df[c])]
         if not num_cols:
@@ -41,8 +176,8 @@ class Agrupamiento:
 
         # 3) Eliminar filas con NaN (como en tu versión original)
         dfn = dfn.dropna(axis=0, how="any")
-        if len(dfn) < num_clusters:
-            raise ValueError(f"Filas insuficientes para {num_clusters} clusters después de limpiar NaN.")
+        if len(dfn) < min_filas:
+            raise ValueError(f"Filas insuficientes para {min_filas} clusters después de limpiar NaN.")
 
         # 4) Quitar columnas de varianza cero (constantes)
         var = dfn.var(numeric_only=True)
@@ -55,10 +190,237 @@ class Agrupamiento:
 
         # 5) Escalado estándar
         scaler = StandardScaler()
-        X = scaler.fit_transform(dfn)
+        X = scaler.fit_transform(dfn.to_numpy(dtype=np.float32 if float32 else np.float64))
 
-        # 6) K-Means
-        modelo = KMeans(n_clusters=num_clusters, n_init=10, random_state=42)
-        etiquetas = modelo.fit_predict(X)
+        return dfn, X, scaler
 
-        return pd.Series(etiquetas, index=dfn.index, name="Cluster")
+    @staticmethod
+    def _modelo_kmeans(num_clusters: int, metodo: str, n_filas: int, tamano_lote: int, init=None):
+        if metodo not in METODOS_KMEANS:
+            raise ValueError(f"metodo debe ser uno de: {', '.join(METODOS_KMEANS)}.")
+        if metodo == "auto":
+            metodo = "minibatch" if n_filas >= UMBRAL_MINIBATCH else "exacto"
+        # Con centroides previos basta una inicialización
+        inicio = {"init": init, "n_init": 1} if init is not None else {}
+        if metodo == "exacto":
+            return KMeans(**{"n_clusters": num_clusters, "n_init": 10, "random_state": 42, **inicio})
+        return MiniBatchKMeans(
+            **{"n_clusters": num_clusters, "batch_size": tamano_lote, "n_init": 3, "random_state": 42, **inicio}
+        )
+
+    @staticmethod
+    def _guardar_ajuste(registro, tipo, clave, dfn, scaler, modelo, huella, **extras) -> dict:
+        return registro.guardar(
+            tipo,
+            clave,
+            modelo,
+            escalador=scaler,
+            columnas=list(dfn.columns),
+            filas=len(dfn),
+            huella=huella,
+            huella_prefijo=huella_prefijo(dfn, len(dfn)),
+            **extras,
+        )
+
+    @staticmethod
+    def asignar(ajuste: dict, df: pd.DataFrame) -> pd.Series:
+        """
+        Asigna filas (p. ej. las recién agregadas) a los clusters de un
+        ajuste existente, sin reentrenar.
+
+        Parámetros:
+        - ajuste: dict con "modelo", "escalador" y "columnas" (lo que
+          devuelve `elegir_k` o una entrada del registro).
+
+        Retorna:
+        - Serie "Cluster" indexada por las filas sin NaN en esas columnas.
+        """
+        dfn = df[ajuste["columnas"]].apply(pd.to_numeric, errors="coerce").dropna(axis=0, how="any")
+        if dfn.empty:
+            return pd.Series(dtype="int64", name="Cluster")
+        tipo = ajuste["modelo"].cluster_centers_.dtype
+        X = ajuste["escalador"].transform(dfn.to_numpy(dtype=tipo))
+        return pd.Series(ajuste["modelo"].predict(X), index=dfn.index, name="Cluster")
+
+    @staticmethod
+    def por_kmeans_por_bloques(
+        fuente: Callable[[], Iterable[pd.DataFrame]],
+        num_clusters: int = 3,
+        tamano_lote: int = TAMANO_LOTE_MINIBATCH,
+        float32: bool = True,
+        epocas: int = 1,
+    ) -> pd.Series:
+        """
+        MiniBatchKMeans alimentado bloque a bloque, sin tener todo en memoria.
+
+        Parámetros:
+        - fuente: función que devuelve un iterable nuevo de bloques en cada
+          llamada (p. ej. `LimpiezaPorBloques.bloques`), porque los datos
+          se recorren varias veces: escalado, entrenamiento y asignación.
+        - epocas: pasadas de entrenamiento sobre los bloques.
+
+        Retorna:
+        - Serie "Cluster" con el mismo contrato que `por_kmeans`
+          (índice = filas sin NaN en las columnas usadas).
+        """
+        if not isinstance(num_clusters, int) or num_clusters < 2:
+            raise ValueError("num_clusters debe ser un entero >= 2.")
+        tipo = np.float32 if float32 else np.float64
+
+        def matrices():
+            for bloque in fuente():
+                dfn = bloque[columnas].apply(pd.to_numeric, errors="coerce").dropna(axis=0, how="any")
+                if len(dfn):
+                    yield dfn.index, dfn.to_numpy(dtype=tipo)
+
+        # 1) Columnas (del primer bloque) y escalado incremental
+        columnas: list = []
+        for bloque in fuente():
+            columnas = [c for c in bloque.columns if is_numeric_dtype(bloque[c])]
+            break
+        scaler = StandardScaler()
+        for _, X in matrices():
+            scaler.partial_fit(X)
+        if not hasattr(scaler, "var_"):
+            raise ValueError("No hay filas numéricas completas para aplicar K-Means.")
+        usadas = scaler.var_ > 0
+        if usadas.sum() < 2:
+            raise ValueError("Tras eliminar columnas constantes, faltan columnas para el clustering.")
+
+        # 2) Entrenamiento por mini-lotes
+        modelo = MiniBatchKMeans(n_clusters=num_clusters, batch_size=tamano_lote, n_init=3, random_state=42)
+        tamano_lote = max(int(tamano_lote), num_clusters)
+        pendiente = np.empty((0, int(usadas.sum())), dtype=tipo)
+        for _ in range(max(int(epocas), 1)):
+            for _, X in matrices():
+                # Los restos que no completan un lote pasan al bloque siguiente
+                Z = np.vstack([pendiente, scaler.transform(X)[:, usadas]])
+                completos = len(Z) // tamano_lote * tamano_lote
+                for i in range(0, completos, tamano_lote):
+                    modelo.partial_fit(Z[i:i + tamano_lote])
+                pendiente = Z[completos:]
+        if len(pendiente) >= num_clusters:
+            modelo.partial_fit(pendiente)
+        if not hasattr(modelo, "cluster_centers_"):
+            raise ValueError(f"Filas insuficientes para {num_clusters} clusters después de limpiar NaN.")
+
+        # 3) Asignación
+        partes = [
+            pd.Series(modelo.predict(scaler.transform(X)[:, usadas]), index=indice)
+            for indice, X in matrices()
+        ]
+        return pd.concat(partes).rename("Cluster")
+
+    @staticmethod
+    def elegir_k(
+        df: pd.DataFrame,
+        rango_k: Iterable[int] = RANGO_K,
+        criterio: str = "silueta",
+        metodo: str = "auto",
+        tamano_lote: int = TAMANO_LOTE_MINIBATCH,
+        tamano_muestra: int = MUESTRA_SILUETA,
+        float32: bool = False,
+        procesos: int | None = None,
+        registro: RegistroModelos | None = None,
+    ) -> dict:
+        """
+        Elige la cantidad de clusters probando varios k en paralelo.
+
+        Cada k se ajusta en un proceso distinto; se mide la inercia (para
+        el codo) y la silueta sobre una muestra estratificada por cluster
+        (la silueta exacta es cuadrática en filas).
+
+        Parámetros:
+        - rango_k: valores de k a evaluar (se descartan los que no caben en las filas).
+        - criterio: "silueta" (máxima silueta) o "codo" (codo de la inercia).
+        - procesos: cantidad de procesos (None = núcleos disponibles; 1 = secuencial).
+        - registro: guarda la selección; con los mismos datos no se vuelve
+          a probar ningún k, y si sólo se agregaron filas se reajusta el k
+          elegido partiendo de los centroides anteriores.
+
+        Retorna:
+        - dict con "k", "modelo" (KMeans/MiniBatchKMeans ajustado),
+          "escalador", "columnas", "clusters" (Serie con el contrato de
+          `por_kmeans`), "curva" (DataFrame por k: inercia, silueta, codo,
+          elegido) y "origen" ("nuevo", "reutilizado" o "incremental").
+        """
+        if criterio not in {"silueta", "codo"}:
+            raise ValueError("criterio debe ser 'silueta' o 'codo'.")
+        dfn, X, scaler = Agrupamiento._matriz_escalada(df, 2, float32)
+        ks = sorted({int(k) for k in rango_k if 2 <= int(k) < len(X)})
+        if not ks:
+            raise ValueError("Ningún k del rango es válido para la cantidad de filas.")
+
+        if registro is not None:
+            hiper = dict(ks=tuple(ks), criterio=criterio, metodo=metodo, muestra=tamano_muestra, float32=float32)
+            clave = RegistroModelos.clave("kmeans_auto", huella_esquema(dfn), **hiper)
+            huella = huella_dataframe(dfn)
+            entrada = registro.cargar("kmeans_auto", clave)
+            estado = _estado_ajuste(entrada, dfn, huella)
+            if estado != "nuevo":
+                modelo = entrada["modelo"]
+                if estado == "incremental":
+                    init = _centros_iniciales(entrada, scaler, X.dtype)
+                    modelo = Agrupamiento._modelo_kmeans(entrada["k"], metodo, len(X), tamano_lote, init).fit(X)
+                    Agrupamiento._guardar_ajuste(
+                        registro, "kmeans_auto", clave, dfn, scaler, modelo, huella,
+                        k=entrada["k"], curva=entrada["curva"],
+                    )
+                else:
+                    scaler = entrada["escalador"]
+                return {
+                    "k": entrada["k"],
+                    "modelo": modelo,
+                    "escalador": scaler,
+                    "columnas": list(dfn.columns),
+                    "clusters": pd.Series(modelo.predict(X), index=dfn.index, name="Cluster"),
+                    "curva": entrada["curva"],
+                    "origen": estado,
+                }
+
+        nucleos = os.cpu_count() or 1
+        procesos = min(len(ks), nucleos if procesos is None else max(int(procesos), 1))
+        hilos = max(nucleos // procesos, 1)
+        tareas = [(k, metodo, tamano_lote, tamano_muestra, hilos) for k in ks]
+
+        resultados = None
+        if procesos > 1:
+            try:
+                with ProcessPoolExecutor(procesos, initializer=_iniciar_trabajador, initargs=(X,)) as pool:
+                    resultados = list(pool.map(_evaluar_k, *zip(*tareas)))
+            except (OSError, RuntimeError):
+                # Entornos sin multiprocessing disponible: se evalúa en serie
+                resultados = None
+        if resultados is None:
+            _iniciar_trabajador(X)
+            try:
+                resultados = [_evaluar_k(*t) for t in tareas]
+            finally:
+                _iniciar_trabajador(None)
+
+        curva = pd.DataFrame(
+            [(k, inercia, silueta) for k, inercia, silueta, _ in resultados],
+            columns=["k", "inercia", "silueta"],
+        ).set_index("k")
+        k_codo = _codo(curva.index.to_numpy(dtype=float), curva["inercia"].to_numpy())
+        if criterio == "silueta" and curva["silueta"].notna().any():
+            k_elegido = int(curva["silueta"].idxmax())
+        else:
+            k_elegido = k_codo
+        curva["codo"] = curva.index == k_codo
+        curva["elegido"] = curva.index == k_elegido
+
+        modelo = next(m for k, _, _, m in resultados if k == k_elegido)
+        if registro is not None:
+            Agrupamiento._guardar_ajuste(
+                registro, "kmeans_auto", clave, dfn, scaler, modelo, huella, k=k_elegido, curva=curva
+            )
+        return {
+            "k": k_elegido,
+            "modelo": modelo,
+            "escalador": scaler,
+            "columnas": list(dfn.columns),
+            "clusters": pd.Series(modelo.predict(X), index=dfn.index, name="Cluster"),
+            "curva": curva,
+            "origen": "nuevo",
+        }
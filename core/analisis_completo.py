@@ -1,3 +1,4 @@
+import io
 import os
 import streamlit as st
 import pandas as pd
@@ -7,112 +8,236 @@ from core.analizar import (
     obtener_tipos_variables,
     obtener_matriz_correlacion,
 )
-from core.deteccion_atipicos import DeteccionAtipicos
+from core.deteccion_atipicos import BanderasAtipicos, DeteccionAtipicos
 from core.agrupamiento import Agrupamiento
-from core.resumen import GeneradorResumen
-from core.interpretador import InterpretadorInteligente
 from core.visualizacion import CrearGraficos
-from core.exportar import ExportadorPDF
+from core.exportar import FORMATOS_ARTEFACTOS, ExportadorArtefactos, InformePDF
 from core.etiquetar_cluster import etiquetar_clusters
-
-
-def ejecutar_analisis_completo(df: pd.DataFrame) -> None:
-    """Orquesta el análisis completo y renderiza resultados en Streamlit."""
-    df = df.copy()
-
+from core.cache import VistaCache, en_cache, huella_contenido, huella_dataframe
+from core.cache_disco import CacheColumnar
+from core.correlacion import AcumuladorMomentos, MotorCorrelacion
+from core.modelos import registro_modelos
+from core.reglas import cargar_reglas
+from core.resultado import ResultadoAnalisis
+
+# Imágenes del informe: PNG sin pérdida (los heatmaps/densidades se ven mejor así
+# que en paleta); "jpeg" reduce mucho el PDF con gráficos densos
+FORMATO_GRAFICOS = "png"
+DPI_INFORME = None
+
+
+def calcular_resultado(
+    df: pd.DataFrame,
+    huella: str,
+    cache: VistaCache | None = None,
+    momentos: AcumuladorMomentos | None = None,
+) -> ResultadoAnalisis:
+    """
+    Calcula el análisis completo de `df` sin dibujar nada.
+    Con `momentos` (al día con `df`) Pearson y el z-score no recorren el historial.
+    """
+    # Sólo si describen exactamente estas filas; si no, se calcula sobre `df`
+    if momentos is not None and not momentos.corresponde(df):
+        momentos = None
     # --- Tipos de variables y stats generales ---
-    tipos = obtener_tipos_variables(df)
-    st.subheader("Tipos de variables")
-    st.json(tipos)
-
-    st.subheader("Estadísticas descriptivas")
-    st.dataframe(obtener_estadisticas_descriptivas(df))
+    tipos = en_cache(cache, "tipos", lambda: obtener_tipos_variables(df))
+    estadisticas = en_cache(cache, "estadisticas", lambda: obtener_estadisticas_descriptivas(df))
 
     # --- Correlaciones sobre numéricas ---
-    st.subheader("Matriz de correlación")
-    corr_df = obtener_matriz_correlacion(df)  
-    if corr_df.empty:
-        st.info("No hay suficientes columnas numéricas para calcular correlación.")
-    else:
-        st.dataframe(corr_df)
+    # Un solo motor (matriz float + rangos) para el informe, el heatmap y el texto
+    motor = en_cache(cache, "motor_correlacion", lambda: MotorCorrelacion(df, momentos=momentos))
+    corr_df = en_cache(cache, "correlacion", lambda: obtener_matriz_correlacion(df, motor=motor))
 
     # --- Detección de valores atípicos ---
     num_cols = tipos.get("numericas", [])
-    df_num = df[num_cols].apply(pd.to_numeric, errors="coerce") if num_cols else pd.DataFrame()
+    df_num = en_cache(
+        cache,
+        "numericas",
+        lambda: df[num_cols].apply(pd.to_numeric, errors="coerce") if num_cols else pd.DataFrame(),
+    )
 
-    zscore = DeteccionAtipicos.por_zscore(df_num if not df_num.empty else df)
-    iqr = DeteccionAtipicos.por_rango_intercuartil(df_num if not df_num.empty else df)
-    forest = DeteccionAtipicos.por_isolation_forest(df_num if not df_num.empty else df)
+    # Marcas compactas (bits + conteos): el resumen y el intérprete sólo las cuentan
+    zscore = DeteccionAtipicos.por_zscore(df_num if not df_num.empty else df, momentos=momentos, compacto=True)
+    iqr = DeteccionAtipicos.por_rango_intercuartil(df_num if not df_num.empty else df, compacto=True)
+    # Modelo guardado por huella de los datos: reabrir el mismo dataset sólo puntúa,
+    # un dataset distinto (aunque tenga el mismo esquema) entrena el suyo
+    forest = DeteccionAtipicos.por_isolation_forest(
+        df_num if not df_num.empty else df, persistente=True, registro=registro_modelos(), huella=huella
+    )
 
     # --- Agrupamiento con KMeans
+    seleccion = None
     if df_num.shape[1] >= 2 and len(df_num) >= 20:
-        clusters = Agrupamiento.por_kmeans(df_num, num_clusters=3)  
-       
+        # k automático: varios k en paralelo, silueta sobre muestra estratificada + codo
+        # (el ajuste se guarda en disco: mismos datos → sin reentrenar; filas agregadas → arranque en caliente)
+        seleccion = en_cache(cache, "kmeans", lambda: Agrupamiento.elegir_k(df_num, registro=registro_modelos()))
+        clusters = seleccion["clusters"]
+
         if hasattr(clusters, "shape") and len(clusters) != len(df):
             s = pd.Series(clusters, index=df_num.dropna().index)
             clusters = s.reindex(df.index, fill_value=-1).to_numpy()
-        df["Cluster"] = clusters
+        clusters = pd.Series(clusters, index=df.index, name="Cluster").astype("int64")
     else:
-        st.warning("No hay suficientes variables numéricas para agrupar (KMeans). Se omite clustering.")
-        df["Cluster"] = -1  # etiqueta “sin cluster”
+        clusters = pd.Series(-1, index=df.index, name="Cluster", dtype="int64")  # etiqueta “sin cluster”
 
     # --- Perfil promedio por clúster + etiquetas ---
-    if (df["Cluster"] != -1).any():
-        perfil_cluster = df.groupby("Cluster").mean(numeric_only=True).round(2)
+    if (clusters != -1).any():
+        perfil_cluster = df.assign(Cluster=clusters).groupby("Cluster").mean(numeric_only=True).round(2)
         etiquetas = etiquetar_clusters(perfil_cluster) or {}
         etiquetas_default = {k: f"Cluster {k}" for k in perfil_cluster.index}
-        etiquetas_final = {**etiquetas_default, **etiquetas}
-
+        etiquetas_final = {int(k): v for k, v in {**etiquetas_default, **etiquetas}.items()}
         perfil_cluster.index = perfil_cluster.index.map(etiquetas_final)
-        df["Cluster Etiqueta"] = df["Cluster"].map(etiquetas_final)
-
-        st.subheader("Clusters detectados")
-        conteo_clusters = df["Cluster Etiqueta"].value_counts()
-        st.bar_chart(conteo_clusters)
-
-        st.subheader("Perfil promedio por clúster")
-        st.dataframe(perfil_cluster)
     else:
         perfil_cluster = pd.DataFrame()
         etiquetas_final = {}
-        st.info("Sin clusters válidos para perfilar/etiquetar.")
 
-    # --- Resumen + interpretación ---
-    resumen = (
-        GeneradorResumen.resumen_agrupamiento(
-            df.get("Cluster", pd.Series([-1] * len(df))).to_numpy(), etiquetas_final
-        ) + "\n"
-        + GeneradorResumen.resumen_atipicos(df, zscore, iqr, forest) + "\n"
-        + GeneradorResumen.resumen_correlaciones(corr_df if not corr_df.empty else pd.DataFrame())
-    ).replace("🔹", "-").replace("≥", ">=")
-
-    interpretacion = (
-        InterpretadorInteligente.sugerencias_atipicos(zscore, iqr, forest) + "\n"
-        + InterpretadorInteligente.sugerencias_correlaciones(corr_df if not corr_df.empty else pd.DataFrame())
+    return ResultadoAnalisis(
+        huella=huella,
+        tipos=tipos,
+        estadisticas=estadisticas,
+        correlacion=corr_df,
+        atipicos={"zscore": zscore, "iqr": iqr, "forest": BanderasAtipicos.desde_mascara(forest)},
+        clusters=clusters,
+        etiquetas=etiquetas_final,
+        perfil_cluster=perfil_cluster,
+        k=None if seleccion is None else int(seleccion["k"]),
+        origen_k=None if seleccion is None else seleccion["origen"],
+        curva_k=pd.DataFrame() if seleccion is None else seleccion["curva"],
     )
 
-    resumen_completo = resumen + "\n" + interpretacion
 
-    st.subheader("Resumen generado")
-    st.text_area("Resumen del análisis", resumen_completo, height=350)
+def mostrar_resultado(resultado: ResultadoAnalisis) -> None:
+    """Renderiza en Streamlit un resultado ya calculado (o recuperado de disco)."""
+    st.subheader("Tipos de variables")
+    st.json(resultado.tipos)
+
+    st.subheader("Estadísticas descriptivas")
+    st.dataframe(resultado.estadisticas)
+
+    st.subheader("Matriz de correlación")
+    if resultado.correlacion.empty:
+        st.info("No hay suficientes columnas numéricas para calcular correlación.")
+    else:
+        st.dataframe(resultado.correlacion)
+
+    if resultado.k is not None:
+        st.subheader("Selección automática de k")
+        st.caption(
+            f"k elegido: {resultado.k} (máxima silueta; el codo de la inercia se marca en la tabla). "
+            f"Ajuste: {resultado.origen_k}."
+        )
+        st.line_chart(resultado.curva_k[["silueta"]])
+        st.dataframe(resultado.curva_k)
+    else:
+        st.warning("No hay suficientes variables numéricas para agrupar (KMeans). Se omite clustering.")
 
+    if resultado.hay_clusters:
+        st.subheader("Clusters detectados")
+        st.bar_chart(resultado.etiquetas_por_fila().value_counts())
+
+        st.subheader("Perfil promedio por clúster")
+        st.dataframe(resultado.perfil_cluster)
+    else:
+        st.info("Sin clusters válidos para perfilar/etiquetar.")
+
+    st.subheader("Resumen generado")
+    st.text_area("Resumen del análisis", resultado.texto(), height=350)
+
+
+def ejecutar_analisis_completo(
+    df: pd.DataFrame,
+    cache: VistaCache | None = None,
+    momentos: AcumuladorMomentos | None = None,
+    disco: CacheColumnar | None = None,
+) -> None:
+    """
+    Orquesta el análisis completo y renderiza resultados en Streamlit.
+
+    El resultado se indexa por la huella del dataset y la configuración de
+    reglas: con `disco` un análisis ya hecho se reabre sin recalcular nada.
+    """
+    # Copia superficial: sólo se agregan columnas, los datos no se duplican
+    df = df.copy(deep=False)
+
+    huella = cache.huella if cache is not None else huella_dataframe(df)
+    clave = huella_contenido(huella.encode("utf-8"), "analisis", cargar_reglas())
+
+    def _resultado() -> ResultadoAnalisis:
+        guardado = disco.cargar_resultado(clave) if disco is not None else None
+        if guardado is not None:
+            return guardado
+        resultado = calcular_resultado(df, clave, cache=cache, momentos=momentos)
+        if disco is not None:
+            disco.guardar_resultado(clave, resultado)
+        return resultado
+
+    resultado = en_cache(cache, "resultado", _resultado)
+    mostrar_resultado(resultado)
+
+    df["Cluster"] = resultado.clusters.to_numpy()
+    if resultado.hay_clusters:
+        df["Cluster Etiqueta"] = resultado.etiquetas_por_fila().to_numpy()
+
+    # Gráficos en memoria: del proceso de dibujo al PDF sin pasar por disco
+    # (los que no cambiaron se reutilizan de la ejecución anterior de la sesión)
+    graficos: list = []
     try:
-        CrearGraficos(df)  
+        motor = en_cache(cache, "motor_correlacion", lambda: MotorCorrelacion(df, momentos=momentos))
+        previas = cache.obtener("graficos") if cache is not None else None
+        tiempos = CrearGraficos(
+            df, carpeta_salida=None, motor=motor, formato=FORMATO_GRAFICOS, dpi=DPI_INFORME,
+            previas=previas, cache=cache,
+        )
+        if cache is not None:
+            cache.guardar("graficos", tiempos)
+        correctos = tiempos[tiempos["error"].isna()]
+        graficos = list(zip(correctos["grafico"], correctos["imagen"]))
+        fallidos = tiempos[tiempos["error"].notna()]
+        if not fallidos.empty:
+            st.warning(f"No se pudieron generar {len(fallidos)} gráficos: {', '.join(fallidos['grafico'])}")
+        with st.expander("Tiempo por gráfico"):
+            st.dataframe(tiempos.drop(columns=["imagen", "huella"]))
     except Exception as e:
         st.warning(f"No se pudieron generar algunos gráficos: {type(e).__name__}: {e}")
 
-    # --- Exportación a PDF ---
+    # --- Exportación a PDF (el único archivo que se escribe es el informe final) ---
+    # Miniaturas en cuadrícula y páginas volcadas al archivo a medida que se arman
     try:
-        os.makedirs("output", exist_ok=True)
-        exportador = ExportadorPDF("output")
-        exportador.agregar_titulo("Informe de Análisis Automatizado")
-        exportador.agregar_parrafo(resumen_completo)
-        exportador.agregar_imagenes()
-
-        ruta_pdf = exportador.guardar_pdf("informe_final.pdf")
-
-        with open(ruta_pdf, "rb") as file:
-            st.download_button("Descargar informe PDF", file, file_name="informe_final.pdf")
-        st.success(f"PDF generado en: {ruta_pdf}")
+        ruta_pdf = os.path.join("output", "informe_final.pdf")
+        with InformePDF(ruta_pdf) as informe:
+            with informe.seccion("Resumen"):
+                informe.agregar_resultado(resultado)
+            # Sólo las imágenes de esta ejecución (nunca las de un dataset anterior)
+            with informe.seccion("Gráficos"):
+                informe.agregar_cuadricula(graficos)
+
+        # Los bytes de esta ejecución, no una relectura de la ruta compartida
+        st.download_button("Descargar informe PDF", io.BytesIO(informe.contenido), file_name="informe_final.pdf")
+        st.success(f"PDF generado en: {ruta_pdf} ({len(informe.contenido) / 1024:,.0f} KB)")
+        with st.expander("Tamaño y tiempo por sección del PDF"):
+            st.dataframe(informe.desglose())
     except Exception as e:
         st.error(f"No se pudo generar o descargar el PDF: {type(e).__name__}: {e}")
+
+    # --- Artefactos para otros procesos: datos enriquecidos, marcas y perfiles ---
+    with st.expander("Exportar resultados (Parquet, Excel, HTML)"):
+        formatos = st.multiselect(
+            "Formatos", list(FORMATOS_ARTEFACTOS), default=["parquet", "html"], key="formatos_artefactos"
+        )
+        if st.button("Exportar resultados", key="btn_artefactos") and formatos:
+            try:
+                with st.spinner("Exportando resultados..."):
+                    # Prefijo propio del dataset: otra sesión no pisa (ni sirve) estos archivos
+                    exportador = ExportadorArtefactos(resultado, df, "output", prefijo=f"analisis_{clave[:16]}")
+                    rutas = exportador.exportar(formatos, graficos=graficos)
+                for formato, archivos in rutas.items():
+                    for ruta in archivos:
+                        st.write(f"- {formato}: `{ruta}` ({os.path.getsize(ruta) / 1024:,.0f} KB)")
+                        if formato != "parquet":
+                            with open(ruta, "rb") as f:
+                                st.download_button(
+                                    f"Descargar {os.path.basename(ruta)}", f,
+                                    file_name=os.path.basename(ruta), key=f"descargar_{formato}",
+                                )
+            except Exception as e:
+                st.error(f"No se pudieron exportar los resultados: {type(e).__name__}: {e}")
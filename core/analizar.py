@@ -1,6 +1,7 @@
 # core/analizar.py
 from __future__ import annotations
 
+import numpy as np
 import pandas as pd
 from pandas.api.types import (
     is_numeric_dtype,
@@ -9,6 +10,8 @@ from pandas.api.types import (
     is_categorical_dtype,
 )
 
+from core.correlacion import MotorCorrelacion
+
 def obtener_tipos_variables(df: pd.DataFrame) -> dict:
     """
     Clasifica las columnas del DataFrame según su tipo de dato.
@@ -37,44 +40,220 @@ def obtener_tipos_variables(df: pd.DataFrame) -> dict:
         "temporales": temporales,
     }
 
-def obtener_estadisticas_descriptivas(df: pd.DataFrame) -> pd.DataFrame:
+FILAS_APROXIMADO = 5_000_000
+COLUMNAS_POR_BLOQUE = 32
+FILAS_POR_BLOQUE = 1_000_000
+_CUANTILES = (0.25, 0.5, 0.75)
+_ETIQUETAS_CUANTILES = ("25%", "50%", "75%")
+
+
+def obtener_estadisticas_descriptivas(df: pd.DataFrame, aproximado: bool | None = None) -> pd.DataFrame:
     """
     Calcula estadísticas descriptivas para todas las columnas.
-    Devuelve un DataFrame transpuesto e incluye:
+    Devuelve un DataFrame transpuesto (mismo esquema que `describe(include="all")`) e incluye:
       - 'n_unique' (# de valores únicos)
       - 'missing_rate' (proporción de nulos)
-    Compatible con pandas que NO soportan 'datetime_is_numeric'.
+
+    Todo sale de una sola pasada por bloque de columnas: las numéricas se
+    ordenan una vez (conteo, extremos, cuantiles y distintos salen del
+    mismo orden) y las categóricas se factorizan una vez.
+    Con `aproximado=True` (por defecto, a partir de FILAS_APROXIMADO filas)
+    las numéricas se recorren por bloques de filas sin copia ordenada:
+    los cuantiles salen de un boceto KLL y los distintos de HyperLogLog,
+    así la memoria extra queda acotada por el tamaño del bloque.
     """
-    try:
-        desc = df.describe(include="all", datetime_is_numeric=False).transpose()
-    except TypeError:
-        desc = df.describe(include="all").transpose()
+    if df.shape[1] == 0:
+        return pd.DataFrame()
+    if aproximado is None:
+        aproximado = len(df) > FILAS_APROXIMADO
+
+    n = len(df)
+    numericas = [c for c in df.columns if is_numeric_dtype(df[c]) and not is_bool_dtype(df[c])]
+    fechas = [c for c in df.columns if is_datetime64_any_dtype(df[c])]
+    usadas = set(numericas) | set(fechas)
+
+    stats: dict = {}
+    distintos: dict = {}
+    nulos: dict = {}
+
+    for i in range(0, len(numericas), COLUMNAS_POR_BLOQUE):
+        bloque = numericas[i:i + COLUMNAS_POR_BLOQUE]
+        if aproximado:
+            resultados = _resumen_numerico_aproximado(df[bloque])
+        else:
+            resultados = _resumen_numerico(df[bloque].to_numpy(dtype="float64", na_value=np.nan))
+        for col, (st_col, n_unicos, n_nulos) in zip(bloque, resultados):
+            stats[col], distintos[col], nulos[col] = st_col, n_unicos, n_nulos
+
+    for col in fechas:
+        stats[col], distintos[col], nulos[col] = _resumen_fechas(df[col])
+
+    for col in df.columns:
+        if col not in usadas:
+            stats[col], distintos[col], nulos[col] = _resumen_categorico(df[col])
+
+    # Misma disposición de filas/columnas que DataFrame.describe(include="all")
+    ldesc = [stats[c] for c in df.columns]
+    nombres: list = []
+    for indice in sorted((x.index for x in ldesc), key=len):
+        for nombre in indice:
+            if nombre not in nombres:
+                nombres.append(nombre)
+    desc = pd.concat([x.reindex(nombres) for x in ldesc], axis=1, sort=False)
+    desc.columns = df.columns
+    desc = desc.transpose()
 
-    desc["n_unique"] = df.nunique(dropna=True)
-    desc["missing_rate"] = df.isna().mean()
+    desc["n_unique"] = pd.Series(distintos).reindex(df.columns).astype("int64")
+    desc["missing_rate"] = pd.Series(nulos).reindex(df.columns) / n if n else np.nan
 
     return desc
 
-def obtener_matriz_correlacion(df: pd.DataFrame, metodo: str = "pearson") -> pd.DataFrame:
-    """
-    Calcula la matriz de correlación entre columnas numéricas reales.
-    Excluye columnas booleanas y castea a float64 para evitar errores.
-    Si hay <2 columnas válidas, retorna DataFrame vacío.
-    """
-    # Filtrar numéricas reales (excluyendo booleanas)
-    numeric_cols = [
-        c for c in df.columns
-        if is_numeric_dtype(df[c]) and not is_bool_dtype(df[c])
+
+def _interpolar(ordenado: np.ndarray, conteos: np.ndarray, q: float) -> np.ndarray:
+    """Cuantil lineal (como numpy/pandas) sobre columnas ya ordenadas con NaN al final."""
+    cols = np.arange(ordenado.shape[1])
+    pos = (np.maximum(conteos, 1) - 1) * q
+    bajo = np.floor(pos).astype(np.int64)
+    alto = np.ceil(pos).astype(np.int64)
+    a, b = ordenado[bajo, cols], ordenado[alto, cols]
+    t = pos - bajo
+    with np.errstate(invalid="ignore"):
+        res = np.where(t >= 0.5, b - (b - a) * (1 - t), a + (b - a) * t)
+    return np.where(conteos > 0, res, np.nan)
+
+
+def _serie_numerica(cnt, media, std, minimo, cuantiles, maximo) -> pd.Series:
+    valores = [cnt, media, std, minimo, *cuantiles, maximo]
+    indice = ["count", "mean", "std", "min", *_ETIQUETAS_CUANTILES, "max"]
+    return pd.Series(valores, index=indice, dtype="float64")
+
+
+def _resumen_numerico(X: np.ndarray) -> list:
+    n_filas = X.shape[0]
+    if n_filas == 0:
+        return [(_serie_numerica(0.0, np.nan, np.nan, np.nan, [np.nan] * 3, np.nan), 0, 0)] * X.shape[1]
+
+    ordenado = np.sort(X, axis=0)  # NaN quedan al final
+    conteos = n_filas - np.isnan(ordenado).sum(axis=0)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        media = np.nansum(X, axis=0) / conteos
+        var = np.nansum((X - media) ** 2, axis=0) / (conteos - 1)
+    std = np.where(conteos > 1, np.sqrt(var), np.nan)
+
+    cols = np.arange(X.shape[1])
+    minimo = np.where(conteos > 0, ordenado[0], np.nan)
+    maximo = np.where(conteos > 0, ordenado[np.maximum(conteos - 1, 0), cols], np.nan)
+    cuantiles = [_interpolar(ordenado, conteos, q) for q in _CUANTILES]
+
+    # Distintos: cambios entre valores consecutivos dentro de la parte válida
+    cambios = ordenado[1:] != ordenado[:-1]
+    validos = np.arange(n_filas - 1)[:, None] < (conteos - 1)[None, :]
+    distintos = (cambios & validos).sum(axis=0) + (conteos > 0)
+
+    return [
+        (
+            _serie_numerica(float(conteos[j]), media[j], std[j], minimo[j], [c[j] for c in cuantiles], maximo[j]),
+            int(distintos[j]),
+            int(n_filas - conteos[j]),
+        )
+        for j in cols
     ]
 
-    if len(numeric_cols) < 2:
-        return pd.DataFrame()
 
-    num_df = df[numeric_cols].apply(pd.to_numeric, errors="coerce").astype("float64")
+def _resumen_numerico_aproximado(bloque: pd.DataFrame) -> list:
+    from core.bocetos import BocetoCuantiles, HyperLogLog
+
+    n_filas, p = bloque.shape
+    conteos = np.zeros(p)
+    medias = np.zeros(p)
+    m2 = np.zeros(p)
+    minimo = np.full(p, np.inf)
+    maximo = np.full(p, -np.inf)
+    bocetos = [BocetoCuantiles(k=4096) for _ in range(p)]
+    hlls = [HyperLogLog() for _ in range(p)]
+
+    for i in range(0, n_filas, FILAS_POR_BLOQUE):
+        B = bloque.iloc[i:i + FILAS_POR_BLOQUE].to_numpy(dtype="float64", na_value=np.nan)
+        validos = ~np.isnan(B)
+        nb = validos.sum(axis=0)
+        if not nb.any():
+            continue
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mb = np.nansum(B, axis=0) / nb
+            m2b = np.nansum((B - mb) ** 2, axis=0)
+        # Combinación de momentos (Chan et al.)
+        total = conteos + nb
+        with np.errstate(invalid="ignore", divide="ignore"):
+            delta = mb - medias
+            medias = np.where(nb > 0, medias + delta * nb / total, medias)
+            m2 = np.where(nb > 0, m2 + np.nan_to_num(m2b) + delta ** 2 * conteos * nb / total, m2)
+        conteos = total
+        minimo = np.fmin(minimo, np.nanmin(np.where(validos, B, np.inf), axis=0))
+        maximo = np.fmax(maximo, np.nanmax(np.where(validos, B, -np.inf), axis=0))
+        for j in range(p):
+            col = B[validos[:, j], j]
+            bocetos[j].actualizar(col)
+            hlls[j].actualizar(col)
+
+    salida = []
+    for j in range(p):
+        cnt = conteos[j]
+        std = np.sqrt(m2[j] / (cnt - 1)) if cnt > 1 else np.nan
+        media = medias[j] if cnt > 0 else np.nan
+        mn = minimo[j] if cnt > 0 else np.nan
+        mx = maximo[j] if cnt > 0 else np.nan
+        serie = _serie_numerica(float(cnt), media, std, mn, bocetos[j].cuantiles(_CUANTILES), mx)
+        distintos = min(int(round(hlls[j].estimar())), int(cnt))
+        salida.append((serie, distintos, int(n_filas - cnt)))
+    return salida
 
-    num_df = num_df.dropna(axis=1, how="all")
-    if num_df.shape[1] < 2:
-        return pd.DataFrame()
 
-    metodo = metodo if metodo in {"pearson", "spearman", "kendall"} else "pearson"
-    return num_df.corr(method=metodo)
+def _resumen_fechas(s: pd.Series) -> tuple[pd.Series, int, int]:
+    valores = s.to_numpy(dtype="datetime64[ns]")
+    validos = np.sort(valores[~np.isnat(valores)])
+    cnt = validos.size
+    indice = ["count", "mean", "min", *_ETIQUETAS_CUANTILES, "max"]
+    if cnt == 0:
+        return pd.Series([0, pd.NaT, pd.NaT, pd.NaT, pd.NaT, pd.NaT, pd.NaT], index=indice, dtype=object), 0, len(s)
+
+    enteros = validos.view("int64")
+    columna = enteros[:, None].astype("float64")
+    cuantiles = [pd.Timestamp(int(_interpolar(columna, np.array([cnt]), q)[0])) for q in _CUANTILES]
+    media = pd.Timestamp(int(enteros.astype("float64").mean()))
+    serie = pd.Series(
+        [cnt, media, pd.Timestamp(validos[0]), *cuantiles, pd.Timestamp(validos[-1])],
+        index=indice,
+        dtype=object,
+    )
+    distintos = int((np.diff(enteros) != 0).sum() + 1)
+    return serie, distintos, int(len(s) - cnt)
+
+
+def _resumen_categorico(s: pd.Series) -> tuple[pd.Series, int, int]:
+    # Una factorización da conteo, distintos, moda y frecuencia
+    codigos, unicos = pd.factorize(s, use_na_sentinel=True)
+    validos = codigos[codigos >= 0]
+    cnt = int(validos.size)
+    indice = ["count", "unique", "top", "freq"]
+    if cnt == 0:
+        return pd.Series([0, 0, np.nan, np.nan], index=indice, dtype=object), 0, len(s)
+    frecuencias = np.bincount(validos, minlength=len(unicos))
+    top = int(frecuencias.argmax())
+    serie = pd.Series([cnt, len(unicos), unicos[top], int(frecuencias[top])], index=indice, dtype=object)
+    return serie, len(unicos), int(len(s) - cnt)
+
+
+def obtener_matriz_correlacion(
+    df: pd.DataFrame, metodo: str = "pearson", motor: MotorCorrelacion | None = None
+) -> pd.DataFrame:
+    """
+    Calcula la matriz de correlación entre columnas numéricas reales.
+    Excluye columnas booleanas y castea a float64 para evitar errores.
+    Si hay <2 columnas válidas, retorna DataFrame vacío.
+
+    Con `motor` se reutilizan la matriz float y los rangos ya calculados
+    (p. ej. el mismo motor que luego usa el heatmap).
+    """
+    motor = motor if motor is not None else MotorCorrelacion(df)
+    return motor.matriz(metodo)
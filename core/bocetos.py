@@ -0,0 +1,259 @@
+# core/bocetos.py
+from __future__ import annotations
+
+import math
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+
+def hashes_filas(df: pd.DataFrame) -> np.ndarray:
+    """Hash de 64 bits por fila (independiente del índice)."""
+    if df.shape[1] == 0:
+        return np.zeros(len(df), dtype=np.uint64)
+    return pd.util.hash_pandas_object(df, index=False).to_numpy()
+
+
+def _mezclar(h: np.ndarray) -> np.ndarray:
+    """Finalizador splitmix64: deriva un segundo hash independiente."""
+    with np.errstate(over="ignore"):
+        h = h.astype(np.uint64, copy=True)
+        h ^= h >> np.uint64(30)
+        h *= np.uint64(0xBF58476D1CE4E5B9)
+        h ^= h >> np.uint64(27)
+        h *= np.uint64(0x94D049BB133111EB)
+        h ^= h >> np.uint64(31)
+    return h
+
+
+class BocetoCuantiles:
+    """
+    Boceto de cuantiles combinable (compactadores al estilo KLL).
+
+    Cada nivel guarda valores con peso 2**nivel; al llenarse se ordena y
+    se promueve uno de cada dos elementos al nivel siguiente. La memoria
+    queda en O(k · log(n/k)) y dos bocetos se combinan sumando niveles.
+    Mientras no haya compactaciones el resultado es exacto.
+    """
+
+    def __init__(self, k: int = 2048, semilla: int = 0):
+        self.k = int(k)
+        self.n = 0
+        self.niveles: list[np.ndarray] = []
+        self._rng = np.random.default_rng(semilla)
+
+    def actualizar(self, valores) -> None:
+        v = np.asarray(valores, dtype=np.float64).ravel()
+        v = v[~np.isnan(v)]
+        if v.size == 0:
+            return
+        self.n += int(v.size)
+        if not self.niveles:
+            self.niveles.append(np.empty(0))
+        self.niveles[0] = np.concatenate([self.niveles[0], v])
+        self._compactar()
+
+    def combinar(self, otro: "BocetoCuantiles") -> "BocetoCuantiles":
+        while len(self.niveles) < len(otro.niveles):
+            self.niveles.append(np.empty(0))
+        for h, valores in enumerate(otro.niveles):
+            self.niveles[h] = np.concatenate([self.niveles[h], valores])
+        self.n += otro.n
+        self._compactar()
+        return self
+
+    def cuantil(self, q: float) -> float:
+        return float(self.cuantiles([q])[0])
+
+    def cuantiles(self, qs) -> np.ndarray:
+        qs = np.asarray(qs, dtype=np.float64)
+        if self.n == 0:
+            return np.full(qs.shape, np.nan)
+        if len(self.niveles) == 1:
+            # Sin compactaciones: cuantil exacto (interpolación lineal como pandas)
+            return np.quantile(self.niveles[0], qs)
+
+        valores = np.concatenate(self.niveles)
+        pesos = np.concatenate([np.full(v.size, 2.0 ** h) for h, v in enumerate(self.niveles)])
+        orden = np.argsort(valores, kind="stable")
+        valores, acumulado = valores[orden], np.cumsum(pesos[orden])
+        objetivo = qs * acumulado[-1]
+        pos = np.searchsorted(acumulado, objetivo, side="left")
+        return valores[np.clip(pos, 0, valores.size - 1)]
+
+    def _compactar(self) -> None:
+        h = 0
+        while h < len(self.niveles):
+            buf = self.niveles[h]
+            if buf.size > self.k:
+                buf = np.sort(buf)
+                resto = buf[-1:] if buf.size % 2 else buf[:0]
+                pares = buf[:-1] if buf.size % 2 else buf
+                desplazamiento = int(self._rng.integers(2))
+                self.niveles[h] = resto
+                if h + 1 == len(self.niveles):
+                    self.niveles.append(np.empty(0))
+                self.niveles[h + 1] = np.concatenate([self.niveles[h + 1], pares[desplazamiento::2]])
+            h += 1
+
+    @property
+    def nbytes(self) -> int:
+        return int(sum(v.nbytes for v in self.niveles))
+
+
+class FiltroBloom:
+    """
+    Filtro de Bloom vectorizado sobre hashes uint64.
+
+    Dimensionado para `capacidad` elementos con una tasa de falsos
+    positivos `tasa_fp`; si se insertan más elementos la tasa real sube.
+    """
+
+    def __init__(self, capacidad: int, tasa_fp: float = 1e-3):
+        if not 0 < tasa_fp < 1:
+            raise ValueError("tasa_fp debe estar entre 0 y 1.")
+        capacidad = max(int(capacidad), 1)
+        self.m = max(int(math.ceil(-capacidad * math.log(tasa_fp) / math.log(2) ** 2)), 8)
+        self.k = max(int(round(self.m / capacidad * math.log(2))), 1)
+        self.capacidad = capacidad
+        self.tasa_fp = tasa_fp
+        self.bits = np.zeros((self.m + 7) // 8, dtype=np.uint8)
+
+    def _posiciones(self, hashes: np.ndarray) -> np.ndarray:
+        # Doble hashing: h1 + i·h2 (mod m)
+        h1 = hashes.astype(np.uint64) % np.uint64(self.m)
+        h2 = (_mezclar(hashes) % np.uint64(self.m)) | np.uint64(1)
+        i = np.arange(self.k, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return (h1[:, None] + i[None, :] * h2[:, None]) % np.uint64(self.m)
+
+    def agregar_y_consultar(self, hashes: np.ndarray) -> np.ndarray:
+        """Devuelve qué hashes (probablemente) ya estaban y luego los agrega."""
+        if hashes.size == 0:
+            return np.zeros(0, dtype=bool)
+        pos = self._posiciones(hashes)
+        byte, bit = pos >> np.uint64(3), (pos & np.uint64(7)).astype(np.uint8)
+        presentes = ((self.bits[byte] >> bit) & 1).all(axis=1).astype(bool)
+        np.bitwise_or.at(self.bits, byte.ravel(), (np.uint8(1) << bit).ravel())
+        return presentes
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.bits.nbytes)
+
+
+class ConjuntoHashesDisco:
+    """
+    Conjunto exacto de hashes uint64 que se vuelca a disco.
+
+    Los hashes se mantienen ordenados en memoria; al superar
+    `max_en_memoria` se escriben como una corrida ordenada (.npy) que
+    luego se consulta con memory-map y búsqueda binaria.
+    """
+
+    def __init__(self, carpeta: str | None = None, max_en_memoria: int = 5_000_000):
+        self.max_en_memoria = int(max_en_memoria)
+        self._propia = carpeta is None
+        self.carpeta = tempfile.mkdtemp(prefix="hashes_") if carpeta is None else carpeta
+        os.makedirs(self.carpeta, exist_ok=True)
+        self._memoria = np.empty(0, dtype=np.uint64)
+        self._corridas: list[np.ndarray] = []
+
+    @staticmethod
+    def _contiene(ordenados: np.ndarray, hashes: np.ndarray) -> np.ndarray:
+        if ordenados.size == 0:
+            return np.zeros(hashes.size, dtype=bool)
+        pos = np.searchsorted(ordenados, hashes)
+        pos = np.minimum(pos, ordenados.size - 1)
+        return ordenados[pos] == hashes
+
+    def agregar_y_consultar(self, hashes: np.ndarray) -> np.ndarray:
+        """Devuelve qué hashes ya estaban en el conjunto y agrega los nuevos."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        presentes = self._contiene(self._memoria, hashes)
+        for corrida in self._corridas:
+            faltan = ~presentes
+            if not faltan.any():
+                break
+            presentes[faltan] = self._contiene(corrida, hashes[faltan])
+
+        self._memoria = np.union1d(self._memoria, hashes[~presentes])
+        if self._memoria.size > self.max_en_memoria:
+            ruta = os.path.join(self.carpeta, f"corrida_{len(self._corridas):05d}.npy")
+            np.save(ruta, self._memoria)
+            self._corridas.append(np.load(ruta, mmap_mode="r"))
+            self._memoria = np.empty(0, dtype=np.uint64)
+        return presentes
+
+    def cerrar(self) -> None:
+        self._corridas = []
+        if self._propia:
+            shutil.rmtree(self.carpeta, ignore_errors=True)
+
+
+def _bits_lideres_en_cero(w: np.ndarray) -> np.ndarray:
+    """Cantidad de ceros a la izquierda en enteros uint64 (exacto, vectorizado)."""
+    # frexp sobre mitades de 32 bits (exactas en float64) da su longitud en bits
+    _, largo_alto = np.frexp((w >> np.uint64(32)).astype(np.float64))
+    _, largo_bajo = np.frexp((w & np.uint64(0xFFFFFFFF)).astype(np.float64))
+    return np.where(largo_alto > 0, 32 - largo_alto, 64 - largo_bajo).astype(np.int64)
+
+
+class HyperLogLog:
+    """
+    Estimador de valores distintos HyperLogLog (2**p registros).
+
+    Error relativo típico ≈ 1.04 / sqrt(2**p); con p=14 ronda el 0.8%
+    usando 16 KB. Dos estimadores con el mismo `p` se combinan con el
+    máximo registro a registro.
+    """
+
+    def __init__(self, p: int = 14):
+        if not 4 <= p <= 18:
+            raise ValueError("p debe estar entre 4 y 18.")
+        self.p = p
+        self.m = 1 << p
+        self.registros = np.zeros(self.m, dtype=np.uint8)
+
+    def actualizar_hashes(self, hashes: np.ndarray) -> None:
+        h = np.asarray(hashes, dtype=np.uint64)
+        if h.size == 0:
+            return
+        idx = (h >> np.uint64(64 - self.p)).astype(np.int64)
+        # Bits restantes con un centinela para acotar el rango
+        w = (h << np.uint64(self.p)) | np.uint64(1 << (self.p - 1))
+        rho = _bits_lideres_en_cero(w) + 1
+        # Máximo por registro: ordenar (registro, rho) y tomar el último de cada grupo
+        claves = np.sort((idx << 8) | rho)
+        registros = claves >> 8
+        ultimo = np.append(registros[1:] != registros[:-1], True)
+        reg, valor = registros[ultimo], (claves[ultimo] & 0xFF).astype(np.uint8)
+        self.registros[reg] = np.maximum(self.registros[reg], valor)
+
+    def actualizar(self, valores) -> None:
+        """Agrega valores (se ignoran los nulos)."""
+        if isinstance(valores, np.ndarray) and valores.dtype.kind in "iuf":
+            v = valores[~np.isnan(valores)] if valores.dtype.kind == "f" else valores
+            self.actualizar_hashes(pd.util.hash_array(v))
+            return
+        s = pd.Series(valores).dropna()
+        if not s.empty:
+            self.actualizar_hashes(pd.util.hash_pandas_object(s, index=False).to_numpy())
+
+    def combinar(self, otro: "HyperLogLog") -> "HyperLogLog":
+        if otro.p != self.p:
+            raise ValueError("Sólo se combinan HyperLogLog con el mismo p.")
+        np.maximum(self.registros, otro.registros, out=self.registros)
+        return self
+
+    def estimar(self) -> float:
+        alfa = 0.7213 / (1 + 1.079 / self.m)
+        estimado = alfa * self.m ** 2 / np.sum(np.ldexp(1.0, -self.registros.astype(np.int64)))
+        ceros = int((self.registros == 0).sum())
+        if estimado <= 2.5 * self.m and ceros:
+            # Corrección para cardinalidades pequeñas (conteo lineal)
+            estimado = self.m * math.log(self.m / ceros)
+        return float(estimado)
@@ -0,0 +1,200 @@
+# core/cache.py
+from __future__ import annotations
+
+import hashlib
+import sys
+from collections import OrderedDict
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+LIMITE_BYTES_DEFECTO = 512 * 1024 ** 2
+FILAS_POR_BLOQUE_HUELLA = 1 << 20
+
+
+def huella_contenido(datos, *extras) -> str:
+    """
+    Calcula una huella (hash) estable del contenido de un archivo.
+
+    Parámetros:
+    - datos: bytes, bytearray o memoryview con el contenido subido.
+    - extras: opciones adicionales (p. ej. configuración de lectura) que
+      también forman parte de la clave, para no mezclar resultados.
+
+    Retorna:
+    - Cadena hexadecimal de 32 caracteres.
+    """
+    h = hashlib.blake2b(digest_size=16)
+    h.update(datos)
+    for extra in extras:
+        h.update(b"\x00")
+        h.update(repr(extra).encode("utf-8"))
+    return h.hexdigest()
+
+
+def huella_prefijo(df: pd.DataFrame, filas: int) -> str:
+    """
+    Huella de las primeras `filas` filas de `df`.
+
+    Se usa para reconocer archivos que sólo crecieron (filas agregadas al
+    final): si la huella del prefijo coincide con la guardada, lo ya
+    procesado sigue siendo válido. Se hashean todas las filas del prefijo
+    (por bloques, para acotar la memoria): una muestra no detecta una fila
+    editada entre las muestreadas.
+
+    Retorna:
+    - Cadena hexadecimal de 32 caracteres.
+    """
+    filas = min(int(filas), len(df))
+    h = hashlib.blake2b(digest_size=16)
+    for inicio in range(0, filas, FILAS_POR_BLOQUE_HUELLA):
+        bloque = df.iloc[inicio:min(inicio + FILAS_POR_BLOQUE_HUELLA, filas)]
+        h.update(pd.util.hash_pandas_object(bloque, index=False).to_numpy().tobytes())
+    return huella_contenido(h.digest(), filas, [str(c) for c in df.columns])
+
+
+def huella_dataframe(df: pd.DataFrame) -> str:
+    """Huella del contenido completo de un DataFrame (valores y columnas, sin índice)."""
+    datos = pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes() if len(df) else b""
+    return huella_contenido(datos, len(df), [str(c) for c in df.columns])
+
+
+def _tamano_bytes(valor: Any) -> int:
+    """Estimación del tamaño en memoria de un valor cacheado."""
+    if isinstance(valor, pd.DataFrame):
+        return int(valor.memory_usage(index=True, deep=True).sum())
+    if isinstance(valor, pd.Series):
+        return int(valor.memory_usage(index=True, deep=True))
+    if isinstance(valor, np.ndarray):
+        return int(valor.nbytes)
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(_tamano_bytes(k) + _tamano_bytes(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple, set)):
+        return sys.getsizeof(valor) + sum(_tamano_bytes(v) for v in valor)
+    # Objetos propios que declaran su tamaño (p. ej. MotorCorrelacion)
+    nbytes = getattr(valor, "nbytes", None)
+    if isinstance(nbytes, int):
+        return nbytes
+    return sys.getsizeof(valor)
+
+
+class CacheDatos:
+    """
+    Cache en memoria de DataFrames cargados, limpios y derivados.
+
+    - Las entradas se indexan por (huella del archivo, nombre del artefacto).
+    - La memoria total está acotada: al superar el límite se desalojan
+      las entradas usadas hace más tiempo (LRU).
+    - `activar(huella)` descarta todo lo que pertenece a otros archivos,
+      de modo que subir un archivo nuevo invalida la cache anterior.
+    """
+
+    def __init__(self, limite_bytes: int = LIMITE_BYTES_DEFECTO):
+        self.limite_bytes = int(limite_bytes)
+        self._entradas: OrderedDict[tuple[str, str], tuple[Any, int]] = OrderedDict()
+        self._bytes = 0
+        self._huella_activa: str | None = None
+        self.aciertos = 0
+        self.fallos = 0
+        self.desalojos = 0
+
+    def activar(self, huella: str) -> None:
+        """Marca `huella` como el archivo actual e invalida el resto."""
+        if huella != self._huella_activa:
+            for clave in [k for k in self._entradas if k[0] != huella]:
+                self._eliminar(clave)
+            self._huella_activa = huella
+
+    def invalidar(self, huella: str | None = None) -> None:
+        """Elimina las entradas de `huella` (o todas si es None)."""
+        for clave in [k for k in self._entradas if huella is None or k[0] == huella]:
+            self._eliminar(clave)
+
+    def obtener(self, huella: str, nombre: str, defecto: Any = None) -> Any:
+        clave = (huella, nombre)
+        if clave not in self._entradas:
+            self.fallos += 1
+            return defecto
+        self.aciertos += 1
+        self._entradas.move_to_end(clave)
+        return self._entradas[clave][0]
+
+    def guardar(self, huella: str, nombre: str, valor: Any) -> Any:
+        clave = (huella, nombre)
+        if clave in self._entradas:
+            self._eliminar(clave)
+
+        tamano = _tamano_bytes(valor)
+        if tamano > self.limite_bytes:
+            # No cabe ni sola: se devuelve sin cachear
+            return valor
+
+        self._entradas[clave] = (valor, tamano)
+        self._bytes += tamano
+        while self._bytes > self.limite_bytes:
+            self._eliminar(next(iter(self._entradas)))
+            self.desalojos += 1
+        return valor
+
+    def obtener_o_calcular(self, huella: str, nombre: str, calcular: Callable[[], Any]) -> Any:
+        clave = (huella, nombre)
+        if clave in self._entradas:
+            self.aciertos += 1
+            self._entradas.move_to_end(clave)
+            return self._entradas[clave][0]
+        self.fallos += 1
+        return self.guardar(huella, nombre, calcular())
+
+    def vista(self, huella: str) -> "VistaCache":
+        """Devuelve un acceso a la cache ligado a un único archivo."""
+        return VistaCache(self, huella)
+
+    def estadisticas(self) -> dict:
+        return {
+            "entradas": len(self._entradas),
+            "bytes": self._bytes,
+            "limite_bytes": self.limite_bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+            "desalojos": self.desalojos,
+        }
+
+    def _eliminar(self, clave: tuple[str, str]) -> None:
+        _, tamano = self._entradas.pop(clave)
+        self._bytes -= tamano
+
+
+class VistaCache:
+    """Acceso a `CacheDatos` restringido a la huella de un archivo."""
+
+    def __init__(self, cache: CacheDatos, huella: str):
+        self.cache = cache
+        self.huella = huella
+
+    def obtener_o_calcular(self, nombre: str, calcular: Callable[[], Any]) -> Any:
+        return self.cache.obtener_o_calcular(self.huella, nombre, calcular)
+
+    def obtener(self, nombre: str, defecto: Any = None) -> Any:
+        return self.cache.obtener(self.huella, nombre, defecto)
+
+    def guardar(self, nombre: str, valor: Any) -> Any:
+        return self.cache.guardar(self.huella, nombre, valor)
+
+
+def en_cache(cache: VistaCache | None, nombre: str, calcular: Callable[[], Any]) -> Any:
+    """
+    Atajo para código que puede ejecutarse con o sin cache:
+    si `cache` es None simplemente calcula el valor.
+    """
+    if cache is None:
+        return calcular()
+    return cache.obtener_o_calcular(nombre, calcular)
+
+
+def cache_de_sesion(limite_bytes: int = LIMITE_BYTES_DEFECTO) -> CacheDatos:
+    """Cache asociada a la sesión de Streamlit (sobrevive a los reruns)."""
+    if "cache_datos" not in st.session_state:
+        st.session_state["cache_datos"] = CacheDatos(limite_bytes)
+    return st.session_state["cache_datos"]
@@ -0,0 +1,284 @@
+# core/cache_disco.py
+from __future__ import annotations
+
+import json
+import os
+import uuid
+
+import pandas as pd
+import streamlit as st
+
+from core.correlacion import AcumuladorMomentos
+
+try:
+    import pyarrow.parquet as pq
+    PYARROW_DISPONIBLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    pq = None
+    PYARROW_DISPONIBLE = False
+
+CARPETA_CACHE = ".cache_datos"
+LIMITE_BYTES_DISCO = 2 * 1024 ** 3
+# Subir este número invalida lo guardado cuando cambia la lectura o la limpieza
+VERSION_CACHE = 2
+
+
+def desalojar_lru(carpeta: str, limite_bytes: int, conservar: set[str] | None = None) -> int:
+    """
+    Elimina los archivos menos recientemente usados (según mtime) de
+    `carpeta` hasta que el total quede por debajo de `limite_bytes`.
+
+    Retorna:
+    - Cantidad de archivos eliminados.
+    """
+    conservar = conservar or set()
+    try:
+        entradas = [e for e in os.scandir(carpeta) if e.is_file()]
+    except FileNotFoundError:
+        return 0
+
+    info = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in entradas]
+    total = sum(tam for _, tam, _ in info)
+    eliminados = 0
+    for _, tam, ruta in sorted(info):
+        if total <= limite_bytes:
+            break
+        if os.path.basename(ruta) in conservar:
+            continue
+        try:
+            os.remove(ruta)
+        except OSError:
+            continue
+        total -= tam
+        eliminados += 1
+    return eliminados
+
+
+class CacheColumnar:
+    """
+    Cache en disco (Parquet) de archivos subidos, indexada por la huella de sus bytes.
+
+    - 'cargado': el DataFrame tal como lo devuelve `cargar_datos`.
+    - 'limpio': la salida de `preparar_datos` (DataFrame + resumen JSON).
+
+    Las lecturas usan memory-map, el tamaño total está acotado
+    (desalojo LRU) y se llevan contadores de aciertos/fallos por tipo.
+    """
+
+    def __init__(self, carpeta: str = CARPETA_CACHE, limite_bytes: int = LIMITE_BYTES_DISCO):
+        self.carpeta = carpeta
+        self.limite_bytes = int(limite_bytes)
+        self._contadores: dict[str, dict[str, int]] = {}
+        if PYARROW_DISPONIBLE:
+            os.makedirs(self.carpeta, exist_ok=True)
+
+    @property
+    def disponible(self) -> bool:
+        return PYARROW_DISPONIBLE
+
+    def _ruta(self, huella: str, tipo: str, ext: str = "parquet") -> str:
+        return os.path.join(self.carpeta, f"{huella}_{tipo}_v{VERSION_CACHE}.{ext}")
+
+    def _contar(self, tipo: str, campo: str) -> None:
+        c = self._contadores.setdefault(tipo, {"aciertos": 0, "fallos": 0})
+        c[campo] += 1
+
+    def cargar(self, huella: str, tipo: str = "cargado") -> pd.DataFrame | None:
+        if not self.disponible:
+            return None
+        ruta = self._ruta(huella, tipo)
+        if not os.path.isfile(ruta):
+            self._contar(tipo, "fallos")
+            return None
+        try:
+            df = pd.read_parquet(ruta, engine="pyarrow", memory_map=True)
+        except Exception:
+            # Archivo corrupto o incompatible: se descarta
+            self._eliminar(ruta)
+            self._contar(tipo, "fallos")
+            return None
+        os.utime(ruta)
+        self._contar(tipo, "aciertos")
+        return df
+
+    def guardar(self, huella: str, tipo: str, df: pd.DataFrame) -> bool:
+        """Escribe `df` de forma atómica. Devuelve False si no se pudo serializar."""
+        if not self.disponible:
+            return False
+        ruta = self._ruta(huella, tipo)
+        tmp = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        try:
+            df.to_parquet(tmp, engine="pyarrow", index=True)
+            os.replace(tmp, ruta)
+        except Exception:
+            # p. ej. columnas object con tipos mezclados que Arrow no admite
+            self._eliminar(tmp)
+            return False
+        desalojar_lru(self.carpeta, self.limite_bytes, conservar={os.path.basename(ruta)})
+        return True
+
+    def cargar_limpio(self, huella: str) -> tuple[pd.DataFrame, dict] | None:
+        ruta_resumen = self._ruta(huella, "limpio", "json")
+        if not os.path.isfile(ruta_resumen):
+            self._contar("limpio", "fallos")
+            return None
+        df = self.cargar(huella, "limpio")
+        if df is None:
+            return None
+        try:
+            with open(ruta_resumen, encoding="utf-8") as f:
+                resumen = json.load(f)
+        except (OSError, ValueError):
+            # Resumen ilegible (p. ej. escrito a medias): se descarta la entrada completa
+            self._eliminar(ruta_resumen)
+            self._eliminar(self._ruta(huella, "limpio"))
+            self._contar("limpio", "fallos")
+            return None
+        os.utime(ruta_resumen)
+        return df, resumen
+
+    def guardar_limpio(self, huella: str, df: pd.DataFrame, resumen: dict) -> bool:
+        if not self.guardar(huella, "limpio", df):
+            return False
+        ruta = self._ruta(huella, "limpio", "json")
+        tmp = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        try:
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(resumen, f, ensure_ascii=False, default=str)
+            os.replace(tmp, ruta)
+        except Exception:
+            self._eliminar(tmp)
+            return False
+        return True
+
+    def cargar_momentos(self, clave: str) -> AcumuladorMomentos | None:
+        """Acumulador de momentos guardado para un dataset (ver `guardar_momentos`)."""
+        ruta = self._ruta(clave, "momentos", "npz")
+        if not os.path.isfile(ruta):
+            self._contar("momentos", "fallos")
+            return None
+        try:
+            acumulador = AcumuladorMomentos.cargar(ruta)
+        except Exception:
+            self._eliminar(ruta)
+            self._contar("momentos", "fallos")
+            return None
+        os.utime(ruta)
+        self._contar("momentos", "aciertos")
+        return acumulador
+
+    def guardar_momentos(self, clave: str, acumulador: AcumuladorMomentos) -> bool:
+        """
+        Persiste el acumulador bajo una clave estable del dataset (p. ej. el
+        nombre del archivo y las opciones de lectura), no bajo la huella del
+        contenido: así la próxima versión del archivo con filas agregadas lo
+        encuentra y sólo suma lo nuevo. Devuelve False si no se pudo escribir.
+        """
+        ruta = self._ruta(clave, "momentos", "npz")
+        tmp = f"{ruta}.{uuid.uuid4().hex}.tmp.npz"
+        try:
+            os.makedirs(self.carpeta, exist_ok=True)
+            acumulador.guardar(tmp)
+            os.replace(tmp, ruta)
+        except Exception:
+            # p. ej. disco lleno o sin permisos: el acumulador sigue valiendo en memoria
+            self._eliminar(tmp)
+            return False
+        desalojar_lru(self.carpeta, self.limite_bytes, conservar={os.path.basename(ruta)})
+        return True
+
+    def _prefijo_resultado(self, clave: str) -> str:
+        return os.path.join(self.carpeta, f"{clave}_resultado_v{VERSION_CACHE}")
+
+    def cargar_resultado(self, clave: str):
+        """`ResultadoAnalisis` guardado bajo `clave` (huella del dataset + configuración) o None."""
+        # Importación diferida: core.resultado depende (vía modelos) de este módulo
+        from core.resultado import ResultadoAnalisis
+
+        if not self.disponible:
+            return None
+        prefijo = self._prefijo_resultado(clave)
+        if not os.path.isfile(f"{prefijo}.json"):
+            self._contar("resultado", "fallos")
+            return None
+        try:
+            resultado = ResultadoAnalisis.cargar(prefijo)
+        except Exception:
+            # Parte desalojada, corrupta o de otro formato: se descarta completo
+            self._eliminar_resultado(prefijo)
+            self._contar("resultado", "fallos")
+            return None
+        for ruta in self._partes_resultado(prefijo):
+            if os.path.isfile(ruta):
+                os.utime(ruta)
+        self._contar("resultado", "aciertos")
+        return resultado
+
+    def guardar_resultado(self, clave: str, resultado) -> bool:
+        """Persiste un `ResultadoAnalisis`. Devuelve False si no se pudo serializar."""
+        if not self.disponible:
+            return False
+        prefijo = self._prefijo_resultado(clave)
+        try:
+            resultado.guardar(prefijo)
+        except Exception:
+            self._eliminar_resultado(prefijo)
+            return False
+        conservar = {os.path.basename(r) for r in self._partes_resultado(prefijo)}
+        desalojar_lru(self.carpeta, self.limite_bytes, conservar=conservar)
+        return True
+
+    @staticmethod
+    def _partes_resultado(prefijo: str) -> list[str]:
+        from core.resultado import TABLAS_RESULTADO
+
+        sufijos = (".json", "_correlacion.parquet", "_filas.parquet", "_atipicos.npz")
+        tablas = tuple(f"_{nombre}.parquet" for nombre in TABLAS_RESULTADO)
+        return [f"{prefijo}{sufijo}" for sufijo in sufijos + tablas]
+
+    def _eliminar_resultado(self, prefijo: str) -> None:
+        for ruta in self._partes_resultado(prefijo):
+            self._eliminar(ruta)
+
+    def vista_previa(self, huella: str, filas: int = 5) -> pd.DataFrame | None:
+        """Primeras filas de la copia 'cargado' sin leer el archivo completo."""
+        if not self.disponible:
+            return None
+        ruta = self._ruta(huella, "cargado")
+        if not os.path.isfile(ruta):
+            return None
+        try:
+            lote = next(pq.ParquetFile(ruta, memory_map=True).iter_batches(batch_size=filas), None)
+        except Exception:
+            return None
+        return None if lote is None else lote.to_pandas()
+
+    def estadisticas(self) -> dict:
+        try:
+            tamanos = [e.stat().st_size for e in os.scandir(self.carpeta) if e.is_file()]
+        except FileNotFoundError:
+            tamanos = []
+        aciertos = sum(c["aciertos"] for c in self._contadores.values())
+        fallos = sum(c["fallos"] for c in self._contadores.values())
+        return {
+            "disponible": self.disponible,
+            "archivos": len(tamanos),
+            "bytes": int(sum(tamanos)),
+            "limite_bytes": self.limite_bytes,
+            "aciertos": aciertos,
+            "fallos": fallos,
+            "por_tipo": {k: dict(v) for k, v in self._contadores.items()},
+        }
+
+    @staticmethod
+    def _eliminar(ruta: str) -> None:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+@st.cache_resource
+def cache_columnar() -> CacheColumnar:
+    """Instancia única por proceso, compartida entre sesiones."""
+    return CacheColumnar()
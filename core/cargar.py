@@ -1,30 +1,93 @@
 # core/cargar.py
 from __future__ import annotations
 
+import warnings
 import pandas as pd
-from io import BytesIO
+from typing import Callable, Iterator
+from pandas.api.types import (
+    is_float_dtype,
+    is_integer_dtype,
+    is_object_dtype,
+    union_categoricals,
+)
 
-def cargar_datos(uploaded_file) -> pd.DataFrame:
+TAMANO_BLOQUE = 200_000
+FILAS_MUESTRA = 50_000
+MAX_CATEGORIAS = 1_000
+PROPORCION_CATEGORIAS = 0.5
+EXITO_MINIMO_FECHAS = 0.95
+
+
+MOTORES = ("pandas", "arrow", "streaming")
+MODOS = ("completo", "bloques")
+
+
+def cargar_datos(
+    uploaded_file,
+    modo: str = "completo",
+    tamano_bloque: int = TAMANO_BLOQUE,
+    progreso: Callable[[float], None] | None = None,
+    motor: str = "pandas",
+    hoja: str | int | None = None,
+    columnas: list[str] | None = None,
+) -> pd.DataFrame:
     """
     Carga un archivo subido desde Streamlit (UploadedFile) en formato CSV o Excel.
 
     Parámetros:
     - uploaded_file: archivo subido desde st.file_uploader
+    - modo: "completo" (lectura en una sola pasada) o "bloques"
+      (sólo CSV: esquema inferido de una muestra y lectura tipada por bloques;
+      los enteros se reducen al tipo mínimo una vez unidos los bloques).
+    - tamano_bloque: filas por bloque en el modo "bloques" / lote en "streaming".
+    - progreso: callback opcional que recibe la fracción leída (0..1).
+    - motor: "pandas" (por defecto), "arrow" (CSV con lector multihilo de
+      pyarrow) o "streaming" (Excel en modo sólo lectura, por lotes de filas).
+    - hoja: nombre o posición de la hoja de Excel (por defecto la primera).
+    - columnas: si se indica, sólo se materializan esas columnas.
 
     Retorna:
     - Un DataFrame con los datos cargados.
     """
     if uploaded_file is None or getattr(uploaded_file, "name", None) is None:
         raise ValueError("No se recibió un archivo válido.")
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de lectura no soportado: {motor}. Usa {', '.join(MOTORES)}.")
+    if modo not in MODOS:
+        raise ValueError(f"Modo de lectura no soportado: {modo}. Usa {', '.join(MODOS)}.")
 
     name = uploaded_file.name.lower()
+    columnas = list(columnas) if columnas else None
 
     try:
+        uploaded_file.seek(0)
         if name.endswith(".csv"):
-            df = pd.read_csv(uploaded_file)
+            if motor == "arrow":
+                df = _leer_csv_arrow(uploaded_file, columnas)
+            elif modo == "bloques":
+                df = reducir_enteros(
+                    concatenar_bloques(
+                        leer_csv_por_bloques(
+                            uploaded_file, tamano_bloque=tamano_bloque, progreso=progreso, columnas=columnas
+                        )
+                    )
+                )
+            else:
+                df = pd.read_csv(uploaded_file, usecols=_selector_columnas(columnas))
         elif name.endswith((".xls", ".xlsx")):
-            bio = BytesIO(uploaded_file.getbuffer())
-            df = pd.read_excel(bio)
+            if motor == "streaming" and name.endswith(".xlsx"):
+                df = concatenar_bloques(
+                    leer_excel_por_lotes(
+                        uploaded_file, hoja=hoja, columnas=columnas, tamano_lote=tamano_bloque, progreso=progreso
+                    )
+                )
+            else:
+                # UploadedFile ya es un buffer en memoria: no hace falta copiarlo
+                df = pd.read_excel(
+                    uploaded_file,
+                    sheet_name=0 if hoja is None else hoja,
+                    usecols=_selector_columnas(columnas),
+                )
         else:
             raise ValueError("Formato no soportado. Usa .csv, .xls o .xlsx.")
     except Exception as e:
@@ -37,3 +100,305 @@ def cargar_datos(uploaded_file) -> pd.DataFrame:
         raise ValueError("El archivo se cargó pero no contiene datos.")
 
     return df
+
+
+def listar_hojas(uploaded_file) -> list[str]:
+    """Nombres de las hojas de un .xlsx sin leer su contenido."""
+    from openpyxl import load_workbook
+
+    uploaded_file.seek(0)
+    libro = load_workbook(uploaded_file, read_only=True)
+    try:
+        return list(libro.sheetnames)
+    finally:
+        libro.close()
+        uploaded_file.seek(0)
+
+
+def leer_encabezados(uploaded_file, hoja: str | int | None = None) -> list[str]:
+    """Nombres de columna (ya normalizados) leyendo sólo la primera fila."""
+    name = uploaded_file.name.lower()
+    uploaded_file.seek(0)
+    try:
+        if name.endswith(".xlsx"):
+            from openpyxl import load_workbook
+
+            libro = load_workbook(uploaded_file, read_only=True, data_only=True)
+            try:
+                hoja_ws = _hoja(libro, hoja)
+                fila = next(hoja_ws.iter_rows(max_row=1, values_only=True), ())
+            finally:
+                libro.close()
+            return [str(c).strip() for c in fila if c is not None]
+        if name.endswith(".xls"):
+            vacio = pd.read_excel(uploaded_file, sheet_name=0 if hoja is None else hoja, nrows=0)
+            return [str(c).strip() for c in vacio.columns]
+        return [str(c).strip() for c in pd.read_csv(uploaded_file, nrows=0).columns]
+    finally:
+        uploaded_file.seek(0)
+
+
+def leer_excel_por_lotes(
+    uploaded_file,
+    hoja: str | int | None = None,
+    columnas: list[str] | None = None,
+    tamano_lote: int = TAMANO_BLOQUE,
+    progreso: Callable[[float], None] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Recorre una hoja de .xlsx en modo sólo lectura y entrega lotes de filas.
+
+    - Sólo se descomprime/parsea la hoja pedida (el resto del libro no se toca).
+    - Con `columnas`, la lectura se corta en la última columna necesaria y
+      únicamente esas columnas llegan al DataFrame.
+    """
+    from openpyxl import load_workbook
+
+    uploaded_file.seek(0)
+    libro = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        ws = _hoja(libro, hoja)
+        filas = ws.iter_rows(values_only=True)
+        encabezado = [None if c is None else str(c).strip() for c in next(filas, ())]
+
+        if columnas:
+            faltantes = [c for c in columnas if c not in encabezado]
+            if faltantes:
+                raise ValueError(f"Columnas inexistentes en la hoja: {faltantes}")
+            posiciones = [encabezado.index(c) for c in columnas]
+            filas = ws.iter_rows(min_row=2, max_col=max(posiciones) + 1, values_only=True)
+        else:
+            posiciones = [i for i, c in enumerate(encabezado) if c is not None]
+        nombres = [encabezado[i] for i in posiciones]
+
+        total = ws.max_row or 0
+        leidas = 0
+        lote: list[tuple] = []
+        for fila in filas:
+            lote.append(tuple(fila[i] if i < len(fila) else None for i in posiciones))
+            if len(lote) >= tamano_lote:
+                leidas += len(lote)
+                yield pd.DataFrame.from_records(lote, columns=nombres)
+                lote = []
+                if progreso is not None and total:
+                    progreso(min(leidas / total, 1.0))
+        if lote:
+            yield pd.DataFrame.from_records(lote, columns=nombres)
+    finally:
+        libro.close()
+
+    if progreso is not None:
+        progreso(1.0)
+
+
+def _hoja(libro, hoja: str | int | None):
+    if hoja is None:
+        return libro.worksheets[0]
+    if isinstance(hoja, int):
+        return libro.worksheets[hoja]
+    return libro[hoja]
+
+
+def _selector_columnas(columnas: list[str] | None):
+    """`usecols` que compara contra nombres normalizados (sin espacios)."""
+    if not columnas:
+        return None
+    buscadas = set(columnas)
+    return lambda c: str(c).strip() in buscadas
+
+
+def _leer_csv_arrow(uploaded_file, columnas: list[str] | None) -> pd.DataFrame:
+    """Lectura multihilo con pyarrow; la proyección se hace antes de convertir."""
+    from pyarrow import csv as pa_csv
+
+    incluir = None
+    if columnas:
+        crudas = pd.read_csv(uploaded_file, nrows=0).columns
+        uploaded_file.seek(0)
+        buscadas = set(columnas)
+        incluir = [c for c in crudas if str(c).strip() in buscadas]
+
+    tabla = pa_csv.read_csv(
+        uploaded_file,
+        read_options=pa_csv.ReadOptions(use_threads=True),
+        convert_options=pa_csv.ConvertOptions(include_columns=incluir),
+    )
+    # Fechas como datetime64 (igual que la lectura por bloques)
+    return tabla.to_pandas(date_as_object=False)
+
+
+def inferir_esquema(muestra: pd.DataFrame) -> dict:
+    """
+    Deduce tipos compactos a partir de una muestra del archivo.
+
+    Retorna un dict con listas de columnas:
+    - 'categorias': texto de baja cardinalidad (se leerá como `category`)
+    - 'fechas': texto que se interpreta como fecha en la muestra
+    - 'enteros' / 'flotantes': numéricas (los flotantes pueden pasar a float32)
+    """
+    categorias, fechas, enteros, flotantes = [], [], [], []
+
+    for col in muestra.columns:
+        s = muestra[col]
+        if is_integer_dtype(s):
+            enteros.append(col)
+        elif is_float_dtype(s):
+            flotantes.append(col)
+        elif is_object_dtype(s):
+            valores = s.dropna()
+            if valores.empty:
+                continue
+            if _parece_fecha(valores):
+                fechas.append(col)
+                continue
+            n_unicos = valores.nunique()
+            if n_unicos <= MAX_CATEGORIAS and n_unicos <= PROPORCION_CATEGORIAS * len(valores):
+                categorias.append(col)
+
+    return {
+        "categorias": categorias,
+        "fechas": fechas,
+        "enteros": enteros,
+        "flotantes": flotantes,
+    }
+
+
+def leer_csv_por_bloques(
+    uploaded_file,
+    esquema: dict | None = None,
+    tamano_bloque: int = TAMANO_BLOQUE,
+    progreso: Callable[[float], None] | None = None,
+    flotantes_32: bool = False,
+    columnas: list[str] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Lee un CSV por bloques ya tipados.
+
+    - Si no se pasa `esquema`, se infiere de las primeras filas.
+    - Texto de baja cardinalidad llega como `category`, las fechas
+      como datetime. Los enteros no se reducen por bloque: el tipo mínimo
+      de un bloque (int8, int16...) no tiene por qué servir para el
+      siguiente, y tipos distintos entre bloques cambian los hashes de fila.
+      `reducir_enteros` lo hace una sola vez sobre el resultado unido.
+    - Los flotantes se reducen a float32 sólo si `flotantes_32=True`.
+    - Con `columnas` sólo se parsean esas columnas.
+    """
+    total = _tamano_archivo(uploaded_file)
+
+    if esquema is None:
+        uploaded_file.seek(0)
+        esquema = inferir_esquema(
+            pd.read_csv(uploaded_file, nrows=FILAS_MUESTRA, usecols=_selector_columnas(columnas))
+        )
+    uploaded_file.seek(0)
+
+    dtype = {c: "category" for c in esquema.get("categorias", [])}
+    with pd.read_csv(
+        uploaded_file, chunksize=tamano_bloque, dtype=dtype, usecols=_selector_columnas(columnas)
+    ) as lector:
+        yield from _tipar_bloques(lector, esquema, uploaded_file, total, progreso, flotantes_32)
+
+    if progreso is not None:
+        progreso(1.0)
+
+
+def _tipar_bloques(lector, esquema, uploaded_file, total, progreso, flotantes_32):
+    for bloque in lector:
+        for col in esquema.get("fechas", []):
+            if col in bloque.columns:
+                with warnings.catch_warnings():
+                    warnings.simplefilter("ignore", UserWarning)
+                    bloque[col] = pd.to_datetime(bloque[col], errors="coerce")
+        if flotantes_32:
+            for col in esquema.get("flotantes", []):
+                if col in bloque.columns and is_float_dtype(bloque[col]):
+                    bloque[col] = bloque[col].astype("float32")
+
+        bloque.columns = [str(c).strip() for c in bloque.columns]
+        if progreso is not None and total:
+            progreso(min(uploaded_file.tell() / total, 1.0))
+        yield bloque
+
+
+def concatenar_bloques(bloques, ignorar_indice: bool = True) -> pd.DataFrame:
+    """
+    Concatena bloques a medida que llegan, columna por columna.
+
+    Cada bloque se separa en columnas propias y se suelta antes de leer el
+    siguiente; al final cada columna se une por separado (las `category`
+    con `union_categoricals`, que unifica sus categorías) y se liberan sus
+    partes. El pico de memoria queda en el tamaño del resultado más un
+    bloque o una columna, en lugar del doble del resultado que cuesta
+    `pd.concat` sobre la lista de bloques. El DataFrame resultante no se
+    consolida (un bloque interno por columna).
+    """
+    columnas: list | None = None
+    partes: list[list] = []
+    indices: list[pd.Index] = []
+    filas = 0
+    for bloque in bloques:
+        if columnas is None:
+            columnas = list(bloque.columns)
+            partes = [[] for _ in columnas]
+        elif list(bloque.columns) != columnas:
+            raise ValueError("Los bloques no tienen las mismas columnas.")
+        for j, piezas in enumerate(partes):
+            # Copia propia de la columna: el bloque (arreglos 2D) se libera al avanzar
+            piezas.append(bloque.iloc[:, j].copy())
+        filas += len(bloque)
+        if not ignorar_indice:
+            indices.append(bloque.index)
+    if columnas is None:
+        return pd.DataFrame()
+
+    valores = {}
+    for j in range(len(columnas)):
+        piezas, partes[j] = partes[j], []
+        if all(isinstance(p.dtype, pd.CategoricalDtype) for p in piezas):
+            valores[j] = pd.Series(union_categoricals(piezas), copy=False)
+        else:
+            valores[j] = pd.concat(piezas, ignore_index=True)
+        del piezas
+
+    # Desde Series (no arreglos sueltos): pandas no vuelve a inferir tipos en las object
+    df = pd.DataFrame(valores, index=pd.RangeIndex(filas), copy=False)
+    df.columns = columnas
+    if indices:
+        df.index = indices[0].append(indices[1:])
+    return df
+
+
+def reducir_enteros(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reduce cada columna entera al tipo con signo más chico que admite su
+    mínimo y máximo finales (int8, int16, int32). Se aplica una vez sobre el
+    DataFrame completo, no por bloque. Modifica y retorna `df`.
+    """
+    for j in range(df.shape[1]):
+        s = df.iloc[:, j]
+        if is_integer_dtype(s) and len(s):
+            reducida = pd.to_numeric(s, downcast="integer")
+            if reducida.dtype != s.dtype:
+                df.isetitem(j, reducida)
+    return df
+
+
+def _parece_fecha(valores: pd.Series) -> bool:
+    # Evita tomar como fecha columnas de texto puramente numérico
+    if pd.to_numeric(valores, errors="coerce").notna().mean() > 0.5:
+        return False
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        fechas = pd.to_datetime(valores, errors="coerce")
+    return fechas.notna().mean() >= EXITO_MINIMO_FECHAS
+
+
+def _tamano_archivo(uploaded_file) -> int:
+    tamano = getattr(uploaded_file, "size", None)
+    if tamano:
+        return int(tamano)
+    pos = uploaded_file.tell()
+    uploaded_file.seek(0, 2)
+    tamano = uploaded_file.tell()
+    uploaded_file.seek(pos)
+    return int(tamano)
@@ -0,0 +1,616 @@
+# core/correlacion.py
+from __future__ import annotations
+
+import hashlib
+import itertools
+from typing import Callable, Iterable
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import is_bool_dtype, is_numeric_dtype
+
+from core.bocetos import hashes_filas
+
+METODOS = ("pearson", "spearman", "kendall")
+FILAS_POR_BLOQUE = 1_000_000
+
+
+def _columnas_numericas(df: pd.DataFrame) -> list:
+    """Numéricas reales (sin booleanas), como en `obtener_matriz_correlacion`."""
+    return [c for c in df.columns if is_numeric_dtype(df[c]) and not is_bool_dtype(df[c])]
+
+
+def _a_matriz(df: pd.DataFrame, columnas: list) -> np.ndarray:
+    """Bloque numérico como matriz float64 contigua por columnas (orden Fortran)."""
+    if not columnas:
+        return np.empty((len(df), 0), order="F")
+    bloque = df[columnas].apply(pd.to_numeric, errors="coerce")
+    return np.asfortranarray(bloque.to_numpy(dtype="float64", na_value=np.nan))
+
+
+def rangos(x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Rangos de una columna (NaN se conserva).
+
+    Retorna:
+    - rangos promedio (1..n, empates promediados, como `rank(method="average")`)
+    - rangos densos enteros (0..k-1; -1 en NaN), útiles para Kendall
+    """
+    n = x.size
+    promedio = np.full(n, np.nan)
+    densos = np.full(n, -1, dtype=np.int64)
+    validos = np.flatnonzero(~np.isnan(x))
+    if validos.size == 0:
+        return promedio, densos
+
+    orden = validos[np.argsort(x[validos], kind="mergesort")]
+    ordenados = x[orden]
+    cambios = np.empty(ordenados.size, dtype=bool)
+    cambios[0] = True
+    np.not_equal(ordenados[1:], ordenados[:-1], out=cambios[1:])
+    grupo = np.cumsum(cambios) - 1
+    inicio = np.flatnonzero(cambios)
+    conteo = np.diff(np.append(inicio, ordenados.size))
+
+    promedio[orden] = (inicio + (conteo + 1) / 2.0)[grupo]
+    densos[orden] = grupo
+    return promedio, densos
+
+
+def _momentos(X: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Momentos por pares completos de un bloque (NaN = faltante), vía BLAS.
+
+    Retorna matrices p×p:
+    - N[i, j]: filas donde ambas columnas tienen dato
+    - S[i, j]: Σ x_i sobre esas filas
+    - Q[i, j]: Σ x_i² sobre esas filas
+    - P[i, j]: Σ x_i·x_j
+    """
+    n, p = X.shape
+    nulos = np.isnan(X)
+    if not nulos.any():
+        N = np.full((p, p), float(n))
+        S = np.repeat(X.sum(axis=0)[:, None], p, axis=1)
+        Q = np.repeat(np.einsum("ij,ij->j", X, X)[:, None], p, axis=1)
+        return N, S, Q, X.T @ X
+
+    M = (~nulos).astype(np.float64)
+    X0 = np.where(nulos, 0.0, X)
+    return M.T @ M, X0.T @ M, (X0 * X0).T @ M, X0.T @ X0
+
+
+def _correlacion_momentos(N, S, Q, P) -> np.ndarray:
+    """Pearson por pares a partir de los momentos de `_momentos`."""
+    with np.errstate(invalid="ignore", divide="ignore"):
+        cov = N * P - S * S.T
+        var = N * Q - S * S
+        r = cov / np.sqrt(var * var.T)
+    r[N < 2] = np.nan
+    r = np.clip(r, -1.0, 1.0)
+    diag = np.diag(r).copy()
+    np.fill_diagonal(r, np.where(np.isnan(diag), np.nan, 1.0))
+    return r
+
+
+def _pearson_bloque(X: np.ndarray) -> np.ndarray:
+    """
+    Pearson por pares completos mediante productos matriciales (BLAS).
+
+    Sin NaN basta con Xcᵀ·Xc. Con NaN se usan sumas enmascaradas: para
+    cada par (i, j) sólo cuentan las filas donde ambas columnas tienen dato.
+    """
+    if X.shape[1] == 0:
+        return np.empty((0, 0))
+    # Centrar no cambia la correlación y mejora la estabilidad numérica
+    Xc = X - _medias_validas(X)
+    return _correlacion_momentos(*_momentos(Xc))
+
+
+def _medias_validas(X: np.ndarray) -> np.ndarray:
+    """Media por columna ignorando NaN (0 en columnas vacías, sin avisos)."""
+    validos = (~np.isnan(X)).sum(axis=0)
+    return np.where(validos > 0, np.nansum(X, axis=0) / np.maximum(validos, 1), 0.0)
+
+
+def _correlacion_filas(Xc: np.ndarray, a: int, b: int) -> np.ndarray:
+    """
+    Filas a..b-1 de la matriz de Pearson por pares completos, sin
+    construir la matriz p×p completa (`Xc` ya centrada, NaN = faltante).
+    """
+    nulos = np.isnan(Xc)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        if not nulos.any():
+            norma = np.sqrt(np.einsum("ij,ij->j", Xc, Xc))
+            r = (Xc[:, a:b].T @ Xc) / np.outer(norma[a:b], norma)
+        else:
+            M = (~nulos).astype(np.float64)
+            X0 = np.where(nulos, 0.0, Xc)
+            N = M[:, a:b].T @ M
+            S_i = X0[:, a:b].T @ M
+            S_j = M[:, a:b].T @ X0
+            Q_i = (X0[:, a:b] ** 2).T @ M
+            Q_j = M[:, a:b].T @ (X0 * X0)
+            cov = N * (X0[:, a:b].T @ X0) - S_i * S_j
+            r = cov / np.sqrt((N * Q_i - S_i * S_i) * (N * Q_j - S_j * S_j))
+            r[N < 2] = np.nan
+    return np.clip(r, -1.0, 1.0)
+
+
+def _candidatos(V: np.ndarray, fila0: int, k: int, umbral: float):
+    """Hasta k pares (i<j) de un bloque de filas con |r| >= umbral, vía argpartition."""
+    b, p = V.shape
+    absv = np.abs(V)
+    with np.errstate(invalid="ignore"):
+        validos = (np.arange(p)[None, :] > (fila0 + np.arange(b))[:, None]) & (absv >= umbral)
+    plano = np.flatnonzero(validos)
+    if plano.size > k:
+        plano = plano[np.argpartition(-absv.ravel()[plano], k - 1)[:k]]
+    return fila0 + plano // p, plano % p, V.ravel()[plano]
+
+
+def pares_fuertes(
+    fuente,
+    k: int = 10,
+    umbral: float = 0.0,
+    metodo: str = "pearson",
+    celdas_bloque: int = 4_000_000,
+) -> pd.DataFrame:
+    """
+    Los k pares de variables con mayor |r| (triángulo superior, sin diagonal ni NaN).
+
+    Parámetros:
+    - fuente: matriz de correlación (DataFrame) o `MotorCorrelacion`; con
+      el motor las filas de la matriz se calculan por bloques y la matriz
+      p×p nunca se materializa completa.
+    - umbral: descarta pares con |r| < umbral antes de seleccionar.
+    - celdas_bloque: tamaño aproximado (filas × columnas) de cada bloque.
+
+    Retorna:
+    - DataFrame con var1, var2 (en el orden de la matriz), r y abs_r,
+      ordenado por abs_r descendente.
+    """
+    if isinstance(fuente, MotorCorrelacion):
+        columnas = fuente.columnas_base
+        bloques = fuente.bloques(metodo, celdas_bloque)
+    else:
+        columnas = list(fuente.columns) if isinstance(fuente, pd.DataFrame) else []
+        valores = fuente.to_numpy(dtype="float64") if columnas else np.empty((0, 0))
+        filas = max(celdas_bloque // max(len(columnas), 1), 1)
+        bloques = ((a, valores[a:a + filas]) for a in range(0, len(columnas), filas))
+
+    ii, jj, rr = [np.empty(0, np.int64)], [np.empty(0, np.int64)], [np.empty(0)]
+    if k > 0:
+        for fila0, V in bloques:
+            i, j, r = _candidatos(V, fila0, k, umbral)
+            ii.append(i)
+            jj.append(j)
+            rr.append(r)
+    i, j, r = np.concatenate(ii), np.concatenate(jj), np.concatenate(rr)
+    # Orden final: |r| descendente; empates en el orden de la matriz
+    orden = np.lexsort((j, i, -np.abs(r)))[:k]
+    nombres = np.asarray(columnas, dtype=object)
+    return pd.DataFrame({
+        "var1": nombres[i[orden]] if len(orden) else [],
+        "var2": nombres[j[orden]] if len(orden) else [],
+        "r": r[orden],
+        "abs_r": np.abs(r[orden]),
+    })
+
+
+def _inversiones(v: np.ndarray) -> int:
+    """
+    Cuenta pares i<j con v[i] > v[j] (enteros >= 0) en O(n log K).
+
+    Recorre los bits de mayor a menor: en cada nivel los elementos quedan
+    agrupados por los bits superiores (en su orden original) y cada 0
+    suma los 1 que lo preceden en su grupo. Luego cada grupo se parte de
+    forma estable (ceros primero) sólo con sumas acumuladas, sin ordenar.
+    """
+    n = v.size
+    if n < 2:
+        return 0
+    tipo = np.int32 if n < 2 ** 31 else np.int64
+    a = np.asarray(v, dtype=tipo)
+    idx = np.arange(n, dtype=tipo)
+    total = 0
+    for b in range(int(a.max()).bit_length() - 1, -1, -1):
+        bit = (a >> b) & 1
+        prefijo = a >> (b + 1)
+        inicio = np.empty(n, dtype=bool)
+        inicio[0] = True
+        np.not_equal(prefijo[1:], prefijo[:-1], out=inicio[1:])
+        ini = np.flatnonzero(inicio)
+        if ini.size == n:
+            break  # todos los grupos tienen un solo elemento
+        tam = np.diff(ini, append=n)
+
+        unos_antes = np.cumsum(bit, dtype=tipo)
+        unos_antes -= bit
+        unos_previos = unos_antes - np.repeat(unos_antes[ini], tam)
+        es_cero = bit == 0
+        total += int(unos_previos.sum(where=es_cero, dtype=np.int64))
+
+        base = np.repeat(ini.astype(tipo), tam)
+        ceros_grupo = np.repeat((tam - np.add.reduceat(bit, ini)).astype(tipo), tam)
+        pos = np.where(es_cero, idx - unos_previos, base + ceros_grupo + unos_previos)
+        siguiente = np.empty_like(a)
+        siguiente[pos] = a
+        a = siguiente
+    return total
+
+
+def _empates(densos: np.ndarray) -> int:
+    conteo = np.bincount(densos)
+    return int((conteo * (conteo - 1) // 2).sum())
+
+
+def kendall_tau_b(dx: np.ndarray, dy: np.ndarray) -> float:
+    """
+    Tau-b de Kendall en O(n log n) (algoritmo de Knight) a partir de
+    rangos densos ya calculados (-1 = NaN, se descartan por pares).
+    """
+    validos = (dx >= 0) & (dy >= 0)
+    x, y = dx[validos], dy[validos]
+    n = x.size
+    if n < 2:
+        return np.nan
+
+    # Orden por (x, y) con una sola clave entera
+    orden = np.argsort(x * (int(y.max()) + 1) + y)
+    x, y = x[orden], y[orden]
+    n0 = n * (n - 1) // 2
+    n1 = _empates(x)
+    n2 = _empates(y)
+    # Empates conjuntos: corridas iguales en (x, y) ya ordenados
+    cambios = np.append(True, (x[1:] != x[:-1]) | (y[1:] != y[:-1]))
+    corridas = np.diff(np.append(np.flatnonzero(cambios), n))
+    n3 = int((corridas * (corridas - 1) // 2).sum())
+
+    discordantes = _inversiones(y)
+    denominador = np.sqrt(float(n0 - n1) * float(n0 - n2))
+    if denominador == 0:
+        return np.nan
+    return float((n0 - n1 - n2 + n3 - 2 * discordantes) / denominador)
+
+
+class AcumuladorMomentos:
+    """
+    Momentos combinables por par de columnas: N, Σx, Σx² y Σxy.
+
+    Permite obtener la matriz de Pearson y las medias/desviaciones por
+    columna sin volver a recorrer el historial:
+
+    - `actualizar(df)` suma sólo las filas nuevas.
+    - `combinar(otro)` junta acumuladores de bloques o de otros procesos.
+    - `guardar(ruta)` / `cargar(ruta)` lo persisten junto al dataset (.npz).
+    - `sincronizar(df)` / `sincronizar_bloques(leer)` detectan (por huella
+      de todas las filas ya sumadas) si el archivo sólo creció y en ese
+      caso suman únicamente las filas agregadas.
+
+    Se alimenta con el mismo DataFrame que se analiza (el limpio), así
+    Pearson y el z-score coinciden con el resto del informe. Si la
+    limpieza cambia filas ya sumadas (p. ej. otra mediana de imputación
+    al llegar filas nuevas), la huella no coincide y se recalcula.
+
+    Las sumas se guardan desplazadas respecto de una referencia por columna
+    (la media del primer bloque) para evitar la cancelación numérica de
+    Σx² - (Σx)²/N con valores grandes.
+    """
+
+    def __init__(self, columnas: list):
+        self.columnas = list(columnas)
+        p = len(self.columnas)
+        self.desplazamiento: np.ndarray | None = None
+        self.N = np.zeros((p, p))
+        self.S = np.zeros((p, p))
+        self.Q = np.zeros((p, p))
+        self.P = np.zeros((p, p))
+        self.filas = 0
+        self.huella: str | None = None
+        # Huella del archivo de origen: si no cambió, no hace falta hashear filas
+        self.fuente: str | None = None
+
+    @classmethod
+    def desde_dataframe(cls, df: pd.DataFrame) -> "AcumuladorMomentos":
+        acumulador = cls(_columnas_numericas(df))
+        acumulador.sincronizar(df)
+        return acumulador
+
+    def actualizar(self, df: pd.DataFrame) -> "AcumuladorMomentos":
+        """Agrega las filas de `df` (por bloques de filas para acotar la memoria)."""
+        for inicio in range(0, len(df), FILAS_POR_BLOQUE):
+            self._sumar(_a_matriz(df.iloc[inicio:inicio + FILAS_POR_BLOQUE], self.columnas))
+        self.huella = self.fuente = None
+        return self
+
+    def _sumar(self, X: np.ndarray) -> None:
+        if self.desplazamiento is None:
+            self.desplazamiento = _medias_validas(X)
+        N, S, Q, P = _momentos(X - self.desplazamiento)
+        self.N += N
+        self.S += S
+        self.Q += Q
+        self.P += P
+        self.filas += X.shape[0]
+
+    def sincronizar(self, df: pd.DataFrame, fuente: str | None = None) -> str:
+        """
+        Pone el acumulador al día con `df` (ver `sincronizar_bloques`).
+
+        Parámetros:
+        - fuente: huella del archivo del que sale `df` (p. ej. la de sus
+          bytes y opciones de lectura). Si es la misma de la última
+          sincronización, `df` no cambió y no se hashean sus filas.
+
+        Retorna:
+        - "sin_cambios", "incremental" (sólo se sumaron las filas nuevas)
+          o "completo" (se recalculó desde cero).
+        """
+        if fuente is not None and fuente == self.fuente and self.huella is not None and self.filas == len(df):
+            return "sin_cambios"
+        estado = self.sincronizar_bloques(
+            lambda: (df.iloc[i:i + FILAS_POR_BLOQUE] for i in range(0, max(len(df), 1), FILAS_POR_BLOQUE))
+        )
+        self.fuente = fuente
+        return estado
+
+    def corresponde(self, df: pd.DataFrame) -> bool:
+        """True si el acumulador quedó sincronizado con `df` (mismas columnas numéricas y filas)."""
+        return self.huella is not None and self.filas == len(df) and self.columnas == _columnas_numericas(df)
+
+    def sincronizar_bloques(self, leer: Callable[[], Iterable[pd.DataFrame]]) -> str:
+        """
+        Pone el acumulador al día con los bloques de filas que produce `leer()`.
+
+        Se hashean todas las filas ya sumadas (no una muestra): cualquier
+        fila editada, borrada o reordenada invalida lo acumulado. Si el
+        prefijo coincide, en la misma pasada se suman sólo las filas nuevas;
+        si no, se vuelve a llamar a `leer()` y se recalcula desde cero.
+
+        Retorna:
+        - "sin_cambios", "incremental" o "completo".
+        """
+        if self.huella is not None:
+            nuevas = self._recorrer(leer(), verificar=True)
+            if nuevas is not None:
+                return "incremental" if nuevas else "sin_cambios"
+        self._recorrer(leer(), verificar=False)
+        return "completo"
+
+    def _recorrer(self, bloques: Iterable[pd.DataFrame], verificar: bool) -> int | None:
+        """
+        Hashea todas las filas de `bloques` y suma las que están más allá
+        de lo ya acumulado (todas si `verificar=False`).
+
+        Retorna la cantidad de filas sumadas, o None si (con `verificar`)
+        las columnas o las filas ya sumadas no coinciden con la huella.
+        """
+        bloques = iter(bloques)
+        primero = next(bloques, None)
+        columnas = _columnas_numericas(primero) if primero is not None else []
+        if verificar and columnas != self.columnas:
+            return None
+        if not verificar:
+            self.__init__(columnas)
+
+        h = hashlib.blake2b(digest_size=16)
+        previas, vistas, nuevas = self.filas, 0, 0
+        for bloque in itertools.chain([primero] if primero is not None else [], bloques):
+            X = _a_matriz(bloque, columnas)
+            # Hash por fila del bloque float64: no depende del tamaño de bloque
+            # ni de si la columna se leyó como entero o como flotante
+            filas = hashes_filas(pd.DataFrame(X))
+            n = min(previas - vistas, len(X))
+            if n:
+                h.update(filas[:n].tobytes())
+                vistas += n
+                if vistas == previas and h.hexdigest() != self.huella:
+                    return None
+            if n < len(X):
+                h.update(filas[n:].tobytes())
+                self._sumar(X[n:])
+                nuevas += len(X) - n
+        if vistas < previas:
+            return None
+        self.huella = h.hexdigest()
+        return nuevas
+
+    def combinar(self, otro: "AcumuladorMomentos") -> "AcumuladorMomentos":
+        if otro.columnas != self.columnas:
+            raise ValueError("Sólo se combinan acumuladores con las mismas columnas.")
+        if otro.desplazamiento is None:
+            return self
+        if self.desplazamiento is None:
+            self.desplazamiento = otro.desplazamiento.copy()
+        S, Q, P = otro._momentos_desplazados(self.desplazamiento)
+        self.N += otro.N
+        self.S += S
+        self.Q += Q
+        self.P += P
+        self.filas += otro.filas
+        self.huella = self.fuente = None
+        return self
+
+    def _momentos_desplazados(self, nuevo: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """S, Q y P expresados respecto de otra referencia `nuevo`."""
+        d = self.desplazamiento - nuevo
+        S = self.S + self.N * d[:, None]
+        Q = self.Q + 2 * d[:, None] * self.S + self.N * (d * d)[:, None]
+        P = self.P + d[None, :] * self.S + d[:, None] * self.S.T + self.N * np.outer(d, d)
+        return S, Q, P
+
+    def _posiciones(self, columnas: list | None) -> list:
+        columnas = self.columnas if columnas is None else columnas
+        return [self.columnas.index(c) for c in columnas]
+
+    def correlacion(self, columnas: list | None = None) -> pd.DataFrame:
+        """Matriz de Pearson por pares completos (igual a `DataFrame.corr()`)."""
+        pos = self._posiciones(columnas)
+        nombres = [self.columnas[i] for i in pos]
+        ix = np.ix_(pos, pos)
+        r = _correlacion_momentos(self.N[ix], self.S[ix], self.Q[ix], self.P[ix])
+        return pd.DataFrame(r, index=nombres, columns=nombres)
+
+    def medias(self) -> pd.Series:
+        n = np.diag(self.N)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            media = np.diag(self.S) / n
+        base = self.desplazamiento if self.desplazamiento is not None else np.zeros(len(n))
+        return pd.Series(np.where(n > 0, base + media, np.nan), index=self.columnas)
+
+    def desviaciones(self, ddof: int = 0) -> pd.Series:
+        n = np.diag(self.N)
+        s, q = np.diag(self.S), np.diag(self.Q)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            var = (q - s * s / n) / (n - ddof)
+        var = np.where(n - ddof > 0, np.maximum(var, 0.0), np.nan)
+        return pd.Series(np.sqrt(var), index=self.columnas)
+
+    def guardar(self, ruta: str) -> None:
+        np.savez_compressed(
+            ruta,
+            columnas=np.array([str(c) for c in self.columnas]),
+            desplazamiento=self.desplazamiento if self.desplazamiento is not None else np.empty(0),
+            N=self.N, S=self.S, Q=self.Q, P=self.P,
+            filas=np.int64(self.filas),
+            huella=np.array(self.huella or ""),
+            fuente=np.array(self.fuente or ""),
+        )
+
+    @classmethod
+    def cargar(cls, ruta: str) -> "AcumuladorMomentos":
+        with np.load(ruta, allow_pickle=False) as datos:
+            acumulador = cls(datos["columnas"].tolist())
+            desplazamiento = datos["desplazamiento"]
+            acumulador.desplazamiento = desplazamiento if desplazamiento.size else None
+            acumulador.N, acumulador.S = datos["N"], datos["S"]
+            acumulador.Q, acumulador.P = datos["Q"], datos["P"]
+            acumulador.filas = int(datos["filas"])
+            acumulador.huella = str(datos["huella"]) or None
+            acumulador.fuente = (str(datos["fuente"]) or None) if "fuente" in datos.files else None
+        return acumulador
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.N.nbytes * 4)
+
+
+class MotorCorrelacion:
+    """
+    Motor de correlaciones compartido por el informe, el heatmap y el intérprete.
+
+    - Convierte el bloque numérico a una matriz float64 contigua una sola vez.
+    - Calcula los rangos de cada columna una sola vez (Spearman/Kendall).
+    - Pearson y Spearman salen de productos matriciales (BLAS);
+      Kendall usa tau-b en O(n log n) por par, sobre los rangos densos.
+    - Cada matriz calculada queda guardada por (método, columnas).
+    - Con `momentos` (un `AcumuladorMomentos` al día) Pearson sale de los
+      momentos acumulados sin recorrer las filas.
+    """
+
+    def __init__(self, df: pd.DataFrame, momentos: AcumuladorMomentos | None = None):
+        columnas = _columnas_numericas(df)
+        X = _a_matriz(df, columnas)
+        # Igual que antes: se descartan columnas completamente vacías
+        no_vacias = ~np.isnan(X).all(axis=0) if X.size else np.zeros(len(columnas), dtype=bool)
+        self.columnas_base = [c for c, ok in zip(columnas, no_vacias) if ok]
+        self.columnas = list(self.columnas_base)
+        self._X = np.asfortranarray(X[:, no_vacias])
+        self._rangos: np.ndarray | None = None
+        self._densos: np.ndarray | None = None
+        self._matrices: dict = {}
+        self.momentos = momentos
+
+    def incorporar(self, df: pd.DataFrame) -> None:
+        """Agrega columnas numéricas (incluidas booleanas) que el motor aún no tiene."""
+        nuevas = [c for c in df.columns if c not in self.columnas and is_numeric_dtype(df[c])]
+        if not nuevas or len(df) != self._X.shape[0]:
+            return
+        extra = _a_matriz(df, nuevas)
+        self._X = np.asfortranarray(np.hstack([self._X, extra]))
+        self.columnas.extend(nuevas)
+        if self._rangos is not None:
+            r, d = zip(*(rangos(extra[:, j]) for j in range(extra.shape[1])))
+            self._rangos = np.asfortranarray(np.hstack([self._rangos, np.column_stack(r)]))
+            self._densos = np.asfortranarray(np.hstack([self._densos, np.column_stack(d)]))
+
+    def _asegurar_rangos(self) -> None:
+        if self._rangos is not None:
+            return
+        p = self._X.shape[1]
+        self._rangos = np.empty_like(self._X, order="F")
+        self._densos = np.empty(self._X.shape, dtype=np.int64, order="F")
+        for j in range(p):
+            self._rangos[:, j], self._densos[:, j] = rangos(self._X[:, j])
+
+    def matriz(self, metodo: str = "pearson", columnas: list | None = None) -> pd.DataFrame:
+        """
+        Matriz de correlación para `columnas` (por defecto las numéricas no
+        booleanas del DataFrame original). Vacía si hay menos de 2 columnas.
+        """
+        metodo = metodo if metodo in METODOS else "pearson"
+        columnas = self.columnas_base if columnas is None else [c for c in columnas if c in self.columnas]
+        if len(columnas) < 2:
+            return pd.DataFrame()
+
+        clave = (metodo, tuple(columnas))
+        if clave not in self._matrices:
+            pos = [self.columnas.index(c) for c in columnas]
+            self._matrices[clave] = pd.DataFrame(self._calcular(metodo, pos), index=columnas, columns=columnas)
+        return self._matrices[clave]
+
+    def _calcular(self, metodo: str, pos: list) -> np.ndarray:
+        X = self._X[:, pos]
+        if metodo == "pearson":
+            columnas = [self.columnas[i] for i in pos]
+            if self.momentos is not None and set(columnas) <= set(self.momentos.columnas):
+                return self.momentos.correlacion(columnas).to_numpy()
+            return _pearson_bloque(X)
+
+        self._asegurar_rangos()
+        if metodo == "spearman":
+            if not np.isnan(X).any():
+                return _pearson_bloque(self._rangos[:, pos])
+            # Con NaN los rangos dependen de cada par: se delega en pandas
+            return pd.DataFrame(X).corr(method="spearman").to_numpy()
+
+        D = self._densos[:, pos]
+        p = len(pos)
+        r = np.eye(p)
+        for i in range(p):
+            if (D[:, i] < 0).all():
+                r[i, i] = np.nan
+            for j in range(i + 1, p):
+                r[i, j] = r[j, i] = kendall_tau_b(D[:, i], D[:, j])
+        return r
+
+    def bloques(self, metodo: str = "pearson", celdas_bloque: int = 4_000_000):
+        """
+        Recorre la matriz de correlación de las columnas base por bloques
+        de filas: produce (primera fila, bloque filas×p). Pearson y Spearman
+        sin NaN se calculan bloque a bloque; el resto usa `matriz`.
+        """
+        p = len(self.columnas_base)
+        filas = max(celdas_bloque // max(p, 1), 1)
+        pos = [self.columnas.index(c) for c in self.columnas_base]
+        clave = (metodo, tuple(self.columnas_base))
+        X = self._X[:, pos]
+        if metodo == "spearman" and not np.isnan(X).any():
+            self._asegurar_rangos()
+            X = self._rangos[:, pos]
+        elif metodo != "pearson" or clave in self._matrices:
+            matriz = self.matriz(metodo).to_numpy() if p >= 2 else np.empty((p, p))
+            for a in range(0, p, filas):
+                yield a, matriz[a:a + filas]
+            return
+        Xc = X - _medias_validas(X)
+        for a in range(0, p, filas):
+            yield a, _correlacion_filas(Xc, a, min(a + filas, p))
+
+    @property
+    def nbytes(self) -> int:
+        total = self._X.nbytes
+        if self._rangos is not None:
+            total += self._rangos.nbytes + self._densos.nbytes
+        return int(total + sum(m.memory_usage(deep=False).sum() for m in self._matrices.values()))
@@ -0,0 +1,109 @@
+# core/cubo.py
+from __future__ import annotations
+
+import numpy as np
+import pandas as pd
+
+AGREGACIONES = ("mean", "sum", "count", "median")
+ETIQUETA_NULOS = "Desconocido"
+
+
+def _codigos_categoria(serie: pd.Series) -> tuple[np.ndarray, pd.Index]:
+    """
+    Códigos enteros por fila y etiquetas de cada grupo, con la misma
+    agrupación que `serie.astype("string").fillna("Desconocido")`: los
+    nulos van a "Desconocido" y valores distintos con el mismo texto se
+    unen. Las etiquetas quedan ordenadas (como `groupby(sort=True)`).
+    """
+    codigos, valores = pd.factorize(serie, use_na_sentinel=True)
+    # Se convierten a texto sólo los valores únicos, no las filas
+    etiquetas = pd.Series(valores, dtype=object).astype("string").fillna(ETIQUETA_NULOS)
+    if (codigos < 0).any():
+        etiquetas = pd.concat([etiquetas, pd.Series([ETIQUETA_NULOS], dtype="string")], ignore_index=True)
+        codigos = np.where(codigos < 0, len(etiquetas) - 1, codigos)
+    finales, unicas = pd.factorize(etiquetas)
+    orden = np.argsort(np.asarray(unicas, dtype=object), kind="stable")
+    rango = np.empty_like(orden)
+    rango[orden] = np.arange(orden.size)
+    return rango[finales][codigos].astype(np.int64), pd.Index(np.asarray(unicas, dtype=object)[orden])
+
+
+class CuboCategorias:
+    """
+    Agregados por categoría de una columna categórica contra todas las numéricas.
+
+    Con los códigos enteros de la categoría (`pd.factorize`, una vez) se
+    guardan conteo y suma de cada numérica por grupo (`np.bincount`); la
+    media sale de ambos y la mediana exacta se calcula al pedirla por
+    primera vez (un ordenamiento por grupo y valor) y se guarda. Cambiar de
+    agregación, Top-N o numérica se responde con arreglos de tamaño
+    cantidad de categorías, sin volver a recorrer las filas.
+    """
+
+    def __init__(self, categoria: pd.Series, numericas: pd.DataFrame):
+        codigos, self.categorias = _codigos_categoria(categoria)
+        self.columnas = list(numericas.columns)
+        g = len(self.categorias)
+        self.conteo = np.zeros((g, len(self.columnas)), dtype=np.int64)
+        self.suma = np.zeros((g, len(self.columnas)), dtype="float64")
+        self._medianas: dict = {}
+        self._codigos = codigos
+        self._numericas = numericas
+        for j, columna in enumerate(self.columnas):
+            x = numericas[columna].to_numpy(dtype="float64", na_value=np.nan)
+            validos = ~np.isnan(x)
+            self.conteo[:, j] = np.bincount(codigos[validos], minlength=g)
+            self.suma[:, j] = np.bincount(codigos[validos], weights=x[validos], minlength=g)
+
+    @property
+    def nbytes(self) -> int:
+        medianas = sum(m.nbytes for m in self._medianas.values())
+        return int(self.conteo.nbytes + self.suma.nbytes + self._codigos.nbytes + medianas)
+
+    def _mediana(self, columna) -> np.ndarray:
+        if columna not in self._medianas:
+            j = self.columnas.index(columna)
+            x = self._numericas[columna].to_numpy(dtype="float64", na_value=np.nan)
+            validos = ~np.isnan(x)
+            codigos, x = self._codigos[validos], x[validos]
+            # Filas ordenadas por grupo y, dentro del grupo, por valor: orden por
+            # valor y luego orden estable por grupo (radix con códigos de 16 bits)
+            orden = np.argsort(x)
+            grupos = codigos[orden].astype(np.uint16 if len(self.categorias) <= 1 << 16 else np.int64)
+            x = x[orden[np.argsort(grupos, kind="stable")]]
+            n = self.conteo[:, j]
+            inicio = np.concatenate(([0], np.cumsum(n)[:-1]))
+            hay = n > 0
+            mediana = np.full(len(n), np.nan)
+            bajo, alto = inicio[hay] + (n[hay] - 1) // 2, inicio[hay] + n[hay] // 2
+            mediana[hay] = (x[bajo] + x[alto]) / 2
+            self._medianas[columna] = mediana
+        return self._medianas[columna]
+
+    def serie(self, columna, agregacion: str = "mean") -> pd.Series:
+        """Valor agregado por categoría (igual a `groupby(categoría)[columna].agg(agregacion)`)."""
+        if agregacion not in AGREGACIONES:
+            raise ValueError(f"Agregación no soportada: {agregacion}. Opciones: {', '.join(AGREGACIONES)}")
+        j = self.columnas.index(columna)
+        n = self.conteo[:, j]
+        if agregacion == "count":
+            valores = n
+        elif agregacion == "sum":
+            valores = self.suma[:, j]
+        elif agregacion == "mean":
+            valores = np.where(n > 0, self.suma[:, j] / np.maximum(n, 1), np.nan)
+        else:
+            valores = self._mediana(columna)
+        return pd.Series(valores, index=self.categorias, name=columna)
+
+    def top(self, columna, agregacion: str = "mean", top_n: int = 20) -> pd.Series:
+        """
+        Las `top_n` categorías con mayor valor, más "Otros" con la suma del
+        resto (si no es 0), ordenadas de mayor a menor.
+        """
+        g = self.serie(columna, agregacion).sort_values(ascending=False, kind="stable")
+        g_top = g.head(top_n)
+        otros = g.iloc[top_n:].sum() if len(g) > top_n else 0
+        if otros != 0:
+            g_top = pd.concat([g_top, pd.Series([otros], index=["Otros"], name=columna)])
+        return g_top.sort_values(ascending=False, kind="stable")
@@ -5,6 +5,11 @@ import pandas as pd
 import numpy as np
 from pandas.api.types import is_numeric_dtype, is_bool_dtype, is_categorical_dtype
 
+from core.cache import VistaCache, en_cache
+from core.cubo import CuboCategorias
+from core.densidad import densidad_2d, dibujar_densidad, dibujar_histograma
+from core.visualizacion import piramide_columna
+
 def _num_cols(df: pd.DataFrame):
     cols = [c for c in df.columns if is_numeric_dtype(df[c])]
     dfn = df[cols].apply(pd.to_numeric, errors="coerce") if cols else pd.DataFrame(index=df.index)
@@ -19,12 +24,13 @@ def _cat_cols(df: pd.DataFrame):
             cats.append(c)
     return cats
 
-def mostrar_dashboard(df: pd.DataFrame):
+def mostrar_dashboard(df: pd.DataFrame, cache: VistaCache | None = None):
     st.title("Dashboard Interactivo de Visualización")
 
-    numericas_df = _num_cols(df)
+    # Los subconjuntos derivados se reutilizan entre reruns si hay cache
+    numericas_df = en_cache(cache, "dashboard_numericas", lambda: _num_cols(df))
     columnas_numericas = numericas_df.columns.tolist()
-    columnas_categoricas = _cat_cols(df)
+    columnas_categoricas = en_cache(cache, "dashboard_categoricas", lambda: _cat_cols(df))
 
     tipo_grafico = st.selectbox(
         "Selecciona el tipo de gráfico",
@@ -50,8 +56,13 @@ def mostrar_dashboard(df: pd.DataFrame):
                 if serie.empty:
                     st.info("No hay datos válidos para graficar.")
                     return
+                # Histograma fino + KDE precalculados por columna: cambiar los bins
+                # o el KDE sólo combina conteos acumulados (costo según bins, no filas)
+                # (la misma pirámide, por contenido, que usa el histograma del análisis completo)
+                piramide = piramide_columna(variable, numericas_df[variable].to_numpy(dtype="float64"), cache)
+                h = piramide.histograma(bins=bins, kde=kde)
                 fig, ax = plt.subplots()
-                sns.histplot(serie, bins=bins, kde=kde, ax=ax)
+                dibujar_histograma(ax, h["bordes"], h["conteos"], h["curva"])
                 ax.set_title(f"Histograma de {variable}")
                 ax.set_xlabel(variable); ax.set_ylabel("Frecuencia")
                 st.pyplot(fig)
@@ -68,19 +79,37 @@ def mostrar_dashboard(df: pd.DataFrame):
     elif tipo_grafico == "Dispersión":
         x = st.selectbox("Eje X", columnas_numericas, key="dash_x")
         y = st.selectbox("Eje Y", columnas_numericas, key="dash_y")
-        sample_max = st.slider("Muestreo máximo de puntos", 1000, 100_000, 5000, step=1000)
-        alpha = st.slider("Transparencia (alpha)", 10, 100, 60, step=5) / 100.0
+        modo = st.radio(
+            "Representación",
+            ["Densidad (todas las filas)", "Puntos (muestra)"],
+            horizontal=True,
+            key="dash_modo_scatter",
+        )
+        if modo.startswith("Densidad"):
+            resolucion = st.slider("Resolución (celdas en X)", 50, 800, 300, step=50)
+        else:
+            sample_max = st.slider("Muestreo máximo de puntos", 1000, 100_000, 5000, step=1000)
+            alpha = st.slider("Transparencia (alpha)", 10, 100, 60, step=5) / 100.0
 
         if st.button("Generar dispersión", key="btn_scatter"):
             plot_df = numericas_df[[x, y]].dropna()
             if plot_df.empty:
                 st.info("No hay datos válidos para graficar.")
                 return
-            if len(plot_df) > sample_max:
-                plot_df = plot_df.sample(sample_max, random_state=42)
             fig, ax = plt.subplots()
-            sns.scatterplot(data=plot_df, x=x, y=y, ax=ax, alpha=alpha, edgecolor=None)
-            ax.set_title(f"Dispersión: {x} vs {y}")
+            if modo.startswith("Densidad"):
+                # Rasterizado con bincount: se ven todas las filas, incluidos los puntos raros
+                d = densidad_2d(
+                    plot_df[x].to_numpy(), plot_df[y].to_numpy(), bins=(resolucion, max(resolucion * 2 // 3, 1))
+                )
+                dibujar_densidad(fig, ax, d["conteos"], d["extension"])
+                ax.set_xlabel(x); ax.set_ylabel(y)
+                ax.set_title(f"Dispersión: {x} vs {y} ({d['n']:,} filas)")
+            else:
+                if len(plot_df) > sample_max:
+                    plot_df = plot_df.sample(sample_max, random_state=42)
+                sns.scatterplot(data=plot_df, x=x, y=y, ax=ax, alpha=alpha, edgecolor=None)
+                ax.set_title(f"Dispersión: {x} vs {y}")
             st.pyplot(fig)
 
     elif tipo_grafico == "Barras por categoría":
@@ -90,25 +119,16 @@ def mostrar_dashboard(df: pd.DataFrame):
         top_n = st.slider("Top-N categorías", 5, 50, 20)
 
         if st.button("Generar gráfico de barras", key="btn_bar"):
-            s_cat = df[cat].astype("string").fillna("Desconocido")
-            s_num = numericas_df[num] if num in numericas_df.columns else pd.to_numeric(df[num], errors="coerce")
-            tmp = pd.DataFrame({cat: s_cat, num: s_num})
-            if agg == "count":
-                g = tmp.groupby(cat, dropna=False)[num].count().sort_values(ascending=False)
-            else:
-                g = tmp.groupby(cat, dropna=False)[num].agg(agg).sort_values(ascending=False)
-
-            if g.empty:
+            # Conteos y sumas por categoría se calculan una vez por columna categórica;
+            # cambiar de agregación, Top-N o numérica sólo consulta el cubo
+            cubo = en_cache(cache, f"dashboard_cubo_{cat}", lambda: CuboCategorias(df[cat], numericas_df))
+            if len(cubo.categorias) == 0:
                 st.info("No hay datos válidos para graficar.")
                 return
-
-            g_top = g.head(top_n)
-            otros_val = g.iloc[top_n:].sum() if len(g) > top_n else 0
-            if otros_val != 0:
-                g_top.loc["Otros"] = otros_val
+            g_top = cubo.top(num, agg, top_n)
 
             fig, ax = plt.subplots(figsize=(9, 4.5))
-            g_top.sort_values(ascending=False).plot(kind="bar", ax=ax)
+            g_top.plot(kind="bar", ax=ax)
             ax.set_title(f"{agg} de {num} por {cat}")
             ax.set_ylabel(agg.capitalize())
             plt.xticks(rotation=45, ha="right")
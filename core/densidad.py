@@ -0,0 +1,224 @@
+# core/densidad.py
+from __future__ import annotations
+
+import numpy as np
+from matplotlib.colors import LogNorm
+
+PUNTOS_KDE = 512
+BINS_DENSIDAD = (300, 200)
+# Hasta esta cantidad de filas la dispersión se dibuja punto por punto
+MAX_PUNTOS_DISPERSION = 5000
+
+
+def _finitos(*arreglos: np.ndarray) -> list[np.ndarray]:
+    """Filtra las posiciones donde todos los arreglos son finitos."""
+    arreglos = [np.asarray(a, dtype="float64") for a in arreglos]
+    ok = np.ones(len(arreglos[0]), dtype=bool)
+    for a in arreglos:
+        ok &= np.isfinite(a)
+    return [a[ok] for a in arreglos] if not ok.all() else arreglos
+
+
+def _rango(a: np.ndarray) -> tuple[float, float]:
+    lo, hi = float(a.min()), float(a.max())
+    if lo == hi:
+        lo, hi = lo - 0.5, hi + 0.5
+    return lo, hi
+
+
+def kde_por_fft(
+    valores: np.ndarray,
+    puntos: int = PUNTOS_KDE,
+    bw_ajuste: float = 1.0,
+    corte: float = 3.0,
+) -> tuple[np.ndarray, np.ndarray] | None:
+    """
+    Estimación de densidad por núcleo gaussiano sobre una grilla.
+
+    Los valores se reparten linealmente entre los dos puntos de grilla
+    vecinos y la grilla se convoluciona con el núcleo por FFT, así el costo
+    es O(n + puntos·log puntos) en lugar de O(n · puntos). El ancho de banda
+    es la regla de Scott (igual que `scipy.stats.gaussian_kde`).
+
+    Parámetros:
+    - puntos: tamaño de la grilla.
+    - bw_ajuste: multiplica el ancho de banda.
+    - corte: la grilla se extiende `corte` anchos de banda más allá de los datos.
+
+    Retorna:
+    - (grilla, densidad) o None si no hay variación en los datos.
+    """
+    (x,) = _finitos(valores)
+    n = x.size
+    if n < 2:
+        return None
+    bw = float(x.std(ddof=1)) * n ** (-1 / 5) * bw_ajuste
+    if not np.isfinite(bw) or bw <= 0:
+        return None
+
+    lo, hi = float(x.min()) - corte * bw, float(x.max()) + corte * bw
+    grilla = np.linspace(lo, hi, puntos)
+    paso = grilla[1] - grilla[0]
+
+    # Binning lineal: cada valor reparte su peso entre los dos puntos vecinos
+    t = (x - lo) / paso
+    i = np.clip(np.floor(t).astype(np.int64), 0, puntos - 2)
+    w = t - i
+    conteos = np.bincount(i, weights=1 - w, minlength=puntos)
+    conteos += np.bincount(i + 1, weights=w, minlength=puntos)
+
+    # Núcleo truncado a ±4 anchos de banda; FFT con relleno (sin solapamiento circular)
+    radio = min(int(np.ceil(4 * bw / paso)), puntos - 1)
+    desplazamientos = np.arange(-radio, radio + 1) * paso
+    nucleo = np.exp(-0.5 * (desplazamientos / bw) ** 2) / (bw * np.sqrt(2 * np.pi))
+    tamano = 1 << int(np.ceil(np.log2(puntos + nucleo.size - 1)))
+    conv = np.fft.irfft(np.fft.rfft(conteos, tamano) * np.fft.rfft(nucleo, tamano), tamano)
+    densidad = conv[radio:radio + puntos] / n
+    return grilla, np.maximum(densidad, 0.0)
+
+
+def histograma_con_kde(valores: np.ndarray, bins="sturges", kde: bool = True) -> dict:
+    """
+    Conteos por bin y, opcionalmente, la curva KDE escalada a conteos
+    (como `sns.histplot(..., kde=True)`), listos para `dibujar_histograma`.
+    El resultado depende de la cantidad de bins, no de filas.
+    """
+    (x,) = _finitos(valores)
+    bordes = np.histogram_bin_edges(x, bins=bins, range=_rango(x) if x.size else None)
+    conteos, bordes = np.histogram(x, bins=bordes)
+    curva = None
+    if kde:
+        estimada = kde_por_fft(x)
+        if estimada is not None:
+            grilla, densidad = estimada
+            dentro = (grilla >= bordes[0]) & (grilla <= bordes[-1])
+            # Densidad → conteos por bin (ancho medio de bin)
+            escala = x.size * float(np.mean(np.diff(bordes)))
+            curva = (grilla[dentro], densidad[dentro] * escala)
+    return {"bordes": bordes, "conteos": conteos, "curva": curva}
+
+
+def densidad_2d(x: np.ndarray, y: np.ndarray, bins: tuple[int, int] = BINS_DENSIDAD) -> dict:
+    """
+    Rasteriza una nube de puntos en una grilla de conteos (al estilo datashader).
+
+    Cada punto suma 1 a su celda (un solo `bincount`), así se representan
+    todas las filas con costo lineal y memoria fija de `bins`.
+
+    Retorna:
+    - dict con "conteos" (alto × ancho), "extension" (xmin, xmax, ymin, ymax)
+      y "n" (puntos representados).
+    """
+    x, y = _finitos(x, y)
+    ancho, alto = int(bins[0]), int(bins[1])
+    if x.size == 0:
+        return {"conteos": np.zeros((alto, ancho), dtype=np.int64), "extension": (0.0, 1.0, 0.0, 1.0), "n": 0}
+    (x0, x1), (y0, y1) = _rango(x), _rango(y)
+    ix = np.clip(((x - x0) / (x1 - x0) * ancho).astype(np.int64), 0, ancho - 1)
+    iy = np.clip(((y - y0) / (y1 - y0) * alto).astype(np.int64), 0, alto - 1)
+    conteos = np.bincount(iy * ancho + ix, minlength=ancho * alto).reshape(alto, ancho)
+    return {"conteos": conteos, "extension": (x0, x1, y0, y1), "n": int(x.size)}
+
+
+def dibujar_histograma(ax, bordes: np.ndarray, conteos: np.ndarray, curva=None) -> None:
+    """Barras a partir de conteos precalculados (+ curva KDE si la hay)."""
+    ax.bar(bordes[:-1], conteos, width=np.diff(bordes), align="edge", color="C0", alpha=0.75, edgecolor="white", linewidth=0.5)
+    if curva is not None:
+        ax.plot(curva[0], curva[1], color="C0", linewidth=1.5)
+
+
+def dibujar_densidad(fig, ax, conteos: np.ndarray, extension: tuple, cmap: str = "viridis") -> None:
+    """Imagen de densidad en escala logarítmica (celdas vacías en blanco)."""
+    if conteos.max() == 0:
+        return
+    imagen = ax.imshow(
+        np.ma.masked_equal(conteos, 0),
+        origin="lower",
+        extent=extension,
+        aspect="auto",
+        interpolation="nearest",
+        cmap=cmap,
+        norm=LogNorm(vmin=1, vmax=max(int(conteos.max()), 2)),
+    )
+    fig.colorbar(imagen, ax=ax, label="Filas por celda")
+
+
+# Columnas con hasta esta cantidad de valores distintos guardan cada valor
+# y su conteo: cualquier cantidad de bins sale exacta (enteros, precios, %)
+MAX_VALORES_EXACTOS = 65_536
+# Resto de columnas: bins finos. 2⁴·3²·5·7·11 es divisible por los bins más
+# usados (5 a 12, 14, 15, 16, 18, 20, 24, 30, 36, 40, 60, 80, ...)
+RESOLUCION_PIRAMIDE = 55_440
+
+
+class PiramideHistograma:
+    """
+    Histograma de una columna precalculado al nivel más fino, del que sale
+    cualquier cantidad de bins más gruesa sin volver a recorrer las filas.
+
+    - Con pocos valores distintos (`MAX_VALORES_EXACTOS`) se guardan los
+      valores ordenados y sus conteos acumulados: cada borde se ubica con
+      búsqueda binaria y los conteos son exactamente los de `np.histogram`.
+    - Si no, conteos acumulados de `resolucion` bins iguales: un bin grueso
+      es la diferencia entre dos acumulados. Si `bins` divide a
+      `resolucion` el resultado es exacto; si no, cada borde se redondea al
+      borde fino más cercano (corrimiento de a lo sumo rango / (2·resolucion)).
+
+    En ambos casos `histograma(bins)` cuesta O(bins) y no depende de las
+    filas. La curva KDE se calcula una vez al construir y sólo se reescala.
+    """
+
+    def __init__(self, valores: np.ndarray, resolucion: int = RESOLUCION_PIRAMIDE, kde: bool = True):
+        (x,) = _finitos(valores)
+        self.n = int(x.size)
+        self.resolucion = int(resolucion)
+        self.constante = self.n == 0 or float(x.min()) == float(x.max())
+        self.lo, self.hi = _rango(x) if self.n else (0.0, 1.0)
+        tipo = np.int32 if self.n < 2 ** 31 else np.int64
+
+        distintos, conteos = np.unique(x, return_counts=True)
+        if distintos.size <= MAX_VALORES_EXACTOS:
+            self.valores = distintos
+        else:
+            self.valores = None
+            conteos, _ = np.histogram(x, bins=self.resolucion, range=(self.lo, self.hi))
+        self.acumulado = np.concatenate(([0], np.cumsum(conteos))).astype(tipo)
+
+        # Columnas casi enteras: el KDE suaviza escalones que no existen
+        self.discreta = bool(self.n) and bool((np.round(x) == x).mean() > 0.95)
+        self.kde = kde_por_fft(x) if kde else None
+
+    @property
+    def nbytes(self) -> int:
+        valores = self.valores.nbytes if self.valores is not None else 0
+        kde = sum(a.nbytes for a in self.kde) if self.kde is not None else 0
+        return int(self.acumulado.nbytes + valores + kde)
+
+    def cantidad_bins(self, bins="sturges") -> int:
+        """Bins como entero; "sturges" = ceil(log2(n) + 1), igual que numpy (1 si es constante)."""
+        if isinstance(bins, str):
+            if bins != "sturges":
+                raise ValueError(f"Regla de bins no soportada: {bins}")
+            return 1 if self.constante else int(np.ceil(np.log2(self.n) + 1))
+        return max(int(bins), 1)
+
+    def histograma(self, bins="sturges", kde: bool = True) -> dict:
+        """Mismo resultado que `histograma_con_kde` (bordes, conteos, curva) en O(bins)."""
+        b = self.cantidad_bins(bins)
+        if self.valores is not None:
+            bordes = np.linspace(self.lo, self.hi, b + 1)
+            posiciones = np.searchsorted(self.valores, bordes, side="left")
+            posiciones[-1] = self.valores.size  # el último bin incluye el máximo
+        else:
+            b = min(b, self.resolucion)
+            posiciones = np.rint(np.arange(b + 1) * (self.resolucion / b)).astype(np.int64)
+            bordes = self.lo + (self.hi - self.lo) * (posiciones / self.resolucion)
+        conteos = np.diff(self.acumulado[posiciones]).astype(np.int64)
+
+        curva = None
+        if kde and self.kde is not None:
+            grilla, densidad = self.kde
+            dentro = (grilla >= bordes[0]) & (grilla <= bordes[-1])
+            escala = self.n * (self.hi - self.lo) / b
+            curva = (grilla[dentro], densidad[dentro] * escala)
+        return {"bordes": bordes, "conteos": conteos, "curva": curva}
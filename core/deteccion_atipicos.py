@@ -1,63 +1,197 @@
+import warnings
+
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import IsolationForest
 from pandas.api.types import is_numeric_dtype
+from typing import Iterable, Iterator
 
-class DeteccionAtipicos:
+from core.modelos import RegistroModelos, huella_esquema
+
+FILAS_POR_BLOQUE = 1_000_000  # múltiplo de 8 para empaquetar bits por bloque
+MAX_FILAS_ENTRENAMIENTO = 100_000
+TAMANO_LOTE_PUNTAJE = 100_000
+
+
+class BanderasAtipicos:
     """
-    Métodos de detección de valores atípicos en variables numéricas.
+    Marcas de atípicos por (fila, columna) empaquetadas en bits.
+
+    Ocupa 1 bit por celda (en lugar de 1 byte del DataFrame booleano) y
+    trae los conteos por columna ya calculados, que es lo único que
+    necesitan el resumen y el intérprete. `a_dataframe()` reconstruye la
+    vista booleana clásica cuando hace falta.
     """
 
-    @staticmethod
-    def por_zscore(df: pd.DataFrame, umbral: float = 3.0) -> pd.DataFrame:
-        """
-        Devuelve un DataFrame booleano por columna indicando outliers por |Z| > umbral.
-        """
-        atipicos = pd.DataFrame(index=df.index)
-        numericas = [c for c in df.columns if is_numeric_dtype(df[c])]
+    def __init__(self, bits: np.ndarray, indice: pd.Index, columnas: list, conteos: np.ndarray):
+        self.bits = bits              # (columnas, ceil(filas / 8)) uint8
+        self.indice = indice
+        self.columnas = list(columnas)
+        self.conteos = pd.Series(conteos, index=self.columnas, dtype="int64")
 
-        if not numericas:
-            return atipicos  # vacío, mismo índice
+    @classmethod
+    def desde_mascara(cls, mascara: pd.Series, columna="isolation_forest") -> "BanderasAtipicos":
+        """Una sola columna de marcas a partir de una Serie booleana por fila (p. ej. Isolation Forest)."""
+        m = mascara.to_numpy(dtype=bool)
+        return cls(np.packbits(m)[None, :], mascara.index, [columna], np.array([m.sum()]))
 
-        dfn = df[numericas].apply(pd.to_numeric, errors="coerce")
+    @property
+    def n_filas(self) -> int:
+        return len(self.indice)
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.n_filas, len(self.columnas)
+
+    @property
+    def empty(self) -> bool:
+        return self.n_filas == 0 or not self.columnas
+
+    @property
+    def total(self) -> int:
+        return int(self.conteos.sum())
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.bits.nbytes)
 
-        for col in dfn.columns:
-            s = dfn[col]
-            mu = s.mean()
-            sd = s.std(ddof=0)
-            if not np.isfinite(sd) or sd == 0:
+    def tasas(self) -> pd.Series:
+        """Proporción de filas marcadas por columna (igual a `a_dataframe().mean()`)."""
+        return self.conteos / self.n_filas if self.n_filas else self.conteos.astype(float)
 
-                atipicos[col] = False
-                continue
-            z = (s - mu) / sd
-            atipicos[col] = z.abs() > umbral
+    def mascara(self, columna) -> np.ndarray:
+        j = self.columnas.index(columna)
+        return np.unpackbits(self.bits[j], count=self.n_filas).astype(bool)
 
-        return atipicos
+    def filas_marcadas(self) -> np.ndarray:
+        """Posiciones de las filas con al menos una marca."""
+        cualquiera = np.bitwise_or.reduce(self.bits, axis=0) if self.columnas else np.zeros(0, np.uint8)
+        return np.flatnonzero(np.unpackbits(cualquiera, count=self.n_filas))
+
+    def coordenadas(self) -> tuple[np.ndarray, np.ndarray]:
+        """Marcas en formato disperso: (posiciones de fila, posiciones de columna)."""
+        filas, cols = [], []
+        for j in range(len(self.columnas)):
+            if self.conteos.iat[j]:
+                f = np.flatnonzero(np.unpackbits(self.bits[j], count=self.n_filas))
+                filas.append(f)
+                cols.append(np.full(f.size, j, dtype=np.int64))
+        if not filas:
+            return np.empty(0, np.int64), np.empty(0, np.int64)
+        return np.concatenate(filas), np.concatenate(cols)
+
+    def a_dataframe(self) -> pd.DataFrame:
+        """Vista booleana densa (mismo formato que la salida clásica)."""
+        if not self.columnas:
+            return pd.DataFrame(index=self.indice)
+        denso = np.unpackbits(self.bits, axis=1, count=self.n_filas).astype(bool).T
+        return pd.DataFrame(denso, index=self.indice, columns=self.columnas)
+
+
+def _matriz_numerica(df: pd.DataFrame) -> tuple[list, np.ndarray]:
+    numericas = [c for c in df.columns if is_numeric_dtype(df[c])]
+    if not numericas:
+        return [], np.empty((len(df), 0))
+    dfn = df[numericas]
+    if any(dfn[c].dtype == object for c in numericas):
+        dfn = dfn.apply(pd.to_numeric, errors="coerce")
+    return numericas, dfn.to_numpy(dtype="float64", na_value=np.nan)
+
+
+def _marcar(df: pd.DataFrame, columnas: list, X: np.ndarray, marcar_bloque, compacto: bool):
+    """
+    Aplica `marcar_bloque(Xb) -> bool (filas, columnas)` por bloques de filas.
+    Devuelve BanderasAtipicos (compacto) o el DataFrame booleano.
+    """
+    if not columnas:
+        vacio = BanderasAtipicos(np.empty((0, 0), np.uint8), df.index, [], np.empty(0))
+        return vacio if compacto else pd.DataFrame(index=df.index)
+
+    if not compacto:
+        return pd.DataFrame(marcar_bloque(X), index=df.index, columns=columnas)
+
+    bits, conteos = [], np.zeros(len(columnas), dtype=np.int64)
+    for inicio in range(0, X.shape[0], FILAS_POR_BLOQUE):
+        m = marcar_bloque(X[inicio:inicio + FILAS_POR_BLOQUE])
+        conteos += m.sum(axis=0)
+        bits.append(np.packbits(m.T, axis=1))
+    bits = np.concatenate(bits, axis=1) if bits else np.empty((len(columnas), 0), np.uint8)
+    return BanderasAtipicos(bits, df.index, columnas, conteos)
+
+
+def _predecir_por_lotes(modelo, X: np.ndarray, tamano_lote: int) -> np.ndarray:
+    """`modelo.predict` por lotes de filas (memoria acotada en archivos grandes)."""
+    if len(X) <= tamano_lote:
+        return modelo.predict(X)
+    return np.concatenate([modelo.predict(X[i:i + tamano_lote]) for i in range(0, len(X), tamano_lote)])
+
+
+class DeteccionAtipicos:
+    """
+    Métodos de detección de valores atípicos en variables numéricas.
+    """
 
     @staticmethod
-    def por_rango_intercuartil(df: pd.DataFrame, mult: float = 1.5) -> pd.DataFrame:
+    def por_zscore(df: pd.DataFrame, umbral: float = 3.0, momentos=None, compacto: bool = False):
         """
-        Devuelve un DataFrame booleano por columna indicando outliers por IQR.
+        Marca outliers por |Z| > umbral en todas las columnas numéricas a la vez.
+        Con `momentos` (AcumuladorMomentos al día con `df`) la media y la
+        desviación se toman de lo acumulado en lugar de recorrer la columna.
+
+        Retorna un DataFrame booleano por columna o, con `compacto=True`,
+        un `BanderasAtipicos` (bits empaquetados + conteos por columna).
         """
-        atipicos = pd.DataFrame(index=df.index)
-        numericas = [c for c in df.columns if is_numeric_dtype(df[c])]
+        columnas, X = _matriz_numerica(df)
+        with warnings.catch_warnings():
+            # Columnas sin datos: media/desviación NaN → no se marca nada
+            warnings.simplefilter("ignore", RuntimeWarning)
+            if np.isnan(X).any():
+                mu, sd = np.nanmean(X, axis=0), np.nanstd(X, axis=0)
+            else:
+                mu, sd = X.mean(axis=0), X.std(axis=0)
+        if momentos is not None:
+            medias, desviaciones = momentos.medias(), momentos.desviaciones(ddof=0)
+            for j, col in enumerate(columnas):
+                if col in medias.index:
+                    mu[j], sd[j] = medias[col], desviaciones[col]
+        validas = np.isfinite(sd) & (sd != 0)
 
-        if not numericas:
-            return atipicos
+        def marcar_bloque(Xb: np.ndarray) -> np.ndarray:
+            with np.errstate(invalid="ignore", divide="ignore"):
+                z = Xb - mu
+                z /= sd
+                np.abs(z, out=z)
+                m = z > umbral
+            m &= validas
+            return m
 
-        dfn = df[numericas].apply(pd.to_numeric, errors="coerce")
+        return _marcar(df, columnas, X, marcar_bloque, compacto)
+
+    @staticmethod
+    def por_rango_intercuartil(df: pd.DataFrame, mult: float = 1.5, compacto: bool = False):
+        """
+        Marca outliers por IQR; los cuartiles de todas las columnas salen
+        de una sola llamada a `nanquantile` sobre la matriz numérica.
 
-        for col in dfn.columns:
-            s = dfn[col]
-            q1, q3 = s.quantile(0.25), s.quantile(0.75)
-            iqr = q3 - q1
-            if not np.isfinite(iqr) or iqr == 0:
-                atipicos[col] = False
-                continue
-            lo, hi = q1 - mult * iqr, q3 + mult * iqr
-            atipicos[col] = (s < lo) | (s > hi)
+        Retorna un DataFrame booleano por columna o, con `compacto=True`,
+        un `BanderasAtipicos`.
+        """
+        columnas, X = _matriz_numerica(df)
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)
+            cuantil = np.nanquantile if np.isnan(X).any() else np.quantile
+            q1, q3 = cuantil(X, [0.25, 0.75], axis=0)
+        iqr = q3 - q1
+        validas = np.isfinite(iqr) & (iqr != 0)
+        lo, hi = q1 - mult * iqr, q3 + mult * iqr
+
+        def marcar_bloque(Xb: np.ndarray) -> np.ndarray:
+            with np.errstate(invalid="ignore"):
+                m = (Xb < lo) | (Xb > hi)
+            m &= validas
+            return m
 
-        return atipicos
+        return _marcar(df, columnas, X, marcar_bloque, compacto)
 
     @staticmethod
     def por_isolation_forest(
@@ -66,10 +200,25 @@ class DeteccionAtipicos:
         random_state: int = 42,
         min_cols: int = 2,
         min_rows: int = 20,
+        persistente: bool = False,
+        registro: RegistroModelos | None = None,
+        max_entrenamiento: int = MAX_FILAS_ENTRENAMIENTO,
+        tamano_lote: int = TAMANO_LOTE_PUNTAJE,
+        reentrenar: bool = False,
+        huella: str | None = None,
     ) -> pd.Series:
         """
         Detecta registros atípicos con Isolation Forest.
         Retorna una Serie booleana alineada al índice del df original.
+
+        Con `persistente=True` el modelo (entrenado sobre una submuestra de
+        hasta `max_entrenamiento` filas, usando todos los núcleos) se guarda
+        en `registro` y las siguientes ejecuciones sólo puntúan, por lotes:
+        - con `huella` (de los datos) se reutiliza sólo para esos mismos datos;
+        - sin `huella` se reutiliza para cualquier dataset con el mismo
+          esquema. Es opcional y explícito: sirve para puntuar filas agregadas
+          a un archivo ya entrenado (ver `puntuar_isolation_forest`), no para
+          analizar otro dataset.
         """
         # Selección robusta de numéricas
         numericas = [c for c in df.columns if is_numeric_dtype(df[c])]
@@ -83,15 +232,93 @@ class DeteccionAtipicos:
         if len(dfn_complete) < min_rows:
             return pd.Series(False, index=df.index)
 
-        # Entrenamiento
-        modelo = IsolationForest(
-            contamination=contamination,
-            random_state=random_state,
-        )
-        pred = modelo.fit_predict(dfn_complete)
+        if persistente:
+            entrada = DeteccionAtipicos.modelo_isolation_forest(
+                dfn_complete,
+                contamination=contamination,
+                random_state=random_state,
+                registro=registro,
+                max_entrenamiento=max_entrenamiento,
+                reentrenar=reentrenar,
+                huella=huella,
+            )
+            pred = _predecir_por_lotes(entrada["modelo"], dfn_complete.to_numpy(dtype="float64"), tamano_lote)
+        else:
+            # Entrenamiento
+            modelo = IsolationForest(
+                contamination=contamination,
+                random_state=random_state,
+            )
+            pred = modelo.fit_predict(dfn_complete)
 
         # Serie booleana sobre las filas usadas
         out_complete = pd.Series(pred == -1, index=dfn_complete.index)
         out_full = out_complete.reindex(df.index, fill_value=False)
 
         return out_full
+
+    @staticmethod
+    def modelo_isolation_forest(
+        dfn: pd.DataFrame,
+        contamination: float = 0.05,
+        random_state: int = 42,
+        registro: RegistroModelos | None = None,
+        max_entrenamiento: int = MAX_FILAS_ENTRENAMIENTO,
+        reentrenar: bool = False,
+        huella: str | None = None,
+    ) -> dict:
+        """
+        Devuelve el Isolation Forest guardado para `dfn` (numéricas sin NaN)
+        o lo entrena y lo guarda. La clave es `huella` (datos) si se pasa;
+        si no, el esquema de `dfn` (reutilización entre versiones del archivo).
+
+        Retorna:
+        - dict con "modelo", "columnas", "filas_entrenamiento", "creado"
+          y "reutilizado" (True si no hubo que entrenar).
+        """
+        registro = registro if registro is not None else RegistroModelos()
+        clave = RegistroModelos.clave(
+            "isolation_forest",
+            huella if huella is not None else huella_esquema(dfn),
+            contamination=contamination,
+            random_state=random_state,
+            max_entrenamiento=max_entrenamiento,
+        )
+        entrada = None if reentrenar else registro.cargar("isolation_forest", clave)
+        if entrada is not None:
+            return {**entrada, "reutilizado": True}
+
+        muestra = dfn
+        if len(dfn) > max_entrenamiento:
+            muestra = dfn.sample(n=max_entrenamiento, random_state=random_state)
+        modelo = IsolationForest(contamination=contamination, random_state=random_state, n_jobs=-1)
+        modelo.fit(muestra.to_numpy(dtype="float64"))
+        entrada = registro.guardar(
+            "isolation_forest",
+            clave,
+            modelo,
+            columnas=list(dfn.columns),
+            filas_entrenamiento=len(muestra),
+        )
+        return {**entrada, "reutilizado": False}
+
+    @staticmethod
+    def puntuar_isolation_forest(
+        entrada: dict, bloques: Iterable[pd.DataFrame], tamano_lote: int = TAMANO_LOTE_PUNTAJE
+    ) -> Iterator[pd.Series]:
+        """
+        Marca filas nuevas contra un modelo ya entrenado, sin reentrenar.
+
+        Recorre `bloques` (p. ej. `leer_csv_por_bloques` o las filas
+        agregadas a un archivo) y produce, por cada uno, una Serie booleana
+        alineada a su índice (False en filas con NaN).
+        """
+        columnas = entrada["columnas"]
+        for bloque in bloques:
+            dfn = bloque[columnas].apply(pd.to_numeric, errors="coerce")
+            completas = dfn.notna().all(axis=1).to_numpy()
+            marcas = np.zeros(len(dfn), dtype=bool)
+            if completas.any():
+                X = dfn.to_numpy(dtype="float64", na_value=np.nan)[completas]
+                marcas[completas] = _predecir_por_lotes(entrada["modelo"], X, tamano_lote) == -1
+            yield pd.Series(marcas, index=bloque.index)
@@ -0,0 +1,324 @@
+# core/escritor_pdf.py
+from __future__ import annotations
+
+import hashlib
+import io
+import math
+import os
+import struct
+import zlib
+from functools import lru_cache
+
+from PIL import Image
+
+# Tamaño A4 en puntos PDF (1 pt = 1/72 de pulgada)
+A4 = (595.28, 841.89)
+PT_POR_MM = 72 / 25.4
+# Fuentes base del PDF (no se incrustan); el texto va en WinAnsi (cp1252)
+FUENTES = {"F1": "Helvetica", "F2": "Helvetica-Bold"}
+COMPRESIONES = ("png", "paleta", "jpeg")
+
+
+def _info_png(datos: bytes) -> dict:
+    """
+    Lee un PNG en memoria al formato de imagen que espera FPDF clásico.
+    Los datos IDAT se copian tal cual (FlateDecode + predictor PNG), sin
+    descomprimir. Sólo escala de grises, RGB o paleta, sin alfa.
+    """
+    if datos[:8] != b"\x89PNG\r\n\x1a\n":
+        raise ValueError("La imagen en memoria no es un PNG.")
+    pos, pal, idat = 8, b"", []
+    ancho = alto = bpc = tipo_color = entrelazado = None
+    while pos < len(datos):
+        (n,) = struct.unpack(">I", datos[pos:pos + 4])
+        tipo, cuerpo = datos[pos + 4:pos + 8], datos[pos + 8:pos + 8 + n]
+        pos += 12 + n
+        if tipo == b"IHDR":
+            ancho, alto, bpc, tipo_color, _, _, entrelazado = struct.unpack(">IIBBBBB", cuerpo)
+        elif tipo == b"PLTE":
+            pal = cuerpo
+        elif tipo == b"IDAT":
+            idat.append(cuerpo)
+        elif tipo == b"IEND":
+            break
+    if tipo_color not in (0, 2, 3) or entrelazado or bpc > 8:
+        raise ValueError("PNG en memoria no soportado (alfa, entrelazado o 16 bits).")
+    espacios = {0: "DeviceGray", 2: "DeviceRGB", 3: "Indexed"}
+    colores = 3 if tipo_color == 2 else 1
+    return {
+        "w": ancho, "h": alto, "cs": espacios[tipo_color], "bpc": bpc, "f": "FlateDecode",
+        "dp": f"/Predictor 15 /Colors {colores} /BitsPerComponent {bpc} /Columns {ancho}",
+        "pal": pal, "trns": "", "data": b"".join(idat),
+    }
+
+
+def _info_jpeg(datos: bytes) -> dict:
+    """Dimensiones y espacio de color de un JPEG en memoria (se embebe sin recodificar)."""
+    pos = 2
+    while pos < len(datos):
+        marca = datos[pos + 1]
+        (largo,) = struct.unpack(">H", datos[pos + 2:pos + 4])
+        if marca in (0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF):
+            bpc, alto, ancho, capas = struct.unpack(">BHHB", datos[pos + 4:pos + 10])
+            cs = {3: "DeviceRGB", 4: "DeviceCMYK"}.get(capas, "DeviceGray")
+            return {"w": ancho, "h": alto, "cs": cs, "bpc": bpc, "f": "DCTDecode", "data": datos}
+        pos += 2 + largo
+    raise ValueError("La imagen en memoria no es un JPEG válido.")
+
+
+@lru_cache(maxsize=None)
+def _anchos(fuente: str) -> tuple[float, ...]:
+    """Ancho de cada byte WinAnsi en milésimas del tamaño de letra (métricas de FPDF)."""
+    from fpdf import FPDF
+
+    medidor = FPDF(unit="pt")
+    medidor.set_font("Helvetica", "B" if FUENTES[fuente].endswith("Bold") else "", 1000)
+    anchos = []
+    for b in range(256):
+        try:
+            anchos.append(float(medidor.get_string_width(chr(b))))
+        except Exception:
+            anchos.append(556.0)
+    return tuple(anchos)
+
+
+def codificar_texto(texto) -> bytes:
+    """Texto → bytes WinAnsi (lo que no existe en cp1252 queda como '?')."""
+    return str(texto).encode("cp1252", "replace")
+
+
+def ancho_texto(datos: bytes, fuente: str = "F1", tamano: float = 10) -> float:
+    """Ancho en puntos de un texto ya codificado con `codificar_texto`."""
+    tabla = _anchos(fuente)
+    return sum(tabla[b] for b in datos) * tamano / 1000
+
+
+def partir_lineas(texto, ancho: float, fuente: str = "F1", tamano: float = 10) -> list[bytes]:
+    """Ajusta el texto al ancho dado (por palabras; las muy largas se cortan)."""
+    tabla = _anchos(fuente)
+    limite = ancho * 1000 / tamano
+    espacio = tabla[32]
+    lineas: list[bytes] = []
+    for parrafo in codificar_texto(texto).replace(b"\r", b"").split(b"\n"):
+        actual, usado = [], 0.0
+        for palabra in parrafo.split(b" "):
+            w = sum(tabla[b] for b in palabra)
+            while w > limite and palabra:
+                # Palabra más ancha que la línea: se corta por caracteres
+                if actual:
+                    lineas.append(b" ".join(actual))
+                    actual, usado = [], 0.0
+                corte, acumulado = 0, 0.0
+                while corte < len(palabra) and acumulado + tabla[palabra[corte]] <= limite:
+                    acumulado += tabla[palabra[corte]]
+                    corte += 1
+                corte = max(corte, 1)
+                lineas.append(palabra[:corte])
+                palabra = palabra[corte:]
+                w = sum(tabla[b] for b in palabra)
+            extra = w + (espacio if actual else 0.0)
+            if actual and usado + extra > limite:
+                lineas.append(b" ".join(actual))
+                actual, usado = [palabra], w
+            else:
+                actual.append(palabra)
+                usado += extra
+        lineas.append(b" ".join(actual))
+    return lineas
+
+
+def _escapar(datos: bytes) -> bytes:
+    return datos.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)")
+
+
+def _num(x: float) -> str:
+    return f"{x:.2f}".rstrip("0").rstrip(".")
+
+
+class EscritorPDF:
+    """
+    Escritor PDF mínimo que vuelca cada objeto al archivo apenas se produce.
+
+    En memoria sólo quedan el contenido de la página en curso y la tabla de
+    posiciones (xref): las páginas terminadas y las imágenes ya están en el
+    archivo. Con FPDF todo el documento se arma en un buffer hasta `output`.
+
+    - Contenido de páginas comprimido (FlateDecode).
+    - Imágenes reducidas a la resolución con la que se imprimen (`dpi`) y
+      codificadas como PNG con predictor ("png"), PNG de 256 colores
+      ("paleta") o JPEG ("jpeg").
+    - Una imagen con los mismos bytes y el mismo tamaño de destino se
+      incrusta una sola vez y se referencia desde todas sus páginas.
+    """
+
+    def __init__(
+        self,
+        destino,
+        tamano: tuple[float, float] = A4,
+        dpi: int = 150,
+        compresion: str = "paleta",
+        calidad: int = 80,
+    ):
+        if compresion not in COMPRESIONES:
+            raise ValueError(f"Compresión no soportada: {compresion}. Opciones: {', '.join(COMPRESIONES)}")
+        self._propio = isinstance(destino, (str, os.PathLike))
+        self.f = open(destino, "wb") if self._propio else destino
+        self.ancho, self.alto = tamano
+        self.dpi, self.compresion, self.calidad = dpi, compresion, calidad
+
+        self.escrito = 0
+        self._posiciones: dict[int, int] = {}
+        self._siguiente = 1
+        self.paginas: list[int] = []
+        self._imagenes: dict[str, tuple[str, int]] = {}
+        self.imagenes = 0
+        self.reutilizadas = 0
+        self._contenido: list[bytes] | None = None
+        self._recursos: dict[str, int] = {}
+        self.cerrado = False
+
+        self._escribir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        self._catalogo = self._reservar()
+        self._raiz = self._reservar()
+        self._fuentes = {
+            alias: self._objeto(
+                f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>".encode()
+            )
+            for alias, base in FUENTES.items()
+        }
+
+    # --- Objetos ---
+
+    def _escribir(self, datos: bytes) -> None:
+        self.f.write(datos)
+        self.escrito += len(datos)
+
+    def _reservar(self) -> int:
+        n = self._siguiente
+        self._siguiente += 1
+        return n
+
+    def _objeto(self, diccionario: bytes, flujo: bytes | None = None, n: int | None = None) -> int:
+        n = self._reservar() if n is None else n
+        self._posiciones[n] = self.escrito
+        self._escribir(f"{n} 0 obj\n".encode() + diccionario)
+        if flujo is not None:
+            self._escribir(b"\nstream\n" + flujo + b"\nendstream")
+        self._escribir(b"\nendobj\n")
+        return n
+
+    # --- Páginas ---
+
+    @property
+    def pagina_abierta(self) -> bool:
+        return self._contenido is not None
+
+    def nueva_pagina(self) -> None:
+        self.terminar_pagina()
+        self._contenido, self._recursos = [], {}
+
+    def terminar_pagina(self) -> None:
+        """Escribe la página en curso (si hay) y libera su contenido."""
+        if self._contenido is None:
+            return
+        flujo = zlib.compress(b"\n".join(self._contenido), 6)
+        contenido = self._objeto(f"<< /Length {len(flujo)} /Filter /FlateDecode >>".encode(), flujo)
+        fuentes = " ".join(f"/{a} {n} 0 R" for a, n in self._fuentes.items())
+        xobjetos = " ".join(f"/{a} {n} 0 R" for a, n in self._recursos.items())
+        pagina = (
+            f"<< /Type /Page /Parent {self._raiz} 0 R /MediaBox [0 0 {_num(self.ancho)} {_num(self.alto)}] "
+            f"/Resources << /Font << {fuentes} >> /XObject << {xobjetos} >> >> /Contents {contenido} 0 R >>"
+        )
+        self.paginas.append(self._objeto(pagina.encode()))
+        self._contenido, self._recursos = None, {}
+
+    # --- Dibujo (coordenadas en puntos desde la esquina superior izquierda) ---
+
+    def texto(self, x: float, y: float, datos: bytes, fuente: str = "F1", tamano: float = 10) -> None:
+        """Escribe una línea ya codificada; `y` es la línea base."""
+        self._contenido.append(
+            f"BT /{fuente} {_num(tamano)} Tf {_num(x)} {_num(self.alto - y)} Td (".encode()
+            + _escapar(datos) + b") Tj ET"
+        )
+
+    def imagen(self, datos: bytes, x: float, y: float, ancho: float, alto: float) -> tuple[float, float]:
+        """
+        Dibuja la imagen (PNG/JPEG/… en bytes) centrada dentro de la caja dada,
+        manteniendo la proporción. Retorna el ancho y alto usados.
+        """
+        with Image.open(io.BytesIO(datos)) as img:
+            escala = min(ancho / img.width, alto / img.height)
+            w, h = img.width * escala, img.height * escala
+            px = (max(1, math.ceil(w / 72 * self.dpi)), max(1, math.ceil(h / 72 * self.dpi)))
+            clave = hashlib.blake2b(datos, digest_size=16).hexdigest() + f":{px[0]}x{px[1]}"
+            if clave in self._imagenes:
+                self.reutilizadas += 1
+            else:
+                self._imagenes[clave] = self._escribir_imagen(img, px)
+        alias, n = self._imagenes[clave]
+        self._recursos[alias] = n
+        x0, y0 = x + (ancho - w) / 2, self.alto - (y + (alto - h) / 2) - h
+        self._contenido.append(f"q {_num(w)} 0 0 {_num(h)} {_num(x0)} {_num(y0)} cm /{alias} Do Q".encode())
+        return w, h
+
+    def _escribir_imagen(self, img: Image.Image, px: tuple[int, int]) -> tuple[str, int]:
+        if img.mode not in ("RGB", "L"):
+            img = img.convert("RGBA")
+            fondo = Image.new("RGB", img.size, "white")
+            fondo.paste(img, mask=img.getchannel("A"))
+            img = fondo
+        if px[0] < img.width:
+            # Nunca se agranda: si la imagen ya es chica se incrusta tal cual
+            img = img.resize(px, Image.Resampling.LANCZOS)
+
+        buf = io.BytesIO()
+        if self.compresion == "jpeg":
+            img.save(buf, format="JPEG", quality=self.calidad, optimize=True)
+            info = _info_jpeg(buf.getvalue())
+        else:
+            if self.compresion == "paleta" and img.mode == "RGB":
+                img = img.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+            img.save(buf, format="PNG", compress_level=9)
+            info = _info_png(buf.getvalue())
+
+        espacio = f"/{info['cs']}"
+        if info["cs"] == "Indexed":
+            pal = info["pal"]
+            espacio = f"[/Indexed /DeviceRGB {len(pal) // 3 - 1} <{pal.hex()}>]"
+        parametros = f" /DecodeParms << {info['dp']} >>" if info.get("dp") else ""
+        diccionario = (
+            f"<< /Type /XObject /Subtype /Image /Width {info['w']} /Height {info['h']} "
+            f"/ColorSpace {espacio} /BitsPerComponent {info['bpc']} /Filter /{info['f']}{parametros} "
+            f"/Length {len(info['data'])} >>"
+        )
+        n = self._objeto(diccionario.encode(), info["data"])
+        self.imagenes += 1
+        return f"Im{n}", n
+
+    # --- Cierre ---
+
+    def cerrar(self, titulo: str | None = None) -> None:
+        """Escribe el árbol de páginas, el catálogo y la tabla xref."""
+        if self.cerrado:
+            return
+        self.terminar_pagina()
+        hijos = " ".join(f"{n} 0 R" for n in self.paginas)
+        self._objeto(f"<< /Type /Pages /Kids [{hijos}] /Count {len(self.paginas)} >>".encode(), n=self._raiz)
+        self._objeto(f"<< /Type /Catalog /Pages {self._raiz} 0 R >>".encode(), n=self._catalogo)
+        info = b"<< /Producer (ProyectoParadigmas)"
+        if titulo:
+            info += b" /Title (" + _escapar(codificar_texto(titulo)) + b")"
+        info = self._objeto(info + b" >>")
+
+        inicio_xref = self.escrito
+        total = self._siguiente
+        lineas = [f"xref\n0 {total}\n".encode(), b"0000000000 65535 f \n"]
+        lineas += [f"{self._posiciones[n]:010d} 00000 n \n".encode() for n in range(1, total)]
+        self._escribir(b"".join(lineas))
+        self._escribir(
+            f"trailer\n<< /Size {total} /Root {self._catalogo} 0 R /Info {info} 0 R >>\n"
+            f"startxref\n{inicio_xref}\n%%EOF\n".encode()
+        )
+        self.cerrado = True
+        if self._propio:
+            self.f.close()
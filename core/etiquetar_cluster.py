@@ -3,10 +3,15 @@ import pandas as pd
 import numpy as np
 from typing import Dict
 
-def etiquetar_clusters(perfil_cluster: pd.DataFrame) -> Dict:
+from core.reglas import MotorReglas, motor_reglas
+
+def etiquetar_clusters(
+    perfil_cluster: pd.DataFrame, motor: MotorReglas | None = None, conjunto: str | None = None
+) -> Dict:
     """
     Asigna etiquetas legibles a cada cluster basadas en métricas promedio.
-    Reglas (mismas que las tuyas):
+    Las reglas vienen de config/reglas_etiquetas.json (ver `MotorReglas`);
+    las predeterminadas son las de siempre:
       - Éxito en ventas: Revenue > 6000 y Units Returned < 0.1
       - Alta promoción: Discount > 0.15
       - Alta rotación: Units Sold > 140
@@ -20,37 +25,14 @@ def etiquetar_clusters(perfil_cluster: pd.DataFrame) -> Dict:
     if perfil_cluster is None or len(perfil_cluster) == 0:
         return {}
 
-    # Asegurar que las columnas existan y sean numéricas
-    cols = ["Revenue", "Units Returned", "Discount", "Units Sold"]
-    safe = perfil_cluster.copy()
-
-    for c in cols:
-        if c not in safe.columns:
-            # columna inexistente → asumir 0
-            safe[c] = 0
-        else:
-            
-            safe[c] = pd.to_numeric(safe[c], errors="coerce").fillna(0)
+    motor = motor if motor is not None else motor_reglas()
+    # Orden determinista por índice; todas las filas se evalúan de una vez
+    ordenado = perfil_cluster.sort_index()
+    bases = motor.etiquetar(ordenado, conjunto=conjunto)
 
     etiquetas: Dict = {}
     usadas = set()
-
-    # Iterar en orden determinista por índice 
-    for idx, fila in safe.sort_index().iterrows():
-        rev = float(fila["Revenue"])
-        ret = float(fila["Units Returned"])
-        disc = float(fila["Discount"])
-        sold = float(fila["Units Sold"])
-
-        if (rev > 6000) and (ret < 0.1):
-            base = "Éxito en ventas"
-        elif disc > 0.15:
-            base = "Alta promoción"
-        elif sold > 140:
-            base = "Alta rotación"    
-        else:
-            base = "Comportamiento promedio"
-
+    for idx, base in zip(ordenado.index, bases.astype(str)):
         etiqueta = base
         k = 2
         while etiqueta in usadas:
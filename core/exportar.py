@@ -1,6 +1,59 @@
 # core/exportar.py
 from fpdf import FPDF
+import base64
+import html
+import io
 import os
+import time
+import uuid
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+from core.escritor_pdf import (
+    PT_POR_MM,
+    EscritorPDF,
+    _info_jpeg,
+    _info_png,
+    ancho_texto,
+    codificar_texto,
+    partir_lineas,
+)
+
+try:
+    import pyarrow  # noqa: F401
+    PYARROW_DISPONIBLE = True
+except ImportError:  # pragma: no cover - depende del entorno
+    PYARROW_DISPONIBLE = False
+
+# fpdf2 (mismo paquete `fpdf`, versión >= 2) acepta imágenes en memoria de forma nativa
+FPDF2 = not hasattr(FPDF, "_parsepng")
+
+
+class _FPDFMemoria(FPDF):
+    """
+    FPDF clásico (1.7) sólo lee imágenes desde rutas: esta subclase además
+    resuelve nombres registrados con `registrar_imagen` desde bytes en memoria.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.imagenes_memoria: dict[str, bytes] = {}
+
+    def registrar_imagen(self, nombre: str, datos: bytes) -> None:
+        self.imagenes_memoria[nombre] = datos
+
+    def _parsepng(self, name):
+        if name in self.imagenes_memoria:
+            return _info_png(self.imagenes_memoria[name])
+        return super()._parsepng(name)
+
+    def _parsejpg(self, filename):
+        if filename in self.imagenes_memoria:
+            return _info_jpeg(self.imagenes_memoria[filename])
+        return super()._parsejpg(filename)
+
 
 def _to_latin1_safe(texto: str) -> str:
     """
@@ -17,7 +70,7 @@ class ExportadorPDF:
     """
 
     def __init__(self, carpeta_output: str = "output"):
-        self.pdf = FPDF()
+        self.pdf = FPDF() if FPDF2 else _FPDFMemoria()
 
         self.pdf.set_auto_page_break(auto=True, margin=15)
         self.carpeta = carpeta_output
@@ -38,9 +91,16 @@ class ExportadorPDF:
         self.pdf.multi_cell(0, 6, _to_latin1_safe(texto))
         self.pdf.ln(1)
 
-    def agregar_imagenes(self, extensiones: list | None = None):
+    def agregar_resultado(self, resultado, titulo: str = "Informe de Análisis Automatizado"):
+        """Portada con el resumen textual de un `ResultadoAnalisis`."""
+        self.agregar_titulo(titulo)
+        self.agregar_parrafo(resultado.texto())
+
+    def agregar_imagenes(self, extensiones: list | None = None, archivos: list | None = None):
         """
-        Inserta en nuevas páginas todas las imágenes en la carpeta de salida.
+        Inserta en nuevas páginas las imágenes de la carpeta de salida.
+        - Con `archivos` (nombres dentro de la carpeta, p. ej. los gráficos de
+          la ejecución actual) sólo se insertan esos; si no, todas.
         - Escala al ancho disponible respetando márgenes.
         - Inserta el nombre del archivo como pie de figura.
         """
@@ -49,12 +109,13 @@ class ExportadorPDF:
 
         exts = {ext.lower() for ext in extensiones}
 
-        try:
-            archivos = sorted(os.listdir(self.carpeta))
-        except FileNotFoundError:
-            return
-
-        max_w = self._page_width_available()
+        if archivos is not None:
+            archivos = sorted(archivos)
+        else:
+            try:
+                archivos = sorted(os.listdir(self.carpeta))
+            except FileNotFoundError:
+                return
 
         any_image = False
         for archivo in archivos:
@@ -67,12 +128,7 @@ class ExportadorPDF:
                 continue
 
             any_image = True
-            self.pdf.add_page()
-         
-            self.pdf.image(ruta, x=self.pdf.l_margin, w=max_w)
-            self.pdf.ln(3)
-            self.pdf.set_font("Arial", size=10)
-            self.pdf.cell(0, 5, _to_latin1_safe(archivo), ln=True, align="C")
+            self._insertar_imagen(archivo, ruta=ruta)
 
 
         if not any_image:
@@ -81,7 +137,463 @@ class ExportadorPDF:
                 self.pdf.ln(4)
                 self.pdf.cell(0, 6, _to_latin1_safe("No se encontraron imágenes para adjuntar."), ln=True)
 
+    def _insertar_imagen(self, nombre: str, datos: bytes | None = None, ruta: str | None = None):
+        """Página con la imagen escalada al ancho disponible y su nombre como pie."""
+        self.pdf.add_page()
+        x, w = self.pdf.l_margin, self._page_width_available()
+        if datos is None:
+            self.pdf.image(ruta, x=x, w=w)
+        elif FPDF2:
+            self.pdf.image(io.BytesIO(datos), x=x, w=w)
+        else:
+            tipo = "jpg" if datos[:2] == b"\xff\xd8" else "png"
+            self.pdf.registrar_imagen(nombre, datos)
+            self.pdf.image(nombre, x=x, w=w, type=tipo)
+        self.pdf.ln(3)
+        self.pdf.set_font("Arial", size=10)
+        self.pdf.cell(0, 5, _to_latin1_safe(nombre), ln=True, align="C")
+
+    def agregar_imagenes_memoria(self, imagenes):
+        """
+        Inserta imágenes ya codificadas en memoria (pares nombre → bytes PNG/JPEG,
+        p. ej. la columna "imagen" de `CrearGraficos(carpeta_salida=None)`),
+        sin leer ni escribir archivos.
+        """
+        items = list(imagenes.items()) if isinstance(imagenes, dict) else list(imagenes)
+        items = [(nombre, datos) for nombre, datos in items if datos is not None]
+        for nombre, datos in sorted(items, key=lambda t: t[0]):
+            self._insertar_imagen(nombre, datos=datos)
+
+        if not items and self.pdf.page_no() > 0:
+            self.pdf.set_font("Arial", size=11)
+            self.pdf.ln(4)
+            self.pdf.cell(0, 6, _to_latin1_safe("No se encontraron imágenes para adjuntar."), ln=True)
+
+    def a_bytes(self) -> bytes:
+        """El PDF completo en memoria (sin escribir archivo)."""
+        salida = self.pdf.output(dest="S")
+        return salida.encode("latin-1") if isinstance(salida, str) else bytes(salida)
+
     def guardar_pdf(self, nombre_archivo: str = "informe.pdf") -> str:
         ruta = os.path.join(self.carpeta, nombre_archivo)
         self.pdf.output(ruta)
         return ruta
+
+
+class InformePDF:
+    """
+    Informe PDF compacto que se escribe al archivo página por página.
+
+    A diferencia de `ExportadorPDF` (una imagen a resolución completa por
+    página y todo el documento en memoria hasta guardarlo):
+    - Los gráficos van como miniaturas en cuadrícula (`columnas` × `filas`
+      por página), reducidos a `dpi` y comprimidos ("paleta", "png" o "jpeg").
+    - Las imágenes idénticas se incrustan una sola vez.
+    - Cada página se vuelca al archivo al terminarla (ver `EscritorPDF`).
+    - `seccion(nombre)` registra páginas, imágenes, bytes y tiempo de cada
+      parte del informe; `desglose()` los devuelve como tabla.
+
+    Se escribe en un archivo temporal que reemplaza a `ruta` al cerrar;
+    si algo falla no queda un PDF a medias.
+    """
+
+    def __init__(
+        self,
+        ruta: str,
+        columnas: int = 2,
+        filas: int = 3,
+        dpi: int = 150,
+        compresion: str = "paleta",
+        calidad: int = 80,
+        margen_mm: float = 15,
+    ):
+        carpeta = os.path.dirname(ruta)
+        if carpeta:
+            os.makedirs(carpeta, exist_ok=True)
+        self.ruta = ruta
+        # Nombre único: otra sesión puede estar escribiendo el mismo informe
+        base, ext = os.path.splitext(ruta)
+        self._temporal = f"{base}.{uuid.uuid4().hex}.tmp{ext}"
+        self.contenido: bytes | None = None
+        self.escritor = EscritorPDF(self._temporal, dpi=dpi, compresion=compresion, calidad=calidad)
+        self.columnas, self.filas = columnas, filas
+        self.margen = margen_mm * PT_POR_MM
+        self.y: float | None = None
+        self._secciones: list[dict] = []
+        self._inicio = time.perf_counter()
+
+    def __enter__(self) -> "InformePDF":
+        return self
+
+    def __exit__(self, tipo, valor, traza) -> None:
+        if tipo is None:
+            self.cerrar()
+        else:
+            self.descartar()
+
+    # --- Diseño de página ---
+
+    @property
+    def _ancho_util(self) -> float:
+        return self.escritor.ancho - 2 * self.margen
+
+    @property
+    def _limite(self) -> float:
+        return self.escritor.alto - self.margen
+
+    def _nueva_pagina(self) -> None:
+        self.escritor.nueva_pagina()
+        self.y = self.margen
+
+    def _espacio(self, alto: float) -> None:
+        """Abre una página nueva si lo que sigue no entra en la actual."""
+        if self.y is None or self.y + alto > self._limite:
+            self._nueva_pagina()
+
+    def _terminar_pagina(self) -> None:
+        self.escritor.terminar_pagina()
+        self.y = None
+
+    # --- Contenido ---
+
+    @contextmanager
+    def seccion(self, nombre: str):
+        """Agrupa el contenido en páginas propias y mide lo que aporta al PDF."""
+        self._terminar_pagina()
+        e = self.escritor
+        inicio = (time.perf_counter(), e.escrito, len(e.paginas), e.imagenes, e.reutilizadas)
+        try:
+            yield self
+        finally:
+            self._terminar_pagina()
+            self._secciones.append({
+                "seccion": nombre,
+                "paginas": len(e.paginas) - inicio[2],
+                "imagenes": e.imagenes - inicio[3],
+                "reutilizadas": e.reutilizadas - inicio[4],
+                "bytes": e.escrito - inicio[1],
+                "segundos": time.perf_counter() - inicio[0],
+            })
+
+    def agregar_titulo(self, titulo: str, tamano: float = 16):
+        alto = tamano * 1.4
+        self._espacio(alto)
+        datos = codificar_texto(titulo)
+        x = self.margen + max(0.0, (self._ancho_util - ancho_texto(datos, "F2", tamano)) / 2)
+        self.escritor.texto(x, self.y + tamano, datos, fuente="F2", tamano=tamano)
+        self.y += alto
+
+    def agregar_parrafo(self, texto: str, tamano: float = 10):
+        interlineado = tamano * 1.35
+        for linea in partir_lineas(texto, self._ancho_util, "F1", tamano):
+            self._espacio(interlineado)
+            if linea:
+                self.escritor.texto(self.margen, self.y + tamano, linea, tamano=tamano)
+            self.y += interlineado
+        self.y += tamano / 2
+
+    def agregar_resultado(self, resultado, titulo: str = "Informe de Análisis Automatizado"):
+        """Resumen textual de un `ResultadoAnalisis`."""
+        self.agregar_titulo(titulo)
+        self.agregar_parrafo(resultado.texto())
+
+    def agregar_cuadricula(self, imagenes, columnas: int | None = None, filas: int | None = None):
+        """
+        Inserta imágenes en memoria (pares nombre → bytes, como en
+        `ExportadorPDF.agregar_imagenes_memoria`) en una cuadrícula de
+        miniaturas, con el nombre como pie de cada una.
+        """
+        columnas, filas = columnas or self.columnas, filas or self.filas
+        items = list(imagenes.items()) if isinstance(imagenes, dict) else list(imagenes)
+        items = sorted(((n, d) for n, d in items if d is not None), key=lambda t: t[0])
+        if not items:
+            self.agregar_parrafo("No se encontraron imágenes para adjuntar.")
+            return
+
+        separacion, pie = 4 * PT_POR_MM, 7.0
+        ancho_celda = (self._ancho_util - (columnas - 1) * separacion) / columnas
+        alto_celda = (self._limite - self.margen - (filas - 1) * separacion) / filas
+        for i in range(0, len(items), columnas):
+            self._espacio(alto_celda)
+            for j, (nombre, datos) in enumerate(items[i:i + columnas]):
+                x = self.margen + j * (ancho_celda + separacion)
+                self.escritor.imagen(datos, x, self.y, ancho_celda, alto_celda - pie * 2)
+                etiqueta = partir_lineas(os.path.splitext(nombre)[0], ancho_celda, "F1", pie)[0]
+                xe = x + max(0.0, (ancho_celda - ancho_texto(etiqueta, "F1", pie)) / 2)
+                self.escritor.texto(xe, self.y + alto_celda - pie / 2, etiqueta, tamano=pie)
+            self.y += alto_celda + separacion
+
+    # --- Cierre ---
+
+    def cerrar(self) -> str:
+        """
+        Termina el PDF y lo deja en `ruta`. Los bytes de este informe quedan
+        en `contenido` (leídos antes de publicarlo): `ruta` puede ser
+        reemplazada por otra sesión antes de que se descargue.
+        """
+        if not self.escritor.cerrado:
+            self.escritor.cerrar(titulo=os.path.basename(self.ruta))
+            with open(self._temporal, "rb") as f:
+                self.contenido = f.read()
+            os.replace(self._temporal, self.ruta)
+            self._total = time.perf_counter() - self._inicio
+        return self.ruta
+
+    def descartar(self) -> None:
+        """Cierra sin publicar el PDF (tras un error)."""
+        if not self.escritor.f.closed:
+            self.escritor.f.close()
+        if os.path.exists(self._temporal):
+            os.remove(self._temporal)
+
+    def desglose(self) -> pd.DataFrame:
+        """
+        Páginas, imágenes (incrustadas y reutilizadas), bytes y segundos por
+        sección; una vez cerrado, una fila extra con la estructura del PDF
+        (fuentes, árbol de páginas, xref) para que los bytes sumen el total.
+        """
+        filas = list(self._secciones)
+        if self.escritor.cerrado:
+            filas.append({
+                "seccion": "Estructura del PDF",
+                "paginas": 0,
+                "imagenes": 0,
+                "reutilizadas": 0,
+                "bytes": self.escritor.escrito - sum(f["bytes"] for f in self._secciones),
+                "segundos": max(0.0, self._total - sum(f["segundos"] for f in self._secciones)),
+            })
+        tabla = pd.DataFrame(filas, columns=["seccion", "paginas", "imagenes", "reutilizadas", "bytes", "segundos"])
+        tabla["KB"] = (tabla["bytes"] / 1024).round(1)
+        tabla["segundos"] = tabla["segundos"].round(3)
+        return tabla
+
+
+FORMATOS_ARTEFACTOS = ("parquet", "excel", "html")
+# Una hoja de Excel admite 1.048.576 filas (una es el encabezado)
+MAX_FILAS_EXCEL = 1_048_575
+FILAS_POR_BLOQUE_EXCEL = 50_000
+MAX_FILAS_HTML = 500
+
+
+def _para_exportar(tabla: pd.DataFrame) -> pd.DataFrame:
+    """Índice con significado como columna y nombres de columna como texto."""
+    if not isinstance(tabla.index, pd.RangeIndex):
+        tabla = tabla.reset_index()
+    else:
+        tabla = tabla.copy(deep=False)
+    tabla.columns = [str(c) for c in tabla.columns]
+    return tabla
+
+
+def _filas_excel(tabla: pd.DataFrame):
+    """Filas como tuplas de valores nativos, por bloques (nulos → celda vacía)."""
+    zonas = [c for c in tabla.columns if isinstance(tabla[c].dtype, pd.DatetimeTZDtype)]
+    if zonas:
+        # Excel no guarda zona horaria
+        tabla = tabla.assign(**{c: tabla[c].dt.tz_localize(None) for c in zonas})
+    for inicio in range(0, len(tabla), FILAS_POR_BLOQUE_EXCEL):
+        parte = tabla.iloc[inicio:inicio + FILAS_POR_BLOQUE_EXCEL].astype(object)
+        yield from parte.where(parte.notna(), None).itertuples(index=False, name=None)
+
+
+class ExportadorArtefactos:
+    """
+    Exporta en bloque lo calculado por el análisis completo para que otros
+    procesos lo usen sin recalcular:
+
+    - "datos": el dataset con `Cluster`, `Cluster Etiqueta` y una columna
+      booleana `atipico_<método>` por método (zscore, iqr, forest).
+    - "marcas_atipicos": las marcas por celda en formato largo
+      (índice de fila, método, columna, valor).
+    - "resumen_atipicos", "perfil_cluster", "estadisticas" y "curva_k".
+
+    Formatos: Parquet comprimido (un archivo por tabla), Excel con una hoja
+    por tabla (escritura en streaming de openpyxl) y un HTML autocontenido.
+    Todos se escriben en un temporal que reemplaza al archivo final; con
+    varias sesiones a la vez, `prefijo` debe ser propio de cada dataset.
+    """
+
+    def __init__(self, resultado, df: pd.DataFrame, carpeta_output: str = "output", prefijo: str = "analisis"):
+        self.resultado = resultado
+        self.df = df
+        self.carpeta = carpeta_output
+        self.prefijo = prefijo
+        self._tablas: dict[str, pd.DataFrame] | None = None
+        os.makedirs(self.carpeta, exist_ok=True)
+
+    def _ruta(self, nombre: str) -> str:
+        return os.path.join(self.carpeta, f"{self.prefijo}{nombre}")
+
+    # --- Tablas ---
+
+    def datos_enriquecidos(self) -> pd.DataFrame:
+        datos = self.df.copy(deep=False)
+        if "Cluster" not in datos.columns:
+            datos["Cluster"] = self.resultado.clusters.to_numpy()
+        if self.resultado.hay_clusters and "Cluster Etiqueta" not in datos.columns:
+            datos["Cluster Etiqueta"] = self.resultado.etiquetas_por_fila().to_numpy()
+        for metodo, banderas in self.resultado.atipicos.items():
+            if banderas.n_filas != len(datos):
+                raise ValueError("El resultado del análisis no corresponde a este dataset.")
+            marcada = np.zeros(len(datos), dtype=bool)
+            marcada[banderas.filas_marcadas()] = True
+            datos[f"atipico_{metodo}"] = marcada
+        return datos
+
+    def marcas_atipicos(self) -> pd.DataFrame:
+        """Una fila por celda marcada; `valor` es el dato original (NaN si la marca es por fila)."""
+        partes = []
+        for metodo, banderas in self.resultado.atipicos.items():
+            filas, cols = banderas.coordenadas()
+            valor = np.full(filas.size, np.nan)
+            for j, columna in enumerate(banderas.columnas):
+                if columna in self.df.columns:
+                    sel = cols == j
+                    x = pd.to_numeric(self.df[columna], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                    valor[sel] = x[filas[sel]]
+            partes.append(pd.DataFrame({
+                "indice": self.df.index[filas],
+                "metodo": metodo,
+                "columna": np.asarray(banderas.columnas, dtype=object)[cols],
+                "valor": valor,
+            }))
+        if not partes:
+            return pd.DataFrame(columns=["indice", "metodo", "columna", "valor"])
+        marcas = pd.concat(partes, ignore_index=True)
+        return marcas.astype({"metodo": "category", "columna": "category"})
+
+    def resumen_atipicos(self) -> pd.DataFrame:
+        filas = [
+            {"metodo": metodo, "columna": columna, "marcadas": int(n), "tasa": float(t)}
+            for metodo, banderas in self.resultado.atipicos.items()
+            for (columna, n), t in zip(banderas.conteos.items(), banderas.tasas())
+        ]
+        return pd.DataFrame(filas, columns=["metodo", "columna", "marcadas", "tasa"])
+
+    def tablas(self) -> dict[str, pd.DataFrame]:
+        """Todas las tablas a exportar (se arman una sola vez)."""
+        if self._tablas is None:
+            tablas = {
+                "datos": self.datos_enriquecidos(),
+                "marcas_atipicos": self.marcas_atipicos(),
+                "resumen_atipicos": self.resumen_atipicos(),
+                "perfil_cluster": self.resultado.perfil_cluster,
+                "estadisticas": self.resultado.estadisticas,
+                "curva_k": self.resultado.curva_k,
+            }
+            self._tablas = {n: t for n, t in tablas.items() if n in ("datos", "marcas_atipicos") or not t.empty}
+        return self._tablas
+
+    # --- Formatos ---
+
+    def a_parquet(self) -> list[str]:
+        """Un Parquet (zstd) por tabla: `<prefijo>_<tabla>.parquet`."""
+        if not PYARROW_DISPONIBLE:
+            raise RuntimeError("Para exportar a Parquet se necesita pyarrow.")
+        from core.resultado import _escribir_atomico
+
+        rutas = []
+        for nombre, tabla in self.tablas().items():
+            tabla = tabla.copy(deep=False)
+            tabla.columns = [str(c) for c in tabla.columns]
+            ruta = self._ruta(f"_{nombre}.parquet")
+
+            def escribir(destino: str, tabla=tabla) -> None:
+                try:
+                    tabla.to_parquet(destino, engine="pyarrow", compression="zstd", index=True)
+                except Exception:
+                    # Columnas object con tipos mezclados: se guardan como texto
+                    objetos = tabla.select_dtypes(include="object").columns
+                    tabla.astype({c: "string" for c in objetos}).to_parquet(
+                        destino, engine="pyarrow", compression="zstd", index=True
+                    )
+
+            _escribir_atomico(ruta, escribir)
+            rutas.append(ruta)
+        return rutas
+
+    def a_excel(self) -> str:
+        """
+        Libro con una hoja por tabla. Se escribe en modo sólo escritura (las
+        filas pasan al archivo por bloques, sin armar el libro en memoria);
+        las tablas con más filas que el límite de Excel siguen en otra hoja.
+        """
+        from openpyxl import Workbook
+
+        from core.resultado import _escribir_atomico
+
+        ruta = self._ruta(".xlsx")
+        libro = Workbook(write_only=True)
+        for nombre, tabla in self.tablas().items():
+            tabla = _para_exportar(tabla)
+            partes = max(1, -(-len(tabla) // MAX_FILAS_EXCEL))
+            for k in range(partes):
+                hoja = libro.create_sheet(nombre if k == 0 else f"{nombre} ({k + 1})")
+                hoja.append(list(tabla.columns))
+                for fila in _filas_excel(tabla.iloc[k * MAX_FILAS_EXCEL:(k + 1) * MAX_FILAS_EXCEL]):
+                    hoja.append(fila)
+        _escribir_atomico(ruta, libro.save)
+        return ruta
+
+    def a_html(self, graficos=None, max_filas: int = MAX_FILAS_HTML) -> str:
+        """
+        Informe HTML autocontenido (estilos y gráficos embebidos): resumen,
+        tablas chicas completas y las primeras `max_filas` filas marcadas.
+        `graficos` son pares nombre → bytes como en `agregar_imagenes_memoria`.
+        """
+        from core.resultado import _escribir_atomico
+
+        ruta = self._ruta(".html")
+        tablas = self.tablas()
+        datos = tablas["datos"]
+        marcadas = [c for c in datos.columns if str(c).startswith("atipico_")]
+        filas = datos[datos[marcadas].any(axis=1)] if marcadas else datos.iloc[:0]
+
+        def escribir(destino: str) -> None:
+            with open(destino, "w", encoding="utf-8") as f:
+                f.write(
+                    "<!DOCTYPE html><html lang='es'><head><meta charset='utf-8'>"
+                    "<title>Informe de Análisis Automatizado</title><style>"
+                    "body{font-family:sans-serif;margin:2em;color:#222}"
+                    "table{border-collapse:collapse;font-size:12px;margin-bottom:1.5em}"
+                    "th,td{border:1px solid #ccc;padding:3px 6px;text-align:right}"
+                    "th{background:#f0f0f0}pre{white-space:pre-wrap}"
+                    ".graficos img{width:32%;margin:0.5%;border:1px solid #ddd}"
+                    "</style></head><body><h1>Informe de Análisis Automatizado</h1>"
+                )
+                f.write(f"<h2>Resumen</h2><pre>{html.escape(self.resultado.texto())}</pre>")
+                for nombre in ("resumen_atipicos", "perfil_cluster", "estadisticas"):
+                    if nombre in tablas:
+                        f.write(f"<h2>{html.escape(nombre.replace('_', ' ').capitalize())}</h2>")
+                        f.write(_para_exportar(tablas[nombre]).to_html(index=False, border=0))
+                f.write(f"<h2>Filas marcadas como atípicas ({len(filas):,} en total")
+                f.write(f", se muestran {max_filas:,})</h2>" if len(filas) > max_filas else ")</h2>")
+                f.write(filas.head(max_filas).to_html(border=0))
+                if graficos:
+                    items = list(graficos.items()) if isinstance(graficos, dict) else list(graficos)
+                    f.write("<h2>Gráficos</h2><div class='graficos'>")
+                    for nombre, imagen in sorted((t for t in items if t[1] is not None), key=lambda t: t[0]):
+                        tipo = "jpeg" if imagen[:2] == b"\xff\xd8" else "png"
+                        f.write(
+                            f"<img alt='{html.escape(nombre)}' title='{html.escape(nombre)}' "
+                            f"src='data:image/{tipo};base64,{base64.b64encode(imagen).decode('ascii')}'>"
+                        )
+                    f.write("</div>")
+                f.write("</body></html>")
+
+        _escribir_atomico(ruta, escribir)
+        return ruta
+
+    def exportar(self, formatos=FORMATOS_ARTEFACTOS, graficos=None) -> dict[str, list[str]]:
+        """Escribe los formatos pedidos y devuelve las rutas por formato."""
+        desconocidos = set(formatos) - set(FORMATOS_ARTEFACTOS)
+        if desconocidos:
+            raise ValueError(f"Formatos no soportados: {', '.join(sorted(desconocidos))}")
+        rutas: dict[str, list[str]] = {}
+        if "parquet" in formatos:
+            rutas["parquet"] = self.a_parquet()
+        if "excel" in formatos:
+            rutas["excel"] = [self.a_excel()]
+        if "html" in formatos:
+            rutas["html"] = [self.a_html(graficos)]
+        return rutas
@@ -3,19 +3,24 @@ from __future__ import annotations
 import pandas as pd
 import numpy as np
 
+from core.correlacion import MotorCorrelacion, pares_fuertes
+from core.deteccion_atipicos import BanderasAtipicos
+
 class InterpretadorInteligente:
 
     @staticmethod
     def sugerencias_atipicos(zscore, iqr, forest) -> str:
         """
-        zscore: DataFrame booleano (True = outlier por Z)
-        iqr:    DataFrame booleano (True = outlier por IQR)
-        forest: Serie/array booleano (True = fila atípica) o None
+        zscore: DataFrame booleano (True = outlier por Z) o BanderasAtipicos
+        iqr:    DataFrame booleano (True = outlier por IQR) o BanderasAtipicos
+        forest: Serie/array booleano (True = fila atípica), BanderasAtipicos o None
         """
         mensaje = "Sugerencias basadas en detección de atípicos:\n"
 
         # Contar con defensas
         def safe_sum_bool(x):
+            if isinstance(x, BanderasAtipicos):
+                return x.total
             if isinstance(x, pd.DataFrame):
                 return int(x.sum(numeric_only=True).sum())
             if isinstance(x, pd.Series):
@@ -32,12 +37,10 @@ class InterpretadorInteligente:
         # Estimar tamaño de referencia (filas x cols num)
         n_rows = 0
         n_cols_num = 0
-        if isinstance(zscore, pd.DataFrame) and not zscore.empty:
-            n_rows = len(zscore)
-            n_cols_num = zscore.shape[1]
-        elif isinstance(iqr, pd.DataFrame) and not iqr.empty:
-            n_rows = len(iqr)
-            n_cols_num = iqr.shape[1]
+        if isinstance(zscore, (pd.DataFrame, BanderasAtipicos)) and not zscore.empty:
+            n_rows, n_cols_num = zscore.shape
+        elif isinstance(iqr, (pd.DataFrame, BanderasAtipicos)) and not iqr.empty:
+            n_rows, n_cols_num = iqr.shape
 
         n_cells = max(n_rows * max(n_cols_num, 1), 1)
         rate_z = total_z / n_cells if n_cells else 0.0
@@ -60,26 +63,23 @@ class InterpretadorInteligente:
     def sugerencias_correlaciones(correlaciones, umbral: float = 0.8) -> str:
         """
         correlaciones: DataFrame de correlación (p. ej., Pearson/Spearman)
+                       o MotorCorrelacion (búsqueda por bloques)
         """
         mensaje = "Sugerencias basadas en correlaciones fuertes:\n"
 
-        if not isinstance(correlaciones, pd.DataFrame) or correlaciones.empty or correlaciones.shape[1] < 2:
+        if isinstance(correlaciones, MotorCorrelacion):
+            suficientes = len(correlaciones.columnas_base) >= 2
+        else:
+            suficientes = isinstance(correlaciones, pd.DataFrame) and not correlaciones.empty and correlaciones.shape[1] >= 2
+        if not suficientes:
             mensaje += "- No hay suficientes variables numéricas o la matriz está vacía.\n"
             return mensaje
 
-        # Tomar pares únicos i<j
-        cols = list(correlaciones.columns)
-        fuertes = []
-        for i in range(len(cols)):
-            for j in range(i + 1, len(cols)):
-                coef = correlaciones.iloc[i, j]
-                if pd.notna(coef) and abs(coef) >= umbral:
-                    fuertes.append((cols[i], cols[j], float(coef)))
+        # Pares únicos i<j con |r| >= umbral, los 10 más fuertes (ya ordenados por |r|)
+        top = pares_fuertes(correlaciones, k=10, umbral=umbral)
+        fuertes = list(zip(top["var1"], top["var2"], top["r"].astype(float)))
 
         if fuertes:
-            # Ordenar por |r| descendente y limitar
-            fuertes.sort(key=lambda t: abs(t[2]), reverse=True)
-            fuertes = fuertes[:10]
             mensaje += "- Se detectaron relaciones muy fuertes. Considera eliminar/combinar variables para evitar multicolinealidad:\n"
             for v1, v2, r in fuertes:
                 mensaje += f"  • {v1} ↔ {v2}: r = {r:.2f}\n"
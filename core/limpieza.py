@@ -1,54 +1,335 @@
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Iterable, Iterator
+
 import pandas as pd
 import numpy as np
-from pandas.api.types import is_numeric_dtype
+from pandas.api.types import is_numeric_dtype, is_datetime64_any_dtype, is_float_dtype
+
+from core.bocetos import BocetoCuantiles, ConjuntoHashesDisco, FiltroBloom, hashes_filas
+
+
+@contextmanager
+def _medir(perfil: dict, paso: str, memoria: bool = True):
+    """Registra en `perfil[paso]` el tiempo y, si `memoria`, el pico de memoria del bloque."""
+    propio = memoria and not tracemalloc.is_tracing()
+    if propio:
+        tracemalloc.start()
+    if memoria:
+        tracemalloc.reset_peak()
+        base, _ = tracemalloc.get_traced_memory()
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        perfil[paso] = {"segundos": round(time.perf_counter() - t0, 4)}
+        if memoria:
+            _, pico = tracemalloc.get_traced_memory()
+            perfil[paso]["pico_bytes"] = int(max(pico - base, 0))
+        if propio:
+            tracemalloc.stop()
+
+
+def _tipo_comun(a, b):
+    """
+    Tipo de una columna válido para todos los bloques. Los hashes de fila
+    dependen del tipo (int8 vs int16, int vs float), así que todos los
+    bloques se llevan a este tipo antes de hashear.
+    """
+    if a == b:
+        return a
+    if isinstance(a, pd.CategoricalDtype) and isinstance(b, pd.CategoricalDtype):
+        # El hash de una categórica depende del valor, no de sus categorías
+        return a
+    es_numpy = isinstance(a, np.dtype) and isinstance(b, np.dtype)
+    if es_numpy and is_numeric_dtype(a) and is_numeric_dtype(b):
+        return np.result_type(a, b)
+    if is_numeric_dtype(a) and is_numeric_dtype(b):
+        return np.dtype("float64")
+    return np.dtype(object)
+
+
+def _con_tipos(bloque: pd.DataFrame, tipos: dict) -> pd.DataFrame:
+    """Lleva cada columna del bloque al tipo común (`_tipo_comun`) de todo el archivo."""
+    cambios = {}
+    for c in bloque.columns:
+        actual, destino = bloque[c].dtype, tipos[c]
+        if actual == destino:
+            continue
+        if isinstance(actual, pd.CategoricalDtype) and isinstance(destino, pd.CategoricalDtype):
+            continue
+        cambios[c] = destino
+    return bloque.astype(cambios) if cambios else bloque
+
+
+def _sin_infinitos(s: pd.Series) -> pd.Series:
+    # Sólo se crea una serie nueva si realmente hay inf/-inf
+    if is_float_dtype(s) and not isinstance(s.dtype, pd.api.extensions.ExtensionDtype):
+        valores = s.to_numpy()
+        if np.isinf(valores).any():
+            return s.replace([np.inf, -np.inf], np.nan)
+    return s
+
 
 class LimpiadorDatos:
     @staticmethod
-    def limpiar(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+    def limpiar(df: pd.DataFrame, medir_memoria: bool = False) -> tuple[pd.DataFrame, dict]:
         """
         Limpieza básica del DataFrame:
           1) Elimina columnas con >50% de nulos
           2) Elimina filas duplicadas
           3) Imputa nulos restantes: mediana en numéricas; "Desconocido" en no numéricas
 
+        No copia el DataFrame de entrada: las columnas sin cambios se
+        reutilizan, las filas duplicadas se detectan con un único hash por
+        fila y sólo se crean series nuevas para las columnas imputadas.
+        `resumen["perfil"]` incluye el tiempo por paso y, con
+        `medir_memoria=True` (activa tracemalloc, más lento), el pico de memoria.
+
+        Contrato de aliasing: si no hubo duplicados, las columnas no imputadas
+        del resultado comparten memoria con `df`. Agregar o reemplazar
+        columnas (`df_limpio[c] = ...`) es seguro; escribir valores en el
+        lugar (`.loc[...] = `, `inplace=True`, `.to_numpy()[...] =`) también
+        modificaría `df` (p. ej. el "cargado" en cache): hacer antes `copy()`.
+
         Retorna:
           (df_limpio, resumen_dict)
         """
         resumen: dict = {}
-        df = df.copy()
-
-        # Normalización ligera: reemplazar inf/-inf por NaN para permitir imputación
-        df.replace([np.inf, -np.inf], np.nan, inplace=True)
-
-        # 1) Columnas con > 50% nulos
+        perfil: dict = {}
         umbral = 0.5
-        null_ratio = df.isna().mean()
-        cols_con_muchos_nulos = null_ratio[null_ratio > umbral].index.tolist()
-        df.drop(columns=cols_con_muchos_nulos, inplace=True)
+        n_filas = len(df)
+
+        # 1) Nulos por columna (inf/-inf cuentan como NaN) en una sola pasada
+        with _medir(perfil, "nulos", medir_memoria):
+            series = [_sin_infinitos(df.iloc[:, i]) for i in range(df.shape[1])]
+            nulos = [int(s.isna().sum()) for s in series]
+            muchos_nulos = [n_filas > 0 and n / n_filas > umbral for n in nulos]
+            cols_con_muchos_nulos = [s.name for s, m in zip(series, muchos_nulos) if m]
+            conservadas = [(s, n) for s, n, m in zip(series, nulos, muchos_nulos) if not m]
 
         resumen["columnas_eliminadas_por_nulos"] = len(cols_con_muchos_nulos)
         resumen["detalle_columnas_eliminadas"] = cols_con_muchos_nulos
 
-        # 2) Eliminar duplicados
-        duplicados = int(df.duplicated(keep="first").sum())
-        df.drop_duplicates(keep="first", inplace=True)
+        # 2) Duplicados: un hash de 64 bits por fila, marcado en una pasada
+        with _medir(perfil, "duplicados", medir_memoria):
+            if conservadas:
+                base = pd.concat([s for s, _ in conservadas], axis=1, copy=False)
+            else:
+                base = pd.DataFrame(index=df.index)
+
+            if base.shape[1] > 0 and n_filas > 0:
+                hashes = pd.util.hash_pandas_object(base, index=False)
+                repetidas = hashes.duplicated(keep="first").to_numpy()
+            else:
+                repetidas = np.zeros(n_filas, dtype=bool)
+
+            duplicados = int(repetidas.sum())
+            if duplicados:
+                # Única copia de datos: las filas que sobreviven
+                base = base.loc[~repetidas]
+
         resumen["duplicados_eliminados"] = duplicados
 
-        # 3) Rellenar nulos restantes
-        nulos_antes = int(df.isna().sum().sum())
+        # 3) Rellenar nulos restantes, columna a columna
+        with _medir(perfil, "imputacion", medir_memoria):
+            rellenados = 0
+            for pos, (_, n_nulos) in enumerate(conservadas):
+                if n_nulos == 0:
+                    continue
+                s = base.iloc[:, pos]
+                if duplicados:
+                    n_nulos = int(s.isna().sum())
+                    if n_nulos == 0:
+                        continue
+
+                if is_numeric_dtype(s):
+                    # a) Numéricas → mediana
+                    mediana = s.median()
+                    if pd.isna(mediana):
+                        continue
+                    s = s.fillna(mediana)
+                elif is_datetime64_any_dtype(s):
+                    # Las fechas se dejan como NaT para conservar su tipo
+                    continue
+                else:
+                    # b) No numéricas → "Desconocido"
+                    if isinstance(s.dtype, pd.CategoricalDtype) and "Desconocido" not in s.cat.categories:
+                        s = s.cat.add_categories("Desconocido")
+                    s = s.fillna("Desconocido")
+
+                base.isetitem(pos, s)
+                rellenados += n_nulos
+
+        resumen["nulos_rellenados"] = rellenados
+        resumen["perfil"] = perfil
+
+        return base, resumen
+
+    @staticmethod
+    def limpiar_por_bloques(
+        bloques: Iterable[pd.DataFrame],
+        modo_duplicados: str = "exacto",
+        tasa_falsos_positivos: float = 1e-3,
+        capacidad_estimada: int = 10_000_000,
+        carpeta_temporal: str | None = None,
+        medir_memoria: bool = False,
+    ) -> "LimpiezaPorBloques":
+        """
+        Misma limpieza que `limpiar`, pero sin tener todo el DataFrame en memoria.
+
+        - Pasada 1: cuenta nulos por columna, vuelca cada bloque a Parquet y
+          determina un tipo común por columna para todo el archivo.
+        - Pasada 2: lleva cada bloque a esos tipos y elimina duplicados con
+          un conjunto de hashes por fila que se vuelca a disco ("exacto") o
+          con un filtro de Bloom
+          ("probabilistico", con tasa de falsos positivos acotada), y
+          acumula bocetos de cuantiles combinables para las medianas.
+        - La imputación se aplica al recorrer el resultado.
+
+        Retorna:
+          LimpiezaPorBloques, con `resumen` (mismas claves que `limpiar`)
+          y acceso a los bloques limpios.
+        """
+        if modo_duplicados not in {"exacto", "probabilistico"}:
+            raise ValueError("modo_duplicados debe ser 'exacto' o 'probabilistico'.")
+
+        umbral = 0.5
+        perfil: dict = {}
+        carpeta = tempfile.mkdtemp(prefix="limpieza_", dir=carpeta_temporal)
+
+        try:
+            # 1) Nulos por columna + volcado a disco
+            with _medir(perfil, "nulos", medir_memoria):
+                n_filas = 0
+                nulos = None
+                tipos: dict = {}
+                crudos = []
+                for i, bloque in enumerate(bloques):
+                    bloque = pd.concat(
+                        [_sin_infinitos(bloque.iloc[:, j]) for j in range(bloque.shape[1])], axis=1, copy=False
+                    )
+                    for c, t in bloque.dtypes.items():
+                        tipos[c] = t if c not in tipos else _tipo_comun(tipos[c], t)
+                    cuenta = bloque.isna().sum()
+                    nulos = cuenta if nulos is None else nulos.add(cuenta, fill_value=0)
+                    n_filas += len(bloque)
+                    ruta = os.path.join(carpeta, f"crudo_{i:06d}.parquet")
+                    bloque.to_parquet(ruta, index=True)
+                    crudos.append(ruta)
+
+            if nulos is None:
+                nulos = pd.Series(dtype="int64")
+            cols_con_muchos_nulos = [c for c in nulos.index if n_filas and nulos[c] / n_filas > umbral]
+            conservadas = [c for c in nulos.index if c not in cols_con_muchos_nulos]
+            numericas = [c for c in conservadas if is_numeric_dtype(tipos[c]) and nulos[c] > 0]
+
+            # 2) Duplicados entre bloques + bocetos de medianas
+            with _medir(perfil, "duplicados", medir_memoria):
+                if modo_duplicados == "exacto":
+                    vistos = ConjuntoHashesDisco(os.path.join(carpeta, "hashes"))
+                else:
+                    vistos = FiltroBloom(capacidad_estimada, tasa_falsos_positivos)
+
+                bocetos = {c: BocetoCuantiles(k=4096) for c in numericas}
+                nulos_restantes = pd.Series(0, index=conservadas, dtype="int64")
+                duplicados = 0
+                limpios = []
+                for ruta in crudos:
+                    # Mismo tipo en todos los bloques: filas iguales → mismo hash
+                    bloque = _con_tipos(pd.read_parquet(ruta, columns=conservadas), tipos)
+                    h = hashes_filas(bloque)
+                    repetidas = pd.Series(h).duplicated(keep="first").to_numpy()
+                    candidatas = np.flatnonzero(~repetidas)
+                    repetidas[candidatas[vistos.agregar_y_consultar(h[candidatas])]] = True
+
+                    if repetidas.any():
+                        duplicados += int(repetidas.sum())
+                        bloque = bloque.loc[~repetidas]
+                    nulos_restantes = nulos_restantes.add(bloque.isna().sum(), fill_value=0)
+                    for c in numericas:
+                        valores = pd.to_numeric(bloque[c], errors="coerce")
+                        bocetos[c].actualizar(valores.to_numpy(dtype="float64", na_value=np.nan))
+
+                    ruta_limpia = ruta.replace("crudo_", "limpio_")
+                    bloque.to_parquet(ruta_limpia, index=True)
+                    limpios.append(ruta_limpia)
+                    os.remove(ruta)
+
+                if isinstance(vistos, ConjuntoHashesDisco):
+                    vistos.cerrar()
+
+            # 3) Valores de imputación (se aplican al leer los bloques)
+            imputaciones: dict = {}
+            rellenados = 0
+            for c in conservadas:
+                n_nulos = int(nulos_restantes[c])
+                if n_nulos == 0 or is_datetime64_any_dtype(tipos[c]):
+                    continue
+                if is_numeric_dtype(tipos[c]):
+                    mediana = bocetos[c].cuantil(0.5) if c in bocetos else np.nan
+                    if not np.isfinite(mediana):
+                        continue
+                    imputaciones[c] = mediana
+                else:
+                    imputaciones[c] = "Desconocido"
+                rellenados += n_nulos
+        except Exception:
+            shutil.rmtree(carpeta, ignore_errors=True)
+            raise
+
+        resumen = {
+            "columnas_eliminadas_por_nulos": len(cols_con_muchos_nulos),
+            "detalle_columnas_eliminadas": cols_con_muchos_nulos,
+            "duplicados_eliminados": duplicados,
+            "nulos_rellenados": rellenados,
+            "modo_duplicados": modo_duplicados,
+            "perfil": perfil,
+        }
+        return LimpiezaPorBloques(carpeta, limpios, imputaciones, resumen)
+
+
+class LimpiezaPorBloques:
+    """
+    Resultado de `LimpiadorDatos.limpiar_por_bloques`.
+
+    Los bloques ya deduplicados viven en una carpeta temporal; la imputación
+    se aplica al recorrerlos. Usar como context manager (o llamar a
+    `cerrar()`) para borrar los temporales.
+    """
+
+    def __init__(self, carpeta: str, archivos: list[str], imputaciones: dict, resumen: dict):
+        self.carpeta = carpeta
+        self.archivos = archivos
+        self.imputaciones = imputaciones
+        self.resumen = resumen
+
+    def bloques(self) -> Iterator[pd.DataFrame]:
+        for ruta in self.archivos:
+            bloque = pd.read_parquet(ruta)
+            for c, valor in self.imputaciones.items():
+                s = bloque[c]
+                if not s.isna().any():
+                    continue
+                if isinstance(s.dtype, pd.CategoricalDtype) and valor not in s.cat.categories:
+                    s = s.cat.add_categories(valor)
+                bloque[c] = s.fillna(valor)
+            yield bloque
+
+    def a_dataframe(self) -> pd.DataFrame:
+        from core.cargar import concatenar_bloques
 
-        # a) Numéricas → mediana
-        num_cols = [c for c in df.columns if is_numeric_dtype(df[c])]
-        if num_cols:
-            medians = df[num_cols].median(numeric_only=True)
-            df[num_cols] = df[num_cols].fillna(medians)
+        return concatenar_bloques(self.bloques(), ignorar_indice=False)
 
-        # b) No numéricas → "Desconocido"
-        non_num_cols = [c for c in df.columns if c not in num_cols]
-        if non_num_cols:
-            df[non_num_cols] = df[non_num_cols].fillna("Desconocido")
+    def cerrar(self) -> None:
+        shutil.rmtree(self.carpeta, ignore_errors=True)
 
-        nulos_despues = int(df.isna().sum().sum())
-        resumen["nulos_rellenados"] = nulos_antes - nulos_despues
+    def __enter__(self):
+        return self
 
-        return df, resumen
+    def __exit__(self, *exc):
+        self.cerrar()
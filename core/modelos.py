@@ -0,0 +1,114 @@
+# core/modelos.py
+from __future__ import annotations
+
+import os
+import time
+import uuid
+from typing import Any
+
+import joblib
+import pandas as pd
+import streamlit as st
+
+from core.cache import huella_contenido
+from core.cache_disco import CARPETA_CACHE, VERSION_CACHE, desalojar_lru
+
+CARPETA_MODELOS = os.path.join(CARPETA_CACHE, "modelos")
+LIMITE_BYTES_MODELOS = 512 * 1024 ** 2
+
+
+def huella_esquema(df: pd.DataFrame) -> str:
+    """
+    Huella del esquema (nombres y tipos de columnas), sin mirar los datos.
+
+    Dos versiones de un mismo archivo (p. ej. el de hoy y el del mes
+    pasado) comparten esquema, por lo que un modelo entrenado con una
+    sirve para puntuar la otra.
+    """
+    partes = [f"{c}:{t}" for c, t in zip(df.columns, df.dtypes.astype(str))]
+    return huella_contenido("|".join(partes).encode("utf-8"))
+
+
+class RegistroModelos:
+    """
+    Registro en disco de modelos entrenados (joblib), indexado por clave.
+
+    - La clave combina el tipo de modelo, la huella del esquema o de los
+      datos y los hiperparámetros (ver `clave`).
+    - Cada entrada guarda el modelo junto con metadatos (columnas,
+      filas usadas, fecha de entrenamiento).
+    - El tamaño total está acotado con el mismo desalojo LRU de la cache
+      columnar.
+    """
+
+    def __init__(self, carpeta: str = CARPETA_MODELOS, limite_bytes: int = LIMITE_BYTES_MODELOS):
+        self.carpeta = carpeta
+        self.limite_bytes = int(limite_bytes)
+        self.aciertos = 0
+        self.fallos = 0
+        os.makedirs(self.carpeta, exist_ok=True)
+
+    @staticmethod
+    def clave(tipo: str, *partes, **parametros) -> str:
+        """Clave estable para `tipo` + partes (huellas, columnas) + hiperparámetros."""
+        return huella_contenido(tipo.encode("utf-8"), *partes, sorted(parametros.items()))
+
+    def _ruta(self, tipo: str, clave: str) -> str:
+        return os.path.join(self.carpeta, f"{tipo}_{clave}_v{VERSION_CACHE}.joblib")
+
+    def cargar(self, tipo: str, clave: str) -> dict | None:
+        """Entrada guardada (`{"modelo": ..., **metadatos}`) o None."""
+        ruta = self._ruta(tipo, clave)
+        if not os.path.isfile(ruta):
+            self.fallos += 1
+            return None
+        try:
+            entrada = joblib.load(ruta)
+        except Exception:
+            # Archivo corrupto o de otra versión de scikit-learn
+            self._eliminar(ruta)
+            self.fallos += 1
+            return None
+        os.utime(ruta)
+        self.aciertos += 1
+        return entrada
+
+    def guardar(self, tipo: str, clave: str, modelo: Any, **metadatos) -> dict:
+        """Guarda el modelo de forma atómica y devuelve la entrada creada."""
+        entrada = {"modelo": modelo, "creado": time.time(), **metadatos}
+        ruta = self._ruta(tipo, clave)
+        tmp = f"{ruta}.{uuid.uuid4().hex}.tmp"
+        try:
+            joblib.dump(entrada, tmp)
+            os.replace(tmp, ruta)
+        except Exception:
+            self._eliminar(tmp)
+            return entrada
+        desalojar_lru(self.carpeta, self.limite_bytes, conservar={os.path.basename(ruta)})
+        return entrada
+
+    def estadisticas(self) -> dict:
+        try:
+            tamanos = [e.stat().st_size for e in os.scandir(self.carpeta) if e.is_file()]
+        except FileNotFoundError:
+            tamanos = []
+        return {
+            "modelos": len(tamanos),
+            "bytes": int(sum(tamanos)),
+            "limite_bytes": self.limite_bytes,
+            "aciertos": self.aciertos,
+            "fallos": self.fallos,
+        }
+
+    @staticmethod
+    def _eliminar(ruta: str) -> None:
+        try:
+            os.remove(ruta)
+        except OSError:
+            pass
+
+
+@st.cache_resource
+def registro_modelos() -> RegistroModelos:
+    """Instancia única por proceso, compartida entre sesiones."""
+    return RegistroModelos()
@@ -1,17 +1,41 @@
 import pandas as pd
+from typing import Iterable
 from core.limpieza import LimpiadorDatos
 
-def preparar_datos(df: pd.DataFrame) -> tuple[pd.DataFrame, dict]:
+def preparar_datos(df: pd.DataFrame, medir_memoria: bool = False) -> tuple[pd.DataFrame, dict]:
     """
     Limpia el DataFrame y genera la columna 'Exito' si existe 'Units Sold'.
 
+    El resultado puede compartir columnas con `df` (ver `LimpiadorDatos.limpiar`):
+    no escribir valores en el lugar sobre ninguno de los dos.
+
     Retorna:
     - El DataFrame limpio.
     - Un resumen de limpieza con métricas clave.
     """
-    df_limpio, resumen = LimpiadorDatos.limpiar(df)
-    df_limpio = df_limpio.copy()
+    # `limpiar` ya devuelve un DataFrame nuevo: no hace falta otra copia
+    df_limpio, resumen = LimpiadorDatos.limpiar(df, medir_memoria=medir_memoria)
+    return _agregar_objetivo(df_limpio, resumen)
+
+
+def preparar_datos_por_bloques(bloques: Iterable[pd.DataFrame], **opciones) -> tuple[pd.DataFrame, dict]:
+    """
+    Variante de `preparar_datos` que nunca tiene el archivo crudo completo
+    en memoria: la limpieza se hace por bloques (ver
+    `LimpiadorDatos.limpiar_por_bloques`) con los bloques en disco.
+
+    El resultado limpio y deduplicado sí se materializa entero
+    (`a_dataframe()`): baja el pico de memoria de la carga, pero el
+    dataset limpio tiene que entrar en RAM.
+    """
+    with LimpiadorDatos.limpiar_por_bloques(bloques, **opciones) as limpieza:
+        df_limpio = limpieza.a_dataframe()
+        resumen = limpieza.resumen
+    return _agregar_objetivo(df_limpio, resumen)
+
 
+def _agregar_objetivo(df_limpio: pd.DataFrame, resumen: dict) -> tuple[pd.DataFrame, dict]:
+    """Crea la columna 'Exito' a partir de 'Units Sold' y la documenta en el resumen."""
     resumen.setdefault("target", {})
     resumen["target"]["creada"] = False
     resumen["target"]["columna_base"] = None
@@ -0,0 +1,163 @@
+# core/reglas.py
+from __future__ import annotations
+
+import json
+import os
+from functools import lru_cache
+from typing import Callable
+
+import numpy as np
+import pandas as pd
+
+RUTA_REGLAS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "config", "reglas_etiquetas.json")
+
+OPERADORES: dict[str, Callable] = {
+    ">": np.greater,
+    ">=": np.greater_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    "==": np.equal,
+    "!=": np.not_equal,
+    "entre": lambda x, v: (x >= v[0]) & (x <= v[1]),
+    "en": lambda x, v: pd.Series(x).isin(v).to_numpy(),
+}
+# Sólo tienen sentido con valores numéricos: la columna se convierte a número
+OPERADORES_ORDEN = {">", ">=", "<", "<=", "entre"}
+
+
+@lru_cache(maxsize=8)
+def _leer_json(ruta: str, modificado: float) -> dict:
+    with open(ruta, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _es_numero(valor) -> bool:
+    return isinstance(valor, (int, float, np.number)) and not isinstance(valor, bool)
+
+
+def _valor_numerico(operador: str, valor) -> bool:
+    """True si `valor` es numérico (para "entre" y "en", todos sus elementos)."""
+    if operador in ("entre", "en"):
+        return isinstance(valor, (list, tuple)) and all(_es_numero(v) for v in valor)
+    return _es_numero(valor)
+
+
+def cargar_reglas(ruta: str = RUTA_REGLAS) -> dict:
+    """Lee la configuración de reglas (se relee sólo si el archivo cambió)."""
+    return _leer_json(ruta, os.path.getmtime(ruta))
+
+
+class MotorReglas:
+    """
+    Reglas de negocio configurables, evaluadas como máscaras booleanas.
+
+    Formato de la configuración (ver config/reglas_etiquetas.json):
+    - "conjuntos": {nombre: {"defecto": etiqueta, "reglas": [...]}}; cada
+      regla tiene "etiqueta" y "condiciones" (todas deben cumplirse) con
+      "columna", "operador" (>, >=, <, <=, ==, !=, entre, en) y "valor".
+    - "columna_linea" + "lineas": {valor de la línea de producto: conjunto}
+      para aplicar reglas distintas por línea; el resto usa
+      "conjunto_predeterminado".
+
+    Las reglas se evalúan en orden y gana la primera que se cumple
+    (`np.select`). Con valor numérico la columna se convierte a número
+    (columnas ausentes o valores no numéricos cuentan como 0); con valor de
+    texto, "==", "!=" y "en" comparan los valores de la columna tal cual.
+    Los operadores de orden (>, >=, <, <=, entre) exigen valores numéricos.
+    """
+
+    def __init__(self, config: dict):
+        self.config = config
+        self.conjuntos = config.get("conjuntos", {})
+        self.predeterminado = config.get("conjunto_predeterminado") or next(iter(self.conjuntos), None)
+        if self.predeterminado not in self.conjuntos:
+            raise ValueError("La configuración de reglas no define el conjunto predeterminado.")
+        for nombre, conjunto in self.conjuntos.items():
+            for regla in conjunto.get("reglas", []):
+                for cond in regla.get("condiciones", []):
+                    operador = cond.get("operador")
+                    if operador not in OPERADORES:
+                        raise ValueError(f"Operador no soportado en el conjunto '{nombre}': {operador}")
+                    if operador in OPERADORES_ORDEN and not _valor_numerico(operador, cond.get("valor")):
+                        raise ValueError(
+                            f"El operador '{operador}' necesita un valor numérico en el conjunto "
+                            f"'{nombre}' (columna '{cond.get('columna')}'): {cond.get('valor')!r}"
+                        )
+                    if operador == "entre" and len(cond["valor"]) != 2:
+                        raise ValueError(f"'entre' necesita [mínimo, máximo] en el conjunto '{nombre}'.")
+        # Todas las etiquetas posibles, en orden estable (categorías del resultado)
+        etiquetas: list = []
+        for conjunto in self.conjuntos.values():
+            for e in [r["etiqueta"] for r in conjunto.get("reglas", [])] + [conjunto.get("defecto", "")]:
+                if e not in etiquetas:
+                    etiquetas.append(e)
+        self.etiquetas = etiquetas
+
+    @classmethod
+    def desde_archivo(cls, ruta: str = RUTA_REGLAS) -> "MotorReglas":
+        return cls(cargar_reglas(ruta))
+
+    @staticmethod
+    def _columna(df: pd.DataFrame, columna: str, cache: dict, numerica: bool = True) -> np.ndarray:
+        """Columna como float64 (NaN → 0) o, con `numerica=False`, con sus valores originales (nulos → None)."""
+        clave = (columna, numerica)
+        if clave not in cache:
+            if columna not in df.columns:
+                cache[clave] = np.zeros(len(df)) if numerica else np.full(len(df), None, dtype=object)
+            elif numerica:
+                valores = pd.to_numeric(df[columna], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                cache[clave] = np.nan_to_num(valores, nan=0.0)
+            else:
+                cache[clave] = df[columna].to_numpy(dtype=object, na_value=None)
+        return cache[clave]
+
+    def _codigos(self, df: pd.DataFrame, conjunto: str, cache: dict) -> np.ndarray:
+        """Código de etiqueta (posición en `self.etiquetas`) por fila para un conjunto."""
+        definicion = self.conjuntos[conjunto]
+        condiciones, codigos = [], []
+        for regla in definicion.get("reglas", []):
+            mascara = np.ones(len(df), dtype=bool)
+            for cond in regla.get("condiciones", []):
+                numerica = _valor_numerico(cond["operador"], cond["valor"])
+                x = self._columna(df, cond["columna"], cache, numerica)
+                mascara &= OPERADORES[cond["operador"]](x, cond["valor"])
+            condiciones.append(mascara)
+            codigos.append(self.etiquetas.index(regla["etiqueta"]))
+        defecto = self.etiquetas.index(definicion.get("defecto", ""))
+        if not condiciones:
+            return np.full(len(df), defecto, dtype=np.int32)
+        return np.select(condiciones, codigos, default=defecto).astype(np.int32)
+
+    def etiquetar(self, df: pd.DataFrame, conjunto: str | None = None) -> pd.Series:
+        """
+        Etiqueta todas las filas de `df` en una pasada vectorizada.
+
+        Parámetros:
+        - conjunto: fuerza un conjunto de reglas; si es None se elige por
+          línea de producto ("columna_linea") cuando esa columna existe.
+
+        Retorna:
+        - Serie categórica alineada al índice de `df`.
+        """
+        cache: dict = {}
+        columna_linea = self.config.get("columna_linea")
+        lineas = self.config.get("lineas", {})
+        if conjunto is not None or not lineas or columna_linea not in df.columns:
+            codigos = self._codigos(df, conjunto or self.predeterminado, cache)
+        else:
+            destino = df[columna_linea].astype(str).map(lineas).fillna(self.predeterminado).to_numpy()
+            codigos = np.empty(len(df), dtype=np.int32)
+            for nombre in pd.unique(destino):
+                if nombre not in self.conjuntos:
+                    raise ValueError(f"La línea de producto apunta a un conjunto inexistente: {nombre}")
+                filas = destino == nombre
+                # Las columnas ya convertidas se reutilizan entre conjuntos
+                codigos[filas] = self._codigos(df, nombre, cache)[filas]
+        return pd.Series(
+            pd.Categorical.from_codes(codigos, categories=self.etiquetas), index=df.index, name="Etiqueta"
+        )
+
+
+def motor_reglas() -> MotorReglas:
+    """Motor con la configuración por defecto (config/reglas_etiquetas.json)."""
+    return MotorReglas.desde_archivo(RUTA_REGLAS)
@@ -0,0 +1,213 @@
+# core/resultado.py
+from __future__ import annotations
+
+import json
+import os
+import time
+import uuid
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from core.deteccion_atipicos import BanderasAtipicos
+from core.interpretador import InterpretadorInteligente
+from core.resumen import GeneradorResumen
+
+# Subir este número invalida los resultados guardados cuando cambia su formato
+VERSION_RESULTADO = 3
+METODOS_ATIPICOS = ("zscore", "iqr", "forest")
+TABLAS_RESULTADO = ("estadisticas", "perfil_cluster", "curva_k")
+
+
+def _celda_a_json(valor) -> str | None:
+    if np.ndim(valor) == 0 and pd.isna(valor):
+        return None
+    if isinstance(valor, np.generic):
+        valor = valor.item()
+    return json.dumps(valor, ensure_ascii=False, default=str)
+
+
+def _tabla_a_parquet(tabla: pd.DataFrame, ruta: str) -> list[str]:
+    """
+    Escribe `tabla` en Parquet conservando tipos y nombres de índice. Las
+    columnas object (p. ej. "top"/"freq" de describe, con textos, números
+    y booleanos mezclados) se guardan como texto JSON por celda para
+    recuperar cada valor con su tipo. Retorna esas columnas.
+    """
+    tabla = tabla.copy(deep=False)
+    objetos = [str(c) for c in tabla.columns if tabla[c].dtype == object]
+    tabla.columns = [str(c) for c in tabla.columns]
+    for c in objetos:
+        tabla[c] = tabla[c].map(_celda_a_json).astype("string")
+    _escribir_atomico(ruta, lambda r: tabla.to_parquet(r, engine="pyarrow", index=True))
+    return objetos
+
+
+def _tabla_desde_parquet(ruta: str, objetos: list[str]) -> pd.DataFrame:
+    tabla = pd.read_parquet(ruta, engine="pyarrow")
+    for c in objetos:
+        tabla[c] = pd.Series(
+            [np.nan if pd.isna(t) else json.loads(t) for t in tabla[c]], index=tabla.index, dtype=object
+        )
+    return tabla
+
+
+def _escribir_atomico(ruta: str, escribir) -> None:
+    """Escribe en un temporal y lo renombra (nunca queda un archivo a medias)."""
+    base, ext = os.path.splitext(ruta)
+    tmp = f"{base}.{uuid.uuid4().hex}.tmp{ext}"
+    try:
+        escribir(tmp)
+        os.replace(tmp, ruta)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+@dataclass
+class ResultadoAnalisis:
+    """
+    Resultado estructurado del análisis completo de un dataset.
+
+    Guarda lo calculado (estadísticas, correlaciones, marcas de atípicos,
+    asignación y perfil de clústeres, selección de k) en lugar del texto
+    ya armado: el resumen (`texto`), la interfaz y el PDF son vistas
+    baratas sobre el mismo objeto.
+
+    Se serializa en cuatro archivos con el mismo prefijo (ver `guardar`):
+    - `.json`: metadatos y tablas chicas (estadísticas, perfil, curva de k).
+    - `_correlacion.parquet` y `_filas.parquet`: matriz p×p y clúster por fila.
+    - `_atipicos.npz`: marcas de atípicos empaquetadas en bits.
+    """
+
+    huella: str
+    tipos: dict
+    estadisticas: pd.DataFrame
+    correlacion: pd.DataFrame
+    atipicos: dict[str, BanderasAtipicos]
+    clusters: pd.Series
+    etiquetas: dict = field(default_factory=dict)
+    perfil_cluster: pd.DataFrame = field(default_factory=pd.DataFrame)
+    k: int | None = None
+    origen_k: str | None = None
+    curva_k: pd.DataFrame = field(default_factory=pd.DataFrame)
+    creado: float = field(default_factory=time.time)
+
+    @property
+    def hay_clusters(self) -> bool:
+        return bool((self.clusters != -1).any())
+
+    @property
+    def nbytes(self) -> int:
+        tablas = (self.estadisticas, self.correlacion, self.perfil_cluster, self.curva_k)
+        return int(
+            sum(t.memory_usage(index=True, deep=True).sum() for t in tablas)
+            + self.clusters.memory_usage(index=True)
+            + sum(b.nbytes for b in self.atipicos.values())
+        )
+
+    def etiquetas_por_fila(self) -> pd.Series:
+        """Etiqueta legible del clúster de cada fila."""
+        return self.clusters.map(self.etiquetas).rename("Cluster Etiqueta")
+
+    def texto(self) -> str:
+        """Resumen e interpretación en texto (mismo formato del informe)."""
+        zscore, iqr, forest = (self.atipicos.get(m) for m in METODOS_ATIPICOS)
+        resumen = (
+            GeneradorResumen.resumen_agrupamiento(self.clusters.to_numpy(), self.etiquetas) + "\n"
+            + GeneradorResumen.resumen_atipicos(pd.DataFrame(index=self.clusters.index), zscore, iqr, forest) + "\n"
+            + GeneradorResumen.resumen_correlaciones(self.correlacion)
+        ).replace("🔹", "-").replace("≥", ">=")
+
+        interpretacion = (
+            InterpretadorInteligente.sugerencias_atipicos(zscore, iqr, forest) + "\n"
+            + InterpretadorInteligente.sugerencias_correlaciones(self.correlacion)
+        )
+        return resumen + "\n" + interpretacion
+
+    # --- Serialización ---
+
+    def guardar(self, prefijo: str) -> None:
+        """
+        Escribe el resultado en `prefijo` + {.json, _correlacion.parquet,
+        _filas.parquet, _atipicos.npz, _<tabla>.parquet}. El JSON se escribe
+        al final: si existe, el resto del resultado está completo.
+        """
+        corr = self.correlacion.copy(deep=False)
+        corr.columns = [str(c) for c in corr.columns]
+        corr.index = corr.columns
+        _escribir_atomico(f"{prefijo}_correlacion.parquet", lambda r: corr.to_parquet(r, engine="pyarrow"))
+
+        filas = self.clusters.rename("Cluster").to_frame()
+        _escribir_atomico(f"{prefijo}_filas.parquet", lambda r: filas.to_parquet(r, engine="pyarrow", index=True))
+
+        arreglos = {}
+        for nombre, banderas in self.atipicos.items():
+            arreglos[f"{nombre}_bits"] = banderas.bits
+            arreglos[f"{nombre}_conteos"] = banderas.conteos.to_numpy()
+        _escribir_atomico(f"{prefijo}_atipicos.npz", lambda r: np.savez_compressed(r, **arreglos))
+
+        # Parquet conserva tipos (Float64, enteros) y nombres de índice ("Cluster", "k")
+        objetos = {
+            nombre: _tabla_a_parquet(getattr(self, nombre), f"{prefijo}_{nombre}.parquet")
+            for nombre in TABLAS_RESULTADO
+        }
+
+        meta = {
+            "version": VERSION_RESULTADO,
+            "huella": self.huella,
+            "creado": self.creado,
+            "tipos": self.tipos,
+            "columnas_correlacion": list(self.correlacion.columns),
+            "columnas_atipicos": {n: b.columnas for n, b in self.atipicos.items()},
+            # JSON sólo admite claves str: se guardan como pares
+            "etiquetas": [[int(c), e] for c, e in self.etiquetas.items()],
+            "k": self.k,
+            "origen_k": self.origen_k,
+            "columnas_objeto": objetos,
+        }
+
+        def escribir_json(ruta: str) -> None:
+            with open(ruta, "w", encoding="utf-8") as f:
+                json.dump(meta, f, ensure_ascii=False, default=str)
+
+        _escribir_atomico(f"{prefijo}.json", escribir_json)
+
+    @classmethod
+    def cargar(cls, prefijo: str) -> "ResultadoAnalisis":
+        """Lee un resultado escrito con `guardar` (lanza excepción si falta alguna parte)."""
+        with open(f"{prefijo}.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta.get("version") != VERSION_RESULTADO:
+            raise ValueError("Resultado guardado con otro formato.")
+
+        corr = pd.read_parquet(f"{prefijo}_correlacion.parquet", engine="pyarrow")
+        corr.columns = corr.index = pd.Index(meta["columnas_correlacion"], dtype=object)
+        clusters = pd.read_parquet(f"{prefijo}_filas.parquet", engine="pyarrow")["Cluster"]
+        tablas = {
+            nombre: _tabla_desde_parquet(f"{prefijo}_{nombre}.parquet", meta["columnas_objeto"][nombre])
+            for nombre in TABLAS_RESULTADO
+        }
+
+        atipicos = {}
+        with np.load(f"{prefijo}_atipicos.npz") as arreglos:
+            for nombre, columnas in meta["columnas_atipicos"].items():
+                atipicos[nombre] = BanderasAtipicos(
+                    arreglos[f"{nombre}_bits"], clusters.index, columnas, arreglos[f"{nombre}_conteos"]
+                )
+
+        return cls(
+            huella=meta["huella"],
+            tipos=meta["tipos"],
+            estadisticas=tablas["estadisticas"],
+            correlacion=corr,
+            atipicos=atipicos,
+            clusters=clusters,
+            etiquetas={c: e for c, e in meta["etiquetas"]},
+            perfil_cluster=tablas["perfil_cluster"],
+            k=meta["k"],
+            origen_k=meta["origen_k"],
+            curva_k=tablas["curva_k"],
+            creado=meta["creado"],
+        )
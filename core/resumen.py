@@ -4,6 +4,9 @@ import pandas as pd
 import numpy as np
 from typing import Dict, Iterable
 
+from core.correlacion import MotorCorrelacion, pares_fuertes
+from core.deteccion_atipicos import BanderasAtipicos
+
 class GeneradorResumen:
     @staticmethod
     def _fmt_pct(x: float, decimals: int = 1) -> str:
@@ -22,6 +25,12 @@ class GeneradorResumen:
         except Exception:
             return "—"
 
+    @staticmethod
+    def _tasas(banderas) -> pd.Series:
+        if isinstance(banderas, BanderasAtipicos):
+            return banderas.tasas()
+        return banderas.mean(numeric_only=True)
+
     @staticmethod
     def resumen_agrupamiento(clusters: Iterable, etiquetas: Dict) -> str:
         """
@@ -59,13 +68,15 @@ class GeneradorResumen:
     ) -> str:
         """
         zscore_flags / iqr_flags: DataFrames booleanos por columna (True=outlier)
+                                  o BanderasAtipicos (conteos ya calculados)
         forest_flags: Serie booleana por fila (True=registro atípico)
+                      o BanderasAtipicos de una sola columna
         """
         partes = ["Valores atípicos:"]
 
         # Z-score
-        if isinstance(zscore_flags, pd.DataFrame) and not zscore_flags.empty:
-            rates = zscore_flags.mean(numeric_only=True).sort_values(ascending=False)
+        if isinstance(zscore_flags, (pd.DataFrame, BanderasAtipicos)) and not zscore_flags.empty:
+            rates = GeneradorResumen._tasas(zscore_flags).sort_values(ascending=False)
             top = rates.head(top_n)
             if not top.empty:
                 partes.append("- Z-score (por columna):")
@@ -75,8 +86,8 @@ class GeneradorResumen:
             partes.append("- Z-score: no aplicable o sin columnas numéricas.")
 
         # IQR
-        if isinstance(iqr_flags, pd.DataFrame) and not iqr_flags.empty:
-            rates = iqr_flags.mean(numeric_only=True).sort_values(ascending=False)
+        if isinstance(iqr_flags, (pd.DataFrame, BanderasAtipicos)) and not iqr_flags.empty:
+            rates = GeneradorResumen._tasas(iqr_flags).sort_values(ascending=False)
             top = rates.head(top_n)
             if not top.empty:
                 partes.append("- IQR (por columna):")
@@ -89,42 +100,36 @@ class GeneradorResumen:
         if isinstance(forest_flags, pd.Series) and not forest_flags.empty:
             rate = float(forest_flags.mean())
             partes.append(f"- Isolation Forest (por fila): {GeneradorResumen._fmt_pct(rate)} de registros atípicos.")
+        elif isinstance(forest_flags, BanderasAtipicos) and not forest_flags.empty:
+            rate = float(forest_flags.tasas().iloc[0])
+            partes.append(f"- Isolation Forest (por fila): {GeneradorResumen._fmt_pct(rate)} de registros atípicos.")
         else:
             partes.append("- Isolation Forest: no aplicable.")
 
         return "\n".join(partes)
 
     @staticmethod
-    def resumen_correlaciones(corr_df: pd.DataFrame | None, top_n: int = 5) -> str:
+    def resumen_correlaciones(corr_df, top_n: int = 5) -> str:
         """
-        corr_df: matriz de correlación (num_cols x num_cols).
+        corr_df: matriz de correlación (num_cols x num_cols) o MotorCorrelacion
+                 (en ese caso la matriz se recorre por bloques).
         Reporta top-N correlaciones absolutas (excluyendo diagonal y duplicados).
         """
-        if corr_df is None or corr_df.empty or corr_df.shape[0] < 2:
+        if isinstance(corr_df, MotorCorrelacion):
+            if len(corr_df.columnas_base) < 2:
+                return "Correlaciones: no hay suficientes variables numéricas para evaluar."
+        elif corr_df is None or corr_df.empty or corr_df.shape[0] < 2:
             return "Correlaciones: no hay suficientes variables numéricas para evaluar."
 
-        # Convertir a formato largo y quitar duplicados (i<j)
-        c = corr_df.copy()
-        np.fill_diagonal(c.values, np.nan)
-        long = (
-            c.abs()
-             .stack()
-             .reset_index()
-             .rename(columns={"level_0": "var1", "level_1": "var2", 0: "abs_corr"})
-        )
-
-        # Mantener sólo pares únicos (var1 < var2 en orden)
-        mask = long["var1"] < long["var2"]
-        long = long[mask]
-
-        top = long.sort_values("abs_corr", ascending=False).head(top_n)
+        # Top-N sobre el triángulo superior (argpartition, sin pasar a formato largo)
+        top = pares_fuertes(corr_df, k=top_n)
 
         if top.empty:
             return "Correlaciones: sin relaciones destacadas."
 
         partes = ["Correlaciones destacadas (|r|):"]
-        for _, row in top.iterrows():
-            v1, v2, r = row["var1"], row["var2"], row["abs_corr"]
+        for v1, v2, r in zip(top["var1"], top["var2"], top["abs_r"]):
+            v1, v2 = sorted((v1, v2), key=str)
             partes.append(f"- {v1} ↔ {v2}: {GeneradorResumen._fmt_num(r, 3)}")
 
         return "\n".join(partes)
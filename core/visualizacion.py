@@ -1,12 +1,37 @@
+import io
+import json
 import os
 import re
+import time
 import unicodedata
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import partial
 import pandas as pd
 import numpy as np
 import seaborn as sns
-import matplotlib.pyplot as plt
+import matplotlib
+from matplotlib.figure import Figure
+from PIL import Image
 from pandas.api.types import is_numeric_dtype, is_bool_dtype, is_categorical_dtype
 
+from core.cache import VistaCache, en_cache, huella_contenido
+from core.correlacion import MotorCorrelacion
+from core.densidad import (
+    MAX_PUNTOS_DISPERSION,
+    PiramideHistograma,
+    densidad_2d,
+    dibujar_densidad,
+    dibujar_histograma,
+)
+
+TOP_N_BARRAS = 20
+MANIFIESTO_GRAFICOS = "manifiesto_graficos.json"
+# Subir este número fuerza a redibujar todo cuando cambia el código de dibujo
+VERSION_GRAFICOS = 4
+DPI_GRAFICOS = 140
+DPI_POR_TIPO = {"mapa_calor": 160}
+FORMATOS_IMAGEN = {"png": ".png", "png_paleta": ".png", "jpeg": ".jpg"}
+
 def _safe_name(name: str) -> str:
     # Normaliza: quita acentos, espacios → '_', solo [A-Za-z0-9_-]
     nfkd = unicodedata.normalize("NFKD", str(name))
@@ -37,109 +62,384 @@ def _select_categorical(df: pd.DataFrame) -> pd.DataFrame:
             cats.append(c)
     return df[cats] if cats else pd.DataFrame(index=df.index)
 
-def CrearGraficos(df: pd.DataFrame, carpeta_salida: str = "output"):
+# ---------- Dibujo de cada gráfico ----------
+# Funciones de módulo (se envían a los procesos): reciben sólo los datos del
+# gráfico y devuelven una Figure, sin el estado global de pyplot.
+
+def _histograma(col, histograma: dict) -> Figure:
+    fig = Figure()
+    ax = fig.subplots()
+    dibujar_histograma(ax, histograma["bordes"], histograma["conteos"], histograma["curva"])
+    ax.set_title(f"Histograma de {col}")
+    ax.set_xlabel(col); ax.set_ylabel("Frecuencia")
+    fig.tight_layout()
+    return fig
+
+
+def _boxplot(col, valores: np.ndarray) -> Figure:
+    fig = Figure()
+    ax = fig.subplots()
+    sns.boxplot(x=valores, whis=1.5, ax=ax)
+    ax.set_title(f"Boxplot de {col}")
+    fig.tight_layout()
+    return fig
+
+
+def _barras(col, top: pd.Series) -> Figure:
+    fig = Figure(figsize=(9, 4.5))
+    ax = fig.subplots()
+    top.sort_values(ascending=False).plot(kind="bar", ax=ax)
+    ax.set_title(f"Frecuencia de {col}")
+    ax.set_ylabel("Cantidad")
+    for etiqueta in ax.get_xticklabels():
+        etiqueta.set_rotation(45); etiqueta.set_ha("right")
+    fig.tight_layout()
+    return fig
+
+
+def _dispersion(x_col, y_col, datos) -> Figure:
+    """`datos`: DataFrame con todos los puntos o grilla de `densidad_2d` (muchas filas)."""
+    fig = Figure()
+    ax = fig.subplots()
+    if isinstance(datos, pd.DataFrame):
+        sns.scatterplot(x=x_col, y=y_col, data=datos, alpha=0.6, edgecolor=None, ax=ax)
+    else:
+        dibujar_densidad(fig, ax, datos["conteos"], datos["extension"])
+        ax.set_xlabel(x_col); ax.set_ylabel(y_col)
+    ax.set_title(f"Dispersión: {x_col} vs {y_col}")
+    fig.tight_layout()
+    return fig
+
+
+def _mapa_calor(corr: pd.DataFrame) -> Figure:
+    annot_ok = corr.shape[0] <= 12
+    mask = np.triu(np.ones_like(corr, dtype=bool))
+    lado = min(1.2 * corr.shape[0], 12)
+    fig = Figure(figsize=(lado, lado))
+    ax = fig.subplots()
+    sns.heatmap(corr, mask=mask, annot=annot_ok, fmt=".2f", cmap="coolwarm", square=True, ax=ax)
+    ax.set_title("Mapa de calor - Correlaciones (Spearman)")
+    fig.tight_layout()
+    return fig
+
+
+def _iniciar_trabajador() -> None:
+    # Procesos de dibujo sin interfaz gráfica
+    matplotlib.use("Agg")
+
+
+def _codificar(fig: Figure, formato: str, dpi: int, calidad: int) -> bytes:
     """
-    Genera gráficos automáticos según el tipo de variable y los guarda como imágenes.
+    Figura → bytes de imagen. El fondo es blanco, así que se descarta el
+    canal alfa (RGB): además de pesar menos, el PDF no tiene que separarlo.
+    - "png": sin pérdida; "png_paleta": 256 colores (gráficos planos);
+      "jpeg": con pérdida (`calidad`), para gráficos densos.
+    """
+    crudo = io.BytesIO()
+    fig.savefig(crudo, format="png", dpi=dpi, bbox_inches="tight", pil_kwargs={"compress_level": 1})
+    crudo.seek(0)
+    imagen = Image.open(crudo).convert("RGB")
+    salida = io.BytesIO()
+    if formato == "jpeg":
+        imagen.save(salida, format="JPEG", quality=int(calidad), optimize=True)
+    elif formato == "png_paleta":
+        imagen.quantize(colors=256).save(salida, format="PNG", optimize=True)
+    else:
+        imagen.save(salida, format="PNG")
+    return salida.getvalue()
+
+
+def _dibujar(tipo: str, archivo: str, dibujar, args: tuple, opciones: dict) -> dict:
+    """
+    Ejecuta un trabajo de dibujo; un error queda registrado sin afectar al resto.
+    Con `opciones["carpeta"]` la imagen se escribe en disco; si es None se
+    devuelve en memoria ("imagen").
+    """
+    inicio = time.perf_counter()
+    error = None
+    imagen = None
+    try:
+        fig = dibujar(*args)
+        dpi = opciones["dpi"] or DPI_POR_TIPO.get(tipo, DPI_GRAFICOS)
+        imagen = _codificar(fig, opciones["formato"], dpi, opciones["calidad"])
+        if opciones["carpeta"] is not None:
+            with open(os.path.join(opciones["carpeta"], archivo), "wb") as f:
+                f.write(imagen)
+            imagen = None
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return {
+        "grafico": archivo,
+        "tipo": tipo,
+        "segundos": round(time.perf_counter() - inicio, 4),
+        "error": error,
+        "imagen": imagen,
+    }
+
+
+def _huella(tipo: str, datos: bytes, *parametros) -> str:
+    """Huella de un gráfico: datos que dibuja + tipo + parámetros."""
+    return huella_contenido(datos, tipo, VERSION_GRAFICOS, *parametros)
+
+
+def _huella_serie(s: pd.Series) -> bytes:
+    return s.to_numpy(dtype="float64").tobytes() + repr([str(i) for i in s.index]).encode("utf-8")
+
+
+def huella_columna(col, completa: np.ndarray) -> str:
+    """Huella del contenido de una columna numérica (float64, con NaN) y su nombre."""
+    return huella_contenido(completa.tobytes(), str(col))
+
+
+def piramide_columna(
+    col, completa: np.ndarray, cache: VistaCache | None = None, huella: str | None = None
+) -> PiramideHistograma:
+    """
+    `PiramideHistograma` de una columna, en cache por su contenido: el
+    dashboard y `CrearGraficos` comparten la misma (se construye una vez).
     """
-    os.makedirs(carpeta_salida, exist_ok=True)
+    huella = huella or huella_columna(col, completa)
+    return en_cache(cache, f"piramide_{huella}", lambda: PiramideHistograma(completa))
+
+
+def _argumentos_histograma(col, valores: np.ndarray, cache: VistaCache | None, huella: str) -> tuple:
+    # Conteos y KDE salen de la pirámide de la columna (compartida con el dashboard):
+    # al proceso sólo viajan los bins. Bins heurístico (Sturges) y kde solo si no es discreto
+    piramide = piramide_columna(col, valores, cache, huella)
+    return col, piramide.histograma(bins="sturges", kde=not piramide.discreta)
 
+
+def _argumentos_dispersion(x_col, y_col, plot_df: pd.DataFrame) -> tuple:
+    # Pocas filas: todos los puntos; muchas: densidad 2D de todas las filas (sin muestreo)
+    if len(plot_df) > MAX_PUNTOS_DISPERSION:
+        return x_col, y_col, densidad_2d(plot_df[x_col].to_numpy(), plot_df[y_col].to_numpy())
+    return x_col, y_col, plot_df
+
+
+def _trabajos(
+    df: pd.DataFrame, motor: MotorCorrelacion | None, ext: str = ".png", cache: VistaCache | None = None
+) -> list[tuple]:
+    """
+    Lista de (tipo, archivo, función, argumentos, huella) con sólo los datos de
+    cada gráfico. Los argumentos costosos (heatmap, conteos del histograma,
+    densidad 2D) se calculan recién si hay que dibujar: son funciones sin
+    parámetros.
+    """
     numericas = _select_numeric(df)
     categoricas = _select_categorical(df)
+    trabajos = []
 
-    # ---------- Histogramas (numéricas) ----------
+    valores_por_columna = {}
+    huellas_columnas = {}
     for col in numericas.columns:
-        try:
-            serie = numericas[col].dropna()
-            if serie.empty:
-                continue
-            plt.figure()
-            # bins heurístico (Sturges) y kde solo si no es discreto
-            is_discrete = (serie.dropna().round().eq(serie.dropna())).mean() > 0.95
-            sns.histplot(serie, kde=not is_discrete, bins="sturges")
-            plt.title(f"Histograma de {col}")
-            plt.xlabel(col); plt.ylabel("Frecuencia")
-            plt.tight_layout()
-            fname = f"{carpeta_salida}/histograma_{_safe_name(col)}.png"
-            plt.savefig(fname, dpi=140, bbox_inches="tight")
-        except Exception:
-            pass
-        finally:
-            plt.close()
+        completa = numericas[col].to_numpy(dtype="float64")
+        huellas_columnas[col] = huella_columna(col, completa)
+        valores_por_columna[col] = completa[~np.isnan(completa)]
 
-    # ---------- Boxplots (numéricas) ----------
+    # ---------- Heatmap de correlación (Spearman + triángulo) ----------
+    # Primero el más pesado, para repartir mejor la carga
+    if numericas.shape[1] >= 2:
+        def argumentos_mapa():
+            nonlocal motor
+            if motor is None:
+                motor = MotorCorrelacion(numericas)
+            motor.incorporar(numericas)
+            return (motor.matriz("spearman", columnas=list(numericas.columns)),)
+
+        huella = _huella("mapa_calor", b"", [huellas_columnas[c] for c in numericas.columns])
+        trabajos.append(("mapa_calor", f"mapa_calor_correlaciones{ext}", _mapa_calor, argumentos_mapa, huella))
+
+    # ---------- Histogramas y boxplots (numéricas) ----------
     for col in numericas.columns:
-        try:
-            serie = numericas[col].dropna()
-            if serie.empty:
-                continue
-            plt.figure()
-            sns.boxplot(x=serie, whis=1.5)
-            plt.title(f"Boxplot de {col}")
-            plt.tight_layout()
-            fname = f"{carpeta_salida}/boxplot_{_safe_name(col)}.png"
-            plt.savefig(fname, dpi=140, bbox_inches="tight")
-        except Exception:
-            pass
-        finally:
-            plt.close()
+        valores = valores_por_columna[col]
+        if valores.size == 0:
+            continue
+        nombre = _safe_name(col)
+        huella = huellas_columnas[col]
+        trabajos.append((
+            "histograma", f"histograma_{nombre}{ext}", _histograma,
+            partial(_argumentos_histograma, col, valores, cache, huella),
+            _huella("histograma", b"", huella),
+        ))
+        trabajos.append((
+            "boxplot", f"boxplot_{nombre}{ext}", _boxplot, (col, valores),
+            _huella("boxplot", b"", huella),
+        ))
 
-    # ---------- Barras (categóricas) ----------
-    TOP_N = 20
+    # ---------- Barras (categóricas): sólo viajan los conteos ----------
     for col in categoricas.columns:
         try:
             s = categoricas[col].astype("string").fillna("Desconocido")
             vc = s.value_counts(dropna=False)
-            if vc.empty:
-                continue
-            top = vc.head(TOP_N)
-            otros = vc.iloc[TOP_N:].sum()
-            if otros > 0:
-                top.loc["Otros"] = otros
-            plt.figure(figsize=(9, 4.5))
-            top.sort_values(ascending=False).plot(kind="bar")
-            plt.title(f"Frecuencia de {col}")
-            plt.ylabel("Cantidad"); plt.xticks(rotation=45, ha="right")
-            plt.tight_layout()
-            fname = f"{carpeta_salida}/barras_{_safe_name(col)}.png"
-            plt.savefig(fname, dpi=140, bbox_inches="tight")
         except Exception:
-            pass
-        finally:
-            plt.close()
+            continue
+        if vc.empty:
+            continue
+        top = vc.head(TOP_N_BARRAS)
+        otros = vc.iloc[TOP_N_BARRAS:].sum()
+        if otros > 0:
+            top.loc["Otros"] = otros
+        trabajos.append((
+            "barras", f"barras_{_safe_name(col)}{ext}", _barras, (col, top),
+            _huella("barras", _huella_serie(top), str(col), TOP_N_BARRAS),
+        ))
 
     # ---------- Dispersión (las 2 numéricas de mayor varianza) ----------
     if numericas.shape[1] >= 2:
+        # selecciona top 2 por varianza
+        var = numericas.var(numeric_only=True).sort_values(ascending=False)
+        x_col, y_col = var.index[:2].tolist()
+        plot_df = numericas[[x_col, y_col]].dropna()
+        archivo = f"dispersion_{_safe_name(x_col)}_vs_{_safe_name(y_col)}{ext}"
+        huella = _huella("dispersion", b"", huellas_columnas[x_col], huellas_columnas[y_col])
+        trabajos.append(("dispersion", archivo, _dispersion, partial(_argumentos_dispersion, x_col, y_col, plot_df), huella))
+
+    return trabajos
+
+
+def _leer_manifiesto(carpeta_salida: str) -> dict:
+    """{archivo: huella} de los gráficos dibujados en la ejecución anterior."""
+    try:
+        with open(os.path.join(carpeta_salida, MANIFIESTO_GRAFICOS), encoding="utf-8") as f:
+            manifiesto = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifiesto.get("version") != VERSION_GRAFICOS:
+        return {}
+    return manifiesto.get("graficos", {})
+
+
+def _escribir_manifiesto(carpeta_salida: str, graficos: dict) -> None:
+    ruta = os.path.join(carpeta_salida, MANIFIESTO_GRAFICOS)
+    tmp = f"{ruta}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"version": VERSION_GRAFICOS, "graficos": graficos}, f, ensure_ascii=False, indent=1)
+    os.replace(tmp, ruta)
+
+
+def _eliminar(ruta: str) -> None:
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def CrearGraficos(
+    df: pd.DataFrame,
+    carpeta_salida: str | None = "output",
+    motor: MotorCorrelacion | None = None,
+    procesos: int | None = None,
+    formato: str = "png",
+    dpi: int | None = None,
+    calidad: int = 85,
+    previas: pd.DataFrame | None = None,
+    cache: VistaCache | None = None,
+) -> pd.DataFrame:
+    """
+    Genera gráficos automáticos según el tipo de variable y los guarda como imágenes.
+    Si se pasa `motor`, el heatmap reutiliza sus rangos en lugar de recalcularlos.
+
+    Los gráficos se dibujan en paralelo (backend Agg); cada proceso recibe
+    sólo los datos de su gráfico y un gráfico que falla no frena al resto.
+
+    Un manifiesto en la carpeta (`manifiesto_graficos.json`) guarda la
+    huella (datos + parámetros) de cada imagen: sólo se redibujan los
+    gráficos cuyos datos cambiaron, y las imágenes de ejecuciones
+    anteriores que ya no corresponden se eliminan.
+
+    Parámetros:
+    - carpeta_salida: None = en memoria: no se escribe nada en disco y las
+      imágenes vuelven en la columna "imagen" (bytes), listas para el PDF.
+    - procesos: cantidad de procesos (None = núcleos disponibles; 1 = secuencial).
+    - formato: "png", "png_paleta" (256 colores) o "jpeg".
+    - dpi: resolución para todos los gráficos (None = 140, heatmap 160).
+    - calidad: calidad JPEG (1-95).
+    - previas: resultado de una llamada anterior en memoria; las imágenes
+      con la misma huella se reutilizan sin redibujar.
+    - cache: guarda la `PiramideHistograma` de cada columna (por contenido),
+      compartida con otras vistas del mismo dataset.
+
+    Retorna:
+    - DataFrame con una fila por gráfico de esta ejecución: "grafico",
+      "tipo", "segundos", "error" (None si se generó bien), "reutilizado",
+      "huella" e "imagen" (sólo en memoria).
+    """
+    if formato not in FORMATOS_IMAGEN:
+        raise ValueError(f"formato debe ser uno de {sorted(FORMATOS_IMAGEN)}.")
+    en_memoria = carpeta_salida is None
+    if not en_memoria:
+        os.makedirs(carpeta_salida, exist_ok=True)
+    columnas = ["grafico", "tipo", "segundos", "error", "reutilizado", "huella"] + (["imagen"] if en_memoria else [])
+    opciones = {"carpeta": carpeta_salida, "formato": formato, "dpi": dpi, "calidad": calidad}
+
+    if en_memoria:
+        anterior = {}
+        if previas is not None and not previas.empty:
+            validas = previas[previas["imagen"].notna()]
+            anterior = dict(zip(validas["grafico"], zip(validas["huella"], validas["imagen"])))
+    else:
+        anterior = {a: (h, None) for a, h in _leer_manifiesto(carpeta_salida).items()}
+
+    trabajos = [
+        (tipo, archivo, dibujar, args, huella_contenido(huella.encode("utf-8"), formato, dpi, calidad))
+        for tipo, archivo, dibujar, args, huella in _trabajos(df, motor, FORMATOS_IMAGEN[formato], cache)
+    ]
+
+    resultados, pendientes = [], []
+    for tipo, archivo, dibujar, args, huella in trabajos:
+        huella_previa, imagen_previa = anterior.get(archivo, (None, None))
+        existe = imagen_previa is not None if en_memoria else os.path.isfile(os.path.join(carpeta_salida, archivo))
+        if huella_previa == huella and existe:
+            resultados.append({"grafico": archivo, "tipo": tipo, "segundos": 0.0, "error": None, "imagen": imagen_previa})
+            continue
         try:
-            # selecciona top 2 por varianza
-            var = numericas.var(numeric_only=True).sort_values(ascending=False)
-            x_col, y_col = var.index[:2].tolist()
-            plot_df = numericas[[x_col, y_col]].dropna()
-            if len(plot_df) > 5000:
-                plot_df = plot_df.sample(5000, random_state=42)
-            plt.figure()
-            sns.scatterplot(x=x_col, y=y_col, data=plot_df, alpha=0.6, edgecolor=None)
-            plt.title(f"Dispersión: {x_col} vs {y_col}")
-            plt.tight_layout()
-            fname = f"{carpeta_salida}/dispersion_{_safe_name(x_col)}_vs_{_safe_name(y_col)}.png"
-            plt.savefig(fname, dpi=140, bbox_inches="tight")
-        except Exception:
-            pass
-        finally:
-            plt.close()
+            if callable(args):
+                args = args()
+        except Exception as e:
+            resultados.append({"grafico": archivo, "tipo": tipo, "segundos": np.nan, "error": f"{type(e).__name__}: {e}"})
+            continue
+        pendientes.append((tipo, archivo, dibujar, args, opciones))
+    reutilizados = {r["grafico"] for r in resultados if r["error"] is None}
 
-    # ---------- Heatmap de correlación (Spearman + triángulo) ----------
-    if numericas.shape[1] >= 2:
+    nucleos = os.cpu_count() or 1
+    procesos = min(len(pendientes), nucleos if procesos is None else max(int(procesos), 1))
+
+    dibujados = None
+    if procesos > 1:
         try:
-            corr = numericas.corr(method="spearman")
-            annot_ok = corr.shape[0] <= 12
-            mask = np.triu(np.ones_like(corr, dtype=bool))
-            plt.figure(figsize=(min(1.2 * corr.shape[0], 12), min(1.2 * corr.shape[0], 12)))
-            sns.heatmap(corr, mask=mask, annot=annot_ok, fmt=".2f", cmap="coolwarm", square=True)
-            plt.title("Mapa de calor - Correlaciones (Spearman)")
-            plt.tight_layout()
-            fname = f"{carpeta_salida}/mapa_calor_correlaciones.png"
-            plt.savefig(fname, dpi=160, bbox_inches="tight")
-        except Exception:
-            pass
-        finally:
-            plt.close()
+            with ProcessPoolExecutor(procesos, initializer=_iniciar_trabajador) as pool:
+                futuros = {pool.submit(_dibujar, *t): t for t in pendientes}
+                dibujados = []
+                for futuro in as_completed(futuros):
+                    tipo, archivo = futuros[futuro][:2]
+                    try:
+                        dibujados.append(futuro.result())
+                    except Exception as e:
+                        # Proceso caído o datos no serializables: sólo se pierde ese gráfico
+                        dibujados.append({
+                            "grafico": archivo, "tipo": tipo,
+                            "segundos": np.nan, "error": f"{type(e).__name__}: {e}",
+                        })
+        except (OSError, RuntimeError):
+            # Entornos sin multiprocessing disponible: se dibuja en serie
+            dibujados = None
+    if dibujados is None:
+        dibujados = [_dibujar(*t) for t in pendientes]
+    resultados.extend(dibujados)
+
+    huellas = {t[1]: t[4] for t in trabajos}
+    if not en_memoria:
+        # Manifiesto con exactamente los gráficos de esta ejecución
+        actuales = {r["grafico"]: huellas[r["grafico"]] for r in resultados if r["error"] is None}
+        for archivo in (set(anterior) | set(huellas)) - set(actuales):
+            # Imagen de otra ejecución (u otro dataset) o que falló ahora: no debe quedar en el informe
+            _eliminar(os.path.join(carpeta_salida, archivo))
+        _escribir_manifiesto(carpeta_salida, actuales)
+
+    # Mismo orden que los trabajos (as_completed devuelve por orden de llegada)
+    orden = {t[1]: i for i, t in enumerate(trabajos)}
+    resultados.sort(key=lambda r: orden[r["grafico"]])
+    for r in resultados:
+        r["reutilizado"] = r["grafico"] in reutilizados
+        r["huella"] = huellas[r["grafico"]]
+    return pd.DataFrame(resultados, columns=columnas)